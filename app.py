@@ -1,20 +1,18 @@
-import json, numpy as np, os
-from src.orchestrator import orchestrator_app, chat_app
-from synthesize import synth_app, handle_llm_tool_call
-from google.adk.runners import Runner
-from google.adk.sessions import DatabaseSessionService
-from google.adk.memory import InMemoryMemoryService
-from google.adk.tools import google_search
-from google.genai import types
+import json, numpy as np, os, re
 import asyncio
 from dotenv import load_dotenv
 import warnings
 from pathlib import Path
+from typing import Optional
 
-from utils.run_sessions import run_session, run_session_return
-from utils.check_prompt import has_audio_path
+from utils.check_prompt import has_audio_path, extract_audio_path
 from utils.jsonfy import give_json
 
+# ADK, the agent modules and the DSP stack (librosa / scipy / soundfile) are imported
+# inside the functions that need them, so starting the app is near instant and a
+# chat-only prompt never loads the audio stack. SOUNDSPARK_STARTUP=eager restores
+# the old behaviour of paying for everything up front (see warmup()).
+
 
 # This will ignore all warning messages
 warnings.filterwarnings('ignore')
@@ -25,43 +23,173 @@ print("[app]: env secrets loaded!")
 
 sample = "tests/sample_audio/pluck.wav"
 
+# "sequential" runs orchestrator then synth_app one after the other,
+# "dag" runs one pipeline where synth params are generated alongside classifier/recommender/sample search
+PIPELINE_MODE = os.getenv("SOUNDSPARK_PIPELINE_MODE", "sequential")
+
+# "lazy" defers heavy imports / agent construction to first use, "eager" runs warmup() at start
+STARTUP_MODE = os.getenv("SOUNDSPARK_STARTUP", "lazy")
+
+# "1" answers audio prompts with a short preview render and finishes the full render in
+# the background (synthesize.handle_llm_tool_call_preview), "0" waits for the full render
+RENDER_PREVIEW = os.getenv("SOUNDSPARK_RENDER_PREVIEW", "0") == "1"
+
 
-async def run_workflow(prompt: str):
+def warmup():
+    """
+    Pay the whole cold start up front: import the ADK / DSP stack and build every app.
+    Used in eager startup mode, e.g. to pre-warm a worker before it takes traffic.
+    """
+    import librosa, scipy.signal, soundfile  # noqa: F401
+    from src.tools.dsp_pool import get_dsp_pool
+    from src.orchestrator import get_orchestrator_app, get_chat_app, get_orchestrator_dag_app
+    from synthesize import get_synth_app
+
+    # dsp workers import the audio stack and compile numba kernels on their own
+    get_dsp_pool().warm()
+    get_chat_app()
+    if PIPELINE_MODE == "dag":
+        get_orchestrator_dag_app()
+    else:
+        get_orchestrator_app()
+        get_synth_app()
+    print("[app]: warmed up")
+
+
+# ================================================================
+# Shared runtime: one session service (one SQLite engine / connection pool),
+# one memory service and one Runner per app, reused by every prompt instead of
+# being rebuilt per request. The long-lived server (server.py) relies on this.
+# ================================================================
+
+DB_URL = os.getenv("SOUNDSPARK_DB_URL", "sqlite:///memory_bank.db")
+
+_session_service = None
+_memory_service = None
+_runners = {}
+
+
+def get_session_service():
+    global _session_service
+    if _session_service is None:
+        from google.adk.sessions import DatabaseSessionService
+        #local persitent Sqlite DB to store per session related data
+        _session_service = DatabaseSessionService(db_url=DB_URL)
+    return _session_service
+
+
+def get_memory_service():
+    global _memory_service
+    if _memory_service is None:
+        from google.adk.memory import InMemoryMemoryService
+        _memory_service = InMemoryMemoryService()  # TODO: replace this with Vertax AI while deploying
+    return _memory_service
+
+
+def get_runner(app):
+    """one Runner per App for the life of the process"""
+    runner = _runners.get(id(app))
+    if runner is None:
+        from google.adk.runners import Runner
+        runner = Runner(app=app, session_service=get_session_service(), memory_service=get_memory_service())
+        _runners[id(app)] = runner
+    return runner
+
+
+async def _synthesize(call_json, audio_path: str, out_path: str, preview: bool):
+    from synthesize import handle_llm_tool_call_async, handle_llm_tool_call_preview
+
+    # the render runs on the dsp pool, other sessions keep going meanwhile
+    if preview:
+        return await handle_llm_tool_call_preview(call_json, audio_path, out_path)
+    return await handle_llm_tool_call_async(call_json, audio_path, out_path)
+
+
+def synth_out_path(audio_path: str, user_id: str, session_id: str) -> str:
+    """
+    Render path of one session, so concurrent users rendering the same sample don't
+    overwrite each other's file: tests/synthesis_demo/<user>/<session>/<stem>_layered.mp3
+    """
+    # ids come from clients, keep them to one plain path component each
+    parts = [re.sub(r"[^A-Za-z0-9_.-]", "_", part).lstrip(".") or "_" for part in (user_id, session_id)]
+    return os.path.join("tests/synthesis_demo", *parts, f"{Path(audio_path).stem}_layered.mp3")
+
+
+async def run_workflow(prompt: str, user_id: str = "user_01", session_id: str = "test_session_01", on_text=None,
+                       preview: Optional[bool] = None):
     """
     Runs the full agent workflow with a user prompt.
+
+    args:
+        prompt: user message
+        user_id / session_id: ADK session to run in, created on first use
+        on_text: optional async callback(author, text) fired for every text event, for streaming front ends
+        preview: return after a preview render, the full one going on in the background
+                 (its job id is in the synthesis result), None follows SOUNDSPARK_RENDER_PREVIEW
+
+    return:
+        dict with the final "response" text and the "synthesis" result (None for chat prompts)
     """
+    if preview is None:
+        preview = RENDER_PREVIEW
+    from utils.run_sessions import run_session_return
+
+    memory_service = get_memory_service()
 
-    #local persitent Sqlite DB to store per session related data  
-    db_url = "sqlite:///memory_bank.db"
-    session_service = DatabaseSessionService(db_url=db_url)
-    memory_service = InMemoryMemoryService()  # TODO: replace this with Vertax AI while deploying
-    
     print(f"Starting workflow for: '{prompt}'")
 
+    synthesis = None
+    audio_path = extract_audio_path(prompt) or sample
+    synth_out = synth_out_path(audio_path, user_id, session_id)
+
     # Runner with persistent storage with a check on prompt
-    if has_audio_path(prompt):
-        runner = Runner(app=orchestrator_app, session_service=session_service, memory_service=memory_service)
-        
+    if has_audio_path(prompt) and PIPELINE_MODE == "dag":
+        from src.orchestrator import get_orchestrator_dag_app
+
+        runner = get_runner(get_orchestrator_dag_app())
+
         print("\n--- ✅ Final Workflow Output ---")
-        await run_session(runner, prompt, "test_session_01", "user_01")
-        
+        response = await run_session_return(runner, prompt, session_id, user_id, on_text=on_text)
+
+        session = await runner.session_service.get_session(app_name=runner.app_name, user_id=user_id, session_id=session_id)
+
         print("\n--- Creating Demo Synthesized Sound Ouput ---")
-        runner_2 = Runner(app=synth_app, session_service=session_service, memory_service=memory_service)
-        
-        resp = await run_session_return(runner_2, prompt, "test_session_01", "user_01")
+        resp = give_json(session.state.get("synth_call") or "")
+
+        synthesis = await _synthesize(resp, audio_path, synth_out, preview)
+
+        print(synthesis)
+
+        print("\n[app]: Adding the session to long term memory")
+        await memory_service.add_session_to_memory(session)
+        print("[app]: Memory Saved!\n\n")
+
+    elif has_audio_path(prompt):
+        from src.orchestrator import get_orchestrator_app
+        from synthesize import get_synth_app
+
+        runner = get_runner(get_orchestrator_app())
+
+        print("\n--- ✅ Final Workflow Output ---")
+        response = await run_session_return(runner, prompt, session_id, user_id, on_text=on_text)
+
+        print("\n--- Creating Demo Synthesized Sound Ouput ---")
+        runner_2 = get_runner(get_synth_app())
+
+        resp = await run_session_return(runner_2, prompt, session_id, user_id)
 
         resp = give_json(resp)
 
-        ok = handle_llm_tool_call(resp, sample, f"tests/synthesis_demo/{Path(sample).stem}_layered.mp3")
-        
-        print(ok)
-        
+        synthesis = await _synthesize(resp, audio_path, synth_out, preview)
+
+        print(synthesis)
+
         # adding the session to long term memory
         print("\n[app]: Adding the session to long term memory")
 
-        session = await runner.session_service.get_session(app_name=runner.app_name, user_id="user_01", session_id="test_session_01")
-        synth_sess = await runner_2.session_service.get_session(app_name=runner_2.app_name, user_id="user_01", session_id="test_session_01")
-        await memory_service.add_session_to_memory(session) 
+        session = await runner.session_service.get_session(app_name=runner.app_name, user_id=user_id, session_id=session_id)
+        synth_sess = await runner_2.session_service.get_session(app_name=runner_2.app_name, user_id=user_id, session_id=session_id)
+        await memory_service.add_session_to_memory(session)
         await memory_service.add_session_to_memory(synth_sess)
 
         print("[app]: Memory Saved!\n\n")
@@ -81,9 +209,11 @@ async def run_workflow(prompt: str):
         #         print(f"  [{memory.author}]: {text}...")
 
     else:
-        runner = Runner(app=chat_app, session_service=session_service, memory_service=memory_service)
+        from src.orchestrator import get_chat_app
+
+        runner = get_runner(get_chat_app())
         print("\n--- ✅ Final Workflow Output ---")
-        await run_session(runner, prompt, "test_session_01", "user_01")
+        response = await run_session_return(runner, prompt, session_id, user_id, on_text=on_text)
     # response = await runner.run_debug(prompt)
 
     
@@ -94,10 +224,20 @@ async def run_workflow(prompt: str):
     # print(extract_human_text(response))
     print("\n\n")
     # print(response)
+    return {"response": response, "synthesis": synthesis}
 
 if __name__ == "__main__":
     # Get a real file path for testing
     # Note: Replace with a real audio file path on your system
     user_prompt = f"Add a long stereo delay to this audio {sample}"  # what sounds to layer with this audio {sample}
 
-    asyncio.run(run_workflow(user_prompt))
\ No newline at end of file
+    if STARTUP_MODE == "eager":
+        warmup()
+
+    async def _main():
+        await run_workflow(user_prompt)
+        # a one-shot run exits after the prompt, let a background full render finish first
+        from src.tools.render_jobs import wait_render_jobs
+        await wait_render_jobs()
+
+    asyncio.run(_main())
\ No newline at end of file
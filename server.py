@@ -0,0 +1,145 @@
+"""
+Long-lived SoundSpark server.
+
+Keeps one process warm and reuses the session service (and its SQLite engine), the
+memory service and one Runner per app across every request (see app.get_runner),
+instead of rebuilding them per prompt like the one-shot `python app.py` run.
+
+    POST /prompt   {"prompt": "...", "user_id": "...", "session_id": "...", "preview": bool} -> final response + synthesis result
+    WS   /ws       send the same JSON, receive {"type": "text", "author", "text"} events then {"type": "done", ...},
+                   in preview mode followed by {"type": "render", ...} once the full render is finished
+    GET  /render/{job_id}   status of a background full render (preview mode)
+    GET  /health   readiness and current load
+
+Concurrency is bounded by SOUNDSPARK_MAX_CONCURRENCY (requests over the limit queue), and
+prompts for the same session are serialized so two turns never race on one session.
+
+usage:
+    python server.py                 # host/port from SOUNDSPARK_HOST / SOUNDSPARK_PORT (127.0.0.1:8080)
+"""
+import asyncio
+import functools
+import os
+import uuid
+import weakref
+from contextlib import asynccontextmanager
+from typing import Optional, Set
+
+import uvicorn
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel
+
+import app as soundspark
+from src.tools.render_jobs import get_render_job
+
+MAX_CONCURRENCY = int(os.getenv("SOUNDSPARK_MAX_CONCURRENCY", 8))
+
+
+class PromptRequest(BaseModel):
+    prompt: str
+    user_id: str = "user_01"
+    session_id: Optional[str] = None
+    preview: Optional[bool] = None  # None follows SOUNDSPARK_RENDER_PREVIEW
+
+
+@asynccontextmanager
+async def _lifespan(_):
+    # build the apps / runners once before taking traffic when asked to
+    if soundspark.STARTUP_MODE == "eager":
+        await asyncio.to_thread(soundspark.warmup)
+    print(f"[server]: ready, max concurrency {MAX_CONCURRENCY}")
+    yield
+
+
+server = FastAPI(title="SoundSpark", lifespan=_lifespan)
+
+_slots = asyncio.Semaphore(MAX_CONCURRENCY)
+# a lock lives as long as a request holds or waits on it, idle sessions take no memory
+_session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+_in_flight = 0
+
+
+async def _run(req: PromptRequest, on_text=None) -> dict:
+    global _in_flight
+    session_id = req.session_id or uuid.uuid4().hex
+    lock = _session_locks.setdefault(f"{req.user_id}/{session_id}", asyncio.Lock())
+    async with lock, _slots:
+        _in_flight += 1
+        try:
+            result = await soundspark.run_workflow(req.prompt, user_id=req.user_id, session_id=session_id, on_text=on_text,
+                                                   preview=req.preview)
+        finally:
+            _in_flight -= 1
+    return {"session_id": session_id, **result}
+
+
+@server.get("/health")
+async def health():
+    return {"ok": True, "in_flight": _in_flight, "max_concurrency": MAX_CONCURRENCY}
+
+
+@server.get("/render/{job_id}")
+async def render_status(job_id: str):
+    job = get_render_job(job_id)
+    if job is None:
+        return {"ok": False, "error": f"unknown render job {job_id}"}
+    return {"ok": True, **job.to_dict()}
+
+
+@server.post("/prompt")
+async def prompt(req: PromptRequest):
+    try:
+        return {"ok": True, **(await _run(req))}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+
+async def _send_render(websocket: WebSocket, job):
+    status = await job.wait()
+    try:
+        await websocket.send_json({"type": "render", "ok": status["status"] == "done", **status})
+    except Exception:
+        pass  # client went away meanwhile
+
+
+def _send_done(sends: Set[asyncio.Task], task: asyncio.Task):
+    sends.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"[server] : render notification failed: {task.exception()!r}")
+
+
+@server.websocket("/ws")
+async def ws(websocket: WebSocket):
+    await websocket.accept()
+    # pending render notifications of this socket; the loop only keeps weak references to tasks
+    sends: Set[asyncio.Task] = set()
+    try:
+        while True:
+            req = PromptRequest(**(await websocket.receive_json()))
+
+            async def on_text(author, text):
+                await websocket.send_json({"type": "text", "author": author, "text": text})
+
+            try:
+                result = await _run(req, on_text=on_text)
+                await websocket.send_json({"type": "done", "ok": True, **result})
+                job = get_render_job((result.get("synthesis") or {}).get("job") or "")
+                if job is not None:
+                    # the socket keeps taking prompts, the full render result follows when ready
+                    task = asyncio.create_task(_send_render(websocket, job))
+                    sends.add(task)
+                    task.add_done_callback(functools.partial(_send_done, sends))
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                await websocket.send_json({"type": "done", "ok": False, "error": str(e)})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # nobody left to notify, the render jobs themselves keep going (job.wait shields them)
+        for task in list(sends):
+            task.cancel()
+
+
+if __name__ == "__main__":
+    uvicorn.run(server, host=os.getenv("SOUNDSPARK_HOST", "127.0.0.1"), port=int(os.getenv("SOUNDSPARK_PORT", 8080)))
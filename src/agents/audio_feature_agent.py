@@ -1,4 +1,71 @@
+import json
+import os
+from typing import AsyncGenerator
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.genai import types
+
+from src.tools.dsp_pool import run_dsp
 from src.tools.feature_extractor import compute_basic_descriptors
+from src.tracing import agent_span, get_tracer
+from utils.check_prompt import extract_audio_path
+
+
 class AudioFeatureAgent:
     def run(self, audio_path: str):
         return compute_basic_descriptors(audio_path)
+
+
+class FastFeatureAgent(BaseAgent):
+    """
+    Deterministic replacement for the feature LLM hop.
+
+    Pulls the audio path out of the user prompt, runs compute_basic_descriptors directly
+    and writes the result into session state under `output_key`, in the same
+    {"descriptor": {...}} shape the LLM agent produced. When no usable path is found
+    (or the fast path is disabled) it hands the turn to its first sub agent, the
+    LLM based feature agent.
+
+    env:
+        SOUNDSPARK_FEATURE_FAST_PATH: set to 0 to always use the LLM fallback
+    """
+
+    output_key: str = "descriptors"
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        fallback = self.sub_agents[0] if self.sub_agents else None
+        enabled = os.getenv("SOUNDSPARK_FEATURE_FAST_PATH", "1") != "0"
+
+        descriptors = None
+        if enabled:
+            prompt = ""
+            if ctx.user_content and ctx.user_content.parts:
+                prompt = " ".join(p.text for p in ctx.user_content.parts if p.text)
+            audio_path = extract_audio_path(prompt)
+            if audio_path and os.path.exists(audio_path):
+                try:
+                    # not an ADK tool call here, so the tracing plugin doesn't see it, trace it by hand
+                    with get_tracer().span("compute_basic_descriptors", kind="tool", parent=agent_span(ctx.invocation_id, self.name),
+                                           agent=self.name):
+                        # on the dsp pool, analysis must not stall the other sessions
+                        descriptors = await run_dsp(compute_basic_descriptors, audio_path, affinity=os.path.abspath(audio_path))
+                except Exception as e:
+                    print(f"[feature_fast_path] : extraction failed, falling back to LLM agent ({e})")
+
+        if descriptors is None:
+            if fallback is None:
+                return
+            async for event in fallback.run_async(ctx):
+                yield event
+            return
+
+        text = json.dumps({"descriptor": descriptors})
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=types.Content(role="model", parts=[types.Part(text=text)]),
+            actions=EventActions(state_delta={self.output_key: text}),
+        )
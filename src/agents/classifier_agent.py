@@ -1,70 +1,213 @@
-import json, os
+import json, math, os
+from typing import AsyncGenerator, List, Literal, Optional
 
-def classify_descriptors(descriptors: dict, llm):
+import numpy as np
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.genai import types
+from pydantic import Field
+
+from utils.jsonfy import give_json
+from utils.output_schema import ClassificationOutput
+
+# ================================================================
+# Nearest-centroid prototypes, one per allowed texture literal.
+# Feature vector: [log2 centroid, log2 bandwidth, zcr, percussive ratio, rms dB]
+# ================================================================
+TEXTURES = ["gritty", "warm", "bright", "dark", "percussive", "smooth", "wide"]
+
+_PROTOTYPES = np.array([
+    # log2 sc          log2 bw          zcr    perc   rms_db
+    [np.log2(2200.0), np.log2(2200.0), 0.09, 0.25, -12.0],  # gritty
+    [np.log2(1200.0), np.log2(1200.0), 0.04, 0.10, -20.0],  # warm
+    [np.log2(3500.0), np.log2(2500.0), 0.12, 0.30, -20.0],  # bright
+    [np.log2(600.0),  np.log2(700.0),  0.02, 0.15, -20.0],  # dark
+    [np.log2(2000.0), np.log2(2500.0), 0.08, 0.60, -18.0],  # percussive
+    [np.log2(900.0),  np.log2(800.0),  0.03, 0.05, -20.0],  # smooth
+    [np.log2(1800.0), np.log2(3000.0), 0.06, 0.20, -20.0],  # wide
+])
+
+# per feature spread, distances are measured in these units
+_SCALE = np.array([0.6, 0.6, 0.03, 0.15, 8.0])
+
+_STYLE_TAGS = {
+    "gritty": ["distorted", "aggressive", "saturated"],
+    "warm": ["warm", "mellow", "analog"],
+    "bright": ["bright", "airy", "crisp"],
+    "dark": ["dark", "sub-heavy", "moody"],
+    "percussive": ["percussive", "transient", "punchy"],
+    "smooth": ["smooth", "soft", "sustained"],
+    "wide": ["wide", "spacious", "textured"],
+}
+
+_GENRES = {
+    "gritty": ["dubstep", "drum and bass", "industrial"],
+    "warm": ["lo-fi", "neo soul", "house"],
+    "bright": ["pop", "future bass", "trance"],
+    "dark": ["techno", "trap", "ambient"],
+    "percussive": ["hip hop", "techno", "drum and bass"],
+    "smooth": ["ambient", "chillout", "r&b"],
+    "wide": ["ambient", "cinematic", "progressive house"],
+}
+
+DEFAULT_CONFIDENCE_THRESHOLD = 0.6
+
+
+def _typicality(d2: np.ndarray) -> np.ndarray:
+    """
+    Chi-square (5 degrees of freedom) tail of the scaled squared distance to the nearest
+    prototype: the chance a sound of that texture, spread by _SCALE around the prototype,
+    lies at least this far from it. ~1 next to a prototype, ~0 for sounds unlike any of them.
+    """
+    d2 = np.maximum(d2, 0.0)
+    erfc = np.array([math.erfc(math.sqrt(x / 2.0)) for x in d2])
+    return erfc + np.sqrt(2.0 * d2 / np.pi) * np.exp(-0.5 * d2) * (1.0 + d2 / 3.0)
+
+
+def _unwrap_descriptors(descriptors) -> dict:
+    """descriptors may come as the raw dict, the {"descriptor": {...}} wrapper or a JSON string of either"""
+    if isinstance(descriptors, str):
+        descriptors = give_json(descriptors) or {}
+    if isinstance(descriptors, dict) and isinstance(descriptors.get("descriptor"), dict):
+        descriptors = descriptors["descriptor"]
+    return descriptors if isinstance(descriptors, dict) else {}
+
+
+_FEATURE_KEYS = ("spectral_centroid", "spectral_bandwidth", "zero_crossing_rate", "rms",
+                 "harmonic_energy", "percussive_energy")
+
+
+def _feature_matrix(batch: List[dict]) -> np.ndarray:
+    """(N, 5) feature matrix, missing values fall back to neutral numbers"""
+    def col(key, default):
+        return np.array([float(d.get(key) or default) for d in batch])
+
+    sc = col("spectral_centroid", 1500.0)
+    bw = col("spectral_bandwidth", 1500.0)
+    zcr = col("zero_crossing_rate", 0.05)
+    rms = col("rms", 0.05)
+    harm = col("harmonic_energy", 0.0)
+    perc = col("percussive_energy", 0.0)
+
+    perc_ratio = perc / np.maximum(harm + perc, 1e-9)
+    return np.stack([
+        np.log2(np.maximum(sc, 1.0)),
+        np.log2(np.maximum(bw, 1.0)),
+        zcr,
+        perc_ratio,
+        20.0 * np.log10(np.maximum(rms, 1e-6)),
+    ], axis=1)
+
+
+def classify_batch(batch: List[dict]) -> List[dict]:
+    """
+    Vectorized nearest-centroid classification of many descriptor dicts at once.
+
+    args:
+        batch: list of descriptor dicts (compute_basic_descriptors output)
+    return:
+        list of ClassificationOutput compatible dicts
+    """
+    batch = [_unwrap_descriptors(d) for d in batch]
+    if not batch:
+        return []
+    X = _feature_matrix(batch)
+
+    # (N, K) scaled squared distances to every prototype in one go
+    d2 = (((X[:, None, :] - _PROTOTYPES[None, :, :]) / _SCALE) ** 2).sum(-1)
+    logits = -0.5 * d2
+    logits -= logits.max(axis=1, keepdims=True)
+    probs = np.exp(logits)
+    probs /= probs.sum(axis=1, keepdims=True)
+
+    # missing descriptors mean we mostly matched the neutral defaults, don't trust that
+    coverage = np.array([sum(d.get(k) is not None for k in _FEATURE_KEYS) / len(_FEATURE_KEYS) for d in batch])
+    # the softmax only says how much closer one prototype is than the rest, far from all of
+    # them it still goes to 1, so the distance to the nearest one caps it
+    confidence = np.minimum(probs.max(axis=1), _typicality(d2.min(axis=1))) * coverage
+
+    order = np.argsort(-probs, axis=1)
+    results = []
+    for i in range(len(batch)):
+        top, second = order[i, 0], order[i, 1]
+        texture = TEXTURES[top]
+        tags = list(_STYLE_TAGS[texture])
+        # runner-up texture contributes a tag when it is close
+        if probs[i, second] > 0.2:
+            tags.append(_STYLE_TAGS[TEXTURES[second]][0])
+        results.append({
+            "style_tags": tags[:4],
+            "genre_suggestions": list(_GENRES[texture]),
+            "texture": texture,
+            "confidence": round(float(confidence[i]), 2),
+        })
+    return results
+
+
+def classify_descriptors(descriptors: dict, llm=None):
     """
-    Heuristic classifier for MVP:
-      - uses spectral_centroid, zero_crossing_rate, rms to infer texture/tags
-      - returns JSON-serializable dict; optionally refines via LLM if LLM_API_KEY present
+    Heuristic classifier:
+      - nearest-centroid over spectral centroid, bandwidth, zcr, percussive ratio and loudness
+      - returns a dict that validates as ClassificationOutput; optionally refines via LLM if LLM_API_KEY present
     """
-    sc = descriptors.get("spectral_centroid") or 0.0
-    zcr = descriptors.get("zero_crossing_rate") or 0.0
-    rms = descriptors.get("rms") or 0.0
-
-    tags = []
-    confidence = 0.6
-
-    # Texture heuristics
-    if sc is None:
-        texture = "unknown"
-    elif sc > 3000:
-        texture = "bright"
-        tags.append("bright")
-        confidence = 0.75
-    elif sc > 1500:
-        texture = "mid-heavy"
-        tags.append("thick")
-        confidence = 0.7
-    else:
-        texture = "warm"
-        tags.append("warm")
-        confidence = 0.7
-
-    # Additional tags
-    try:
-        if zcr > 0.06:
-            tags.append("percussive")
-            confidence += 0.05
-    except Exception:
-        pass
-    try:
-        if rms > 0.08:
-            tags.append("loud")
-            confidence += 0.05
-    except Exception:
-        pass
-
-    confidence = min(0.95, round(confidence, 2))
+    result = classify_batch([descriptors])[0]
 
     # Optional LLM refinement
-    if os.getenv("LLM_API_KEY"):
+    if llm is not None and os.getenv("LLM_API_KEY"):
         try:
-            prompt = f"SYSTEM: classify audio descriptors to tags/texture JSON only. USER: {json.dumps(descriptors)}"
+            prompt = f"SYSTEM: classify audio descriptors to tags/texture JSON only. USER: {json.dumps(_unwrap_descriptors(descriptors))}"
             resp = llm.call(prompt)
             parsed = json.loads(resp.get("text", "{}"))
-            if isinstance(parsed, dict) and parsed.get("style_tags"):
-                # trust LLM response if valid
-                return {
-                    "style_tags": parsed.get("style_tags", []),
-                    "genre_suggestions": parsed.get("genre_suggestions", []),
-                    "texture": parsed.get("texture", texture),
-                    "confidence": parsed.get("confidence", confidence)
-                }
+            # trust LLM response if valid
+            return ClassificationOutput.model_validate(parsed).model_dump()
         except Exception:
             pass
 
-    return {
-        "style_tags": tags,
-        "genre_suggestions": [],
-        "texture": texture,
-        "confidence": confidence
-    }
+    return result
+
+
+class LocalClassifierAgent(BaseAgent):
+    """
+    Classifier stage that answers locally and only calls the LLM when unsure.
+
+    mode:
+        "local" - always use classify_descriptors
+        "llm"   - always delegate to the first sub agent (the Gemini classifier)
+        "auto"  - local result when its confidence >= confidence_threshold, LLM otherwise
+
+    env:
+        SOUNDSPARK_CLASSIFIER_MODE / SOUNDSPARK_CLASSIFIER_CONFIDENCE are the defaults of
+        mode / confidence_threshold, read when the agent is built
+    """
+
+    mode: Literal["local", "llm", "auto"] = Field(default_factory=lambda: os.getenv("SOUNDSPARK_CLASSIFIER_MODE", "auto"))
+    confidence_threshold: float = Field(
+        default_factory=lambda: float(os.getenv("SOUNDSPARK_CLASSIFIER_CONFIDENCE", DEFAULT_CONFIDENCE_THRESHOLD))
+    )
+    input_key: str = "descriptors"
+    output_key: str = "classification"
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        fallback: Optional[BaseAgent] = self.sub_agents[0] if self.sub_agents else None
+
+        result = None
+        if self.mode != "llm" or fallback is None:
+            descriptors = ctx.session.state.get(self.input_key)
+            result = classify_descriptors(descriptors)
+            if self.mode == "auto" and fallback is not None and result["confidence"] < self.confidence_threshold:
+                print(f"[classifier] : local confidence {result['confidence']} below threshold, asking the LLM")
+                result = None
+
+        if result is None:
+            async for event in fallback.run_async(ctx):
+                yield event
+            return
+
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=types.Content(role="model", parts=[types.Part(text=json.dumps(result))]),
+            actions=EventActions(state_delta={self.output_key: result}),
+        )
@@ -0,0 +1,129 @@
+import json
+import math
+import os
+import re
+from typing import Any, AsyncGenerator, List
+
+import numpy as np
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.genai import types
+from pydantic import Field
+
+from src.agents.classifier_agent import _SCALE, _feature_matrix, _unwrap_descriptors
+from src.tools.response_cache import get_response_cache, make_response_key
+from utils.check_prompt import AUDIO_EXTENSIONS
+
+# bin width in classifier feature units (see classifier_agent._SCALE), 0.5 means two bins per
+# prototype spread, so re-uploads and near duplicates of one sound land in the same bin
+DEFAULT_QUANTUM = 0.5
+
+_STOPWORDS = {
+    "a", "an", "the", "this", "that", "these", "to", "of", "for", "with", "and", "or", "on", "in", "into",
+    "my", "me", "i", "it", "its", "is", "be", "can", "could", "would", "you", "please", "some", "any",
+    "audio", "sound", "sample", "file", "give", "make", "want", "what", "how",
+}
+
+
+def descriptor_signature(descriptors, quantum: float = DEFAULT_QUANTUM) -> List[int]:
+    """
+    Quantized descriptor vector: the classifier feature vector in units of its spread,
+    binned by `quantum`, plus tempo in 4 bpm bins and pitch to the nearest semitone.
+    """
+    desc = _unwrap_descriptors(descriptors)
+    z = _feature_matrix([desc])[0] / _SCALE
+    bins = [int(b) for b in np.floor(z / quantum + 0.5)]
+
+    tempo = desc.get("tempo")
+    bins.append(int(round(float(tempo) / 4.0)) if tempo else -1)
+    pitch = desc.get("estimated_pitch_hz")
+    bins.append(int(round(12 * math.log2(float(pitch) / 440.0))) if pitch else -100)
+    return bins
+
+
+def normalize_intent(prompt: str) -> str:
+    """order / case / filler insensitive form of the prompt, with file paths dropped"""
+    words = []
+    for token in prompt.lower().split():
+        if token.strip("'\"`,;()[]<>").endswith(AUDIO_EXTENSIONS) or "/" in token or "\\" in token:
+            continue
+        for word in re.findall(r"[a-z]+", token):
+            if word not in _STOPWORDS:
+                # crude plural folding, "delays" and "delay" are the same ask
+                words.append(word[:-1] if len(word) > 3 and word.endswith("s") else word)
+    return " ".join(sorted(set(words)))
+
+
+def context_signature(value: Any) -> Any:
+    """a state value as it goes into the key, confidence scores left out (they wobble between runs)"""
+    if isinstance(value, dict):
+        return {k: v for k, v in value.items() if k != "confidence"}
+    return value
+
+
+class ResponseCacheAgent(BaseAgent):
+    """
+    Serves `output_key` from the response cache when a near identical sound (same quantized
+    descriptors) came with the same prompt intent, otherwise runs its first sub agent and
+    caches what it wrote to state this turn.
+
+    args:
+        context_keys: other state keys the answer depends on (e.g. "classification"), part of the key
+
+    env:
+        SOUNDSPARK_RESPONSE_CACHE: sqlite path, "" disables caching (the wrapper just delegates)
+        SOUNDSPARK_RESPONSE_CACHE_QUANTUM: default descriptor bin width (quantum), larger means
+            more hits, read when the agent is built
+    """
+
+    output_key: str
+    input_key: str = "descriptors"
+    context_keys: List[str] = []
+    quantum: float = Field(default_factory=lambda: float(os.getenv("SOUNDSPARK_RESPONSE_CACHE_QUANTUM", DEFAULT_QUANTUM)))
+
+    def _signature(self, ctx: InvocationContext, descriptors) -> dict:
+        """everything the answer depends on"""
+        prompt = ""
+        if ctx.user_content and ctx.user_content.parts:
+            prompt = " ".join(p.text for p in ctx.user_content.parts if p.text)
+        signature = {
+            "descriptors": descriptor_signature(descriptors, self.quantum),
+            "intent": normalize_intent(prompt),
+        }
+        for context_key in self.context_keys:
+            signature[context_key] = context_signature(ctx.session.state.get(context_key))
+        return signature
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        inner = self.sub_agents[0]
+        cache = get_response_cache()
+        descriptors = ctx.session.state.get(self.input_key)
+
+        key = None
+        if cache is not None and descriptors:
+            key = make_response_key(self.output_key, self._signature(ctx, descriptors))
+            cached = cache.get(key)
+            if cached is not None:
+                print(f"[response_cache] : '{self.output_key}' served from cache (hit rate {cache.hit_rate:.0%})")
+                text = cached if isinstance(cached, str) else json.dumps(cached)
+                yield Event(
+                    invocation_id=ctx.invocation_id,
+                    author=self.name,
+                    branch=ctx.branch,
+                    content=types.Content(role="model", parts=[types.Part(text=text)]),
+                    actions=EventActions(state_delta={self.output_key: cached}),
+                )
+                return
+
+        # only what the inner agent writes this turn is cached, an older value in the
+        # session state says nothing about this input
+        value = None
+        async for event in inner.run_async(ctx):
+            delta = event.actions.state_delta if event.actions else None
+            if delta and self.output_key in delta:
+                value = delta[self.output_key]
+            yield event
+
+        if key is not None and value is not None:
+            cache.put(key, value)
@@ -0,0 +1,404 @@
+"""
+Model backend selection for every agent in the pipelines.
+
+SOUNDSPARK_LLM_BACKEND=gemini (default) builds the real Gemini model, =stub swaps in
+StubLlm, an offline deterministic model. The stub answers each agent with a
+rule-generated response that validates against the agent's schema
+(ClassificationOutput, RecommenderOutput, SynthesisToolCall), derived from the
+descriptors / classification / prompt the agent was given, after a delay drawn from
+a configurable latency distribution. It is what the load harness (utils/load_test.py)
+runs against, and lets the non-LLM parts of the pipeline be benchmarked offline.
+
+env (stub only):
+    SOUNDSPARK_STUB_LATENCY: latency spec, see parse_latency_spec, e.g.
+        "lognormal:300,0.4;classifier_agent=fixed:50"
+    SOUNDSPARK_STUB_LATENCY_MS: shorthand for a fixed latency, used when the spec is unset
+    SOUNDSPARK_STUB_SEED: seed of the response / latency randomness (default 0)
+"""
+import ast
+import asyncio
+import json
+import math
+import os
+import random
+import re
+from functools import lru_cache
+from typing import AsyncGenerator, Dict, Optional, Tuple
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from utils.check_prompt import extract_audio_path
+from utils.output_schema import ClassificationOutput, RecommenderOutput, SynthesisToolCall
+
+DEFAULT_MODEL = "gemini-2.5-flash-lite"
+
+_AGENT_NAME = re.compile(r'Your internal name is "([^"]+)"')
+
+
+# ================================================================
+# latency distributions
+# ================================================================
+
+_LATENCY_KINDS = {
+    # name: (param count, sampler(rng, *params) -> ms)
+    "fixed": (1, lambda rng, ms: ms),
+    "uniform": (2, lambda rng, lo, hi: rng.uniform(lo, hi)),
+    "normal": (2, lambda rng, mean, std: max(0.0, rng.gauss(mean, std))),
+    # median in ms and sigma of the underlying normal, the usual long tailed API latency shape
+    "lognormal": (2, lambda rng, median, sigma: rng.lognormvariate(math.log(max(median, 1e-3)), sigma)),
+}
+
+
+@lru_cache(maxsize=32)
+def parse_latency_spec(spec: str) -> Dict[str, Tuple[str, Tuple[float, ...]]]:
+    """
+    Parses a latency spec into {agent name or "*": (kind, params)}.
+
+    The spec is a ';' separated list of `[agent=]kind:p1[,p2]` entries, kinds are
+    fixed:ms, uniform:lo_ms,hi_ms, normal:mean_ms,std_ms and lognormal:median_ms,sigma.
+    A bare number is a fixed latency and entries without an agent name are the default.
+
+    args:
+        spec: e.g. "lognormal:300,0.4;classifier_agent=fixed:50" or "250"
+    return:
+        dict of distributions, "*" holds the default
+    """
+    table = {"*": ("fixed", (0.0,))}
+    for entry in filter(None, (e.strip() for e in (spec or "").split(";"))):
+        agent, _, dist = entry.rpartition("=")
+        kind, _, raw = dist.partition(":")
+        if not raw:
+            kind, raw = "fixed", kind
+        if kind not in _LATENCY_KINDS:
+            raise ValueError(f"unknown latency distribution {kind!r} in {entry!r}, expected one of {sorted(_LATENCY_KINDS)}")
+        params = tuple(float(p) for p in raw.split(","))
+        if len(params) != _LATENCY_KINDS[kind][0]:
+            raise ValueError(f"latency distribution {kind!r} takes {_LATENCY_KINDS[kind][0]} parameter(s), got {entry!r}")
+        table[agent.strip() or "*"] = (kind, params)
+    return table
+
+
+def sample_latency_ms(table: Dict[str, Tuple[str, Tuple[float, ...]]], agent: str, rng: random.Random) -> float:
+    kind, params = table.get(agent, table["*"])
+    return _LATENCY_KINDS[kind][1](rng, *params)
+
+
+# ================================================================
+# request parsing helpers
+# ================================================================
+
+def _user_text(req: LlmRequest) -> str:
+    for content in req.contents:
+        if content.role == "user":
+            for part in content.parts or []:
+                if part.text:
+                    return part.text
+    return ""
+
+
+def _last_function_response(req: LlmRequest) -> Optional[dict]:
+    for content in reversed(req.contents):
+        for part in content.parts or []:
+            if part.function_response is not None:
+                return part.function_response.response
+    return None
+
+
+def _instruction(req: LlmRequest) -> str:
+    instruction = req.config.system_instruction if req.config else None
+    return instruction if isinstance(instruction, str) else str(instruction or "")
+
+
+def _agent_name(req: LlmRequest) -> str:
+    match = _AGENT_NAME.search(_instruction(req))
+    return match.group(1) if match else ""
+
+
+def _balanced(text: str, start: int) -> Optional[str]:
+    """the {...} block opening at `start`, braces inside quotes ignored"""
+    depth, quote = 0, None
+    for i in range(start, len(text)):
+        ch = text[i]
+        if quote:
+            if ch == quote and text[i - 1] != "\\":
+                quote = None
+        elif ch in "\"'":
+            quote = ch
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
+
+def _find_json_with(text: str, key: str) -> Optional[dict]:
+    """
+    first object embedded in `text` (the agent instruction after state injection) that has `key`.
+    State values written by output_schema agents are dicts and get injected as their Python
+    repr, so literal_eval is tried after JSON.
+    """
+    for match in re.finditer(r"\{", text):
+        block = _balanced(text, match.start())
+        if block is None or key not in block:
+            continue
+        for parse in (json.loads, ast.literal_eval):
+            try:
+                obj = parse(block)
+            except (ValueError, SyntaxError):
+                continue
+            if isinstance(obj, dict) and key in obj:
+                return obj
+    return None
+
+
+def _descriptors(req: LlmRequest) -> dict:
+    found = _find_json_with(_instruction(req), "descriptor") or {}
+    return found.get("descriptor") if isinstance(found.get("descriptor"), dict) else {}
+
+
+# ================================================================
+# rule based answers, one per agent, every structured one is schema validated
+# ================================================================
+
+def _classify(req: LlmRequest, rng: random.Random) -> str:
+    # the local nearest-centroid classifier is the rule set, with some seeded jitter on the confidence
+    from src.agents.classifier_agent import classify_batch
+
+    result = classify_batch([_descriptors(req)])[0]
+    result["confidence"] = round(min(1.0, max(0.0, result["confidence"] + rng.uniform(-0.05, 0.05))), 2)
+    return ClassificationOutput.model_validate(result).model_dump_json()
+
+
+def _sub_freq(desc: dict) -> float:
+    """the detected pitch folded down into the 40-80 Hz sub range, 55 Hz when unpitched"""
+    freq = desc.get("estimated_pitch_hz") or 55.0
+    while freq > 80.0:
+        freq /= 2.0
+    return round(max(freq, 40.0), 2)
+
+
+def _eighth_note_ms(desc: dict) -> int:
+    tempo = desc.get("tempo") or 120.0
+    return int(min(600, max(10, 60000.0 / tempo / 2)))
+
+
+def _recommend(req: LlmRequest, rng: random.Random) -> str:
+    desc = _descriptors(req)
+    classification = _find_json_with(_instruction(req), "texture") or {}
+    texture = classification.get("texture", "warm")
+    genre = (classification.get("genre_suggestions") or ["electronic"])[0]
+    centroid = desc.get("spectral_centroid") or 1500.0
+
+    if centroid > 2500.0:
+        tweak = ("Tame the highs", "Lowpass above the brightness peak.", {"filter": {"type": "lowpass", "cutoff_hz": int(centroid * 1.5)}})
+    else:
+        tweak = ("Open up the top", "Gentle high shelf for air.", {"filter": {"type": "high_shelf", "cutoff_hz": 8000, "gain_db": 3}})
+
+    items = [
+        ("layer", "Sub-sine layer", "Sine an octave or two below the root.", {"synth": "sine", "freq_hz": _sub_freq(desc), "gain_db": -6}),
+        ("fx_chain", "Tempo synced delay", "Eighth note echo, filtered repeats.", {"delay_ms": _eighth_note_ms(desc), "feedback": 0.3, "cutoff_hz": 4000}),
+        ("preset_tweak",) + tweak,
+        ("sample_keyword", f"{texture.title()} {genre} layer", "Search term for a complementary sample.", {"keyword": f"{texture} {genre}"}),
+    ]
+    confidences = sorted((round(rng.uniform(0.55, 0.95), 2) for _ in items), reverse=True)
+    out = {"recommendations": [
+        {"id": f"r{i + 1}", "type": kind, "title": title, "short_description": text,
+         "actionable_parameters": params, "confidence": conf}
+        for i, ((kind, title, text, params), conf) in enumerate(zip(items, confidences))
+    ]}
+    return RecommenderOutput.model_validate(out).model_dump_json()
+
+
+# prompt keywords -> params the synth rules switch on
+_INTENTS = {
+    "delay": ("delay", "echo", "repeat"),
+    "stereo": ("stereo", "wide", "width"),
+    "width": ("wide", "width", "widen"),
+    "ping_pong": ("ping pong", "ping-pong", "pingpong"),
+    "long": ("long", "ambient", "spacious"),
+    "distortion": ("distort", "gritty", "dirty", "saturat"),
+    "dark": ("dark", "warm", "muffled"),
+    "bright": ("bright", "airy", "crisp"),
+    "noise": ("noise", "lofi", "lo-fi", "vinyl"),
+}
+
+
+def _synth_call(req: LlmRequest, rng: random.Random) -> str:
+    desc = _descriptors(req)
+    prompt = _user_text(req).lower()
+    wants = {name for name, words in _INTENTS.items() if any(w in prompt for w in words)}
+
+    params = {}
+    if "delay" in wants or "stereo" in wants or "ping_pong" in wants:
+        mode = "ping_pong" if "ping_pong" in wants else "stereo" if "stereo" in wants else "mono"
+        params["delay"] = {
+            "enabled": True, "ms": _eighth_note_ms(desc), "mode": mode,
+            "feedback": 0.5 if "long" in wants else round(rng.uniform(0.2, 0.35), 2),
+            "tail_ms": 2000 if "long" in wants else 0,
+        }
+    if "width" in wants:
+        params["stereo_width"] = {"enabled": True, "width": 1.6, "haas_ms": 0.0 if "delay" in params else 12.0}
+    if "distortion" in wants:
+        params["distortion"] = {"enabled": True, "drive": round(rng.uniform(1.5, 2.5), 2)}
+    if "noise" in wants:
+        params["noise"] = {"enabled": True, "amp": 0.02}
+    if "dark" in wants:
+        params["global_lowpass"] = 4000.0
+    if "bright" in wants:
+        params["global_highpass"] = 200.0
+    if "dark" in wants and "delay" in params:
+        # darken the repeats too, the lowpass goes after the delay
+        params["fx_order"] = ["distortion", "global_highpass", "delay", "global_lowpass"]
+    if not params:
+        # no clear intent, the conservative default the synth prompt asks for
+        freq = _sub_freq(desc)
+        params["sub_sine"] = {"enabled": True, "freq_hz": freq, "amp": 0.5, "lowpass_cutoff": round(freq * 2.5, 2)}
+
+    audio_path = extract_audio_path(_user_text(req)) or "tests/sample_audio/pluck.wav"
+    name = os.path.splitext(os.path.basename(audio_path))[0]
+    call = {
+        "tool": "synthesis_tool",
+        "function": "apply_patch",
+        "args": {
+            # the schema only admits the sample folder, handle_llm_tool_call overrides both paths anyway
+            "input_audio_path": f"tests/sample_audio/{os.path.basename(audio_path)}",
+            "out_path": f"tests/synthesis_demo/{name}_layered.wav",
+            "mix_ratio": 0.75,
+            "params": params,
+        },
+    }
+    return SynthesisToolCall.model_validate(call).model_dump_json(exclude_none=True)
+
+
+def _sounds(obj):
+    """every {"name", "preview_url"} dict in a tool result, including ones inside JSON text parts"""
+    if isinstance(obj, str):
+        try:
+            obj = json.loads(obj)
+        except ValueError:
+            return
+    if isinstance(obj, dict):
+        if "preview_url" in obj:
+            yield obj
+            return
+        obj = list(obj.values())
+    if isinstance(obj, list):
+        for item in obj:
+            yield from _sounds(item)
+
+
+def _previews(req: LlmRequest, rng: random.Random) -> str:
+    hits = list(_sounds(_last_function_response(req) or {}))[:5]
+    if not hits:
+        return "No matching sounds found."
+    return "\n".join(f"- {hit.get('name', 'sound')} : {hit['preview_url']}" for hit in hits)
+
+
+def _summary(req: LlmRequest, rng: random.Random) -> str:
+    classification = _find_json_with(_instruction(req), "texture") or {}
+    recommendations = (_find_json_with(_instruction(req), "recommendations") or {}).get("recommendations", [])
+    lines = [f"- texture: {classification.get('texture', 'unknown')}",
+             f"- style: {', '.join(classification.get('style_tags', []))}"]
+    lines += [f"- {r.get('title')}: {r.get('short_description')}" for r in recommendations if isinstance(r, dict)]
+    return "\n".join(lines)
+
+
+_ANSWERS = {
+    "feature_agent": lambda req, rng: json.dumps({"descriptor": _last_function_response(req) or {}}),
+    "classifier_agent": _classify,
+    "recommender_agent": _recommend,
+    "sample_search_agent": _previews,
+    "seggregator_agent": _summary,
+    "synth_agent": _synth_call,
+    "chat_agent": lambda req, rng: "Stub reply: share an audio file path and I can analyze and layer it.",
+}
+
+
+def _tool_args(tool_name: str, req: LlmRequest) -> dict:
+    """arguments the stub passes when it decides to call a tool"""
+    if tool_name == "compute_basic_descriptors":
+        return {"path": extract_audio_path(_user_text(req)) or ""}
+    if tool_name == "find_similar_sounds":
+        return {"audio_path": extract_audio_path(_user_text(req)) or ""}
+    # anything else is treated as a search tool (the MCP sample search), query from the layer recommendation
+    recommendations = (_find_json_with(_instruction(req), "recommendations") or {}).get("recommendations", [])
+    layer = next((r for r in recommendations if isinstance(r, dict) and r.get("type") == "layer"), {})
+    return {"query": layer.get("title", "sub layer")}
+
+
+def _tokens(text: str) -> int:
+    # ~4 characters per token, close enough for relative numbers
+    return max(1, len(text) // 4)
+
+
+class StubLlm(BaseLlm):
+    """
+    Offline, deterministic stand-in for Gemini.
+
+    Calls the agent's first tool once when it has tools and no tool result yet, otherwise
+    answers with the agent's rule-generated response. The randomness (latency and small
+    variations in the answers) comes from an RNG seeded by (seed, agent, prompt, turn), so
+    the same request always gets the same answer and delay, whatever the concurrency.
+    """
+
+    latency: str = ""
+    seed: int = 0
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        agent = _agent_name(llm_request)
+        rng = random.Random(f"{self.seed}:{agent}:{_user_text(llm_request)}:{len(llm_request.contents)}")
+
+        delay = sample_latency_ms(parse_latency_spec(self.latency), agent, rng)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000.0)
+
+        tools = list(llm_request.tools_dict)
+        if tools and _last_function_response(llm_request) is None:
+            call = types.FunctionCall(name=tools[0], args=_tool_args(tools[0], llm_request))
+            part = types.Part(function_call=call)
+            output = json.dumps(call.args)
+        else:
+            output = _ANSWERS.get(agent, lambda req, rng: "{}")(llm_request, rng)
+            part = types.Part(text=output)
+
+        prompt_tokens = _tokens(_instruction(llm_request)) + sum(
+            _tokens(p.text or "") for c in llm_request.contents for p in (c.parts or [])
+        )
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[part]),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=_tokens(output),
+                total_token_count=prompt_tokens + _tokens(output),
+            ),
+            turn_complete=True,
+        )
+
+
+def make_model(model: str = DEFAULT_MODEL, retry_options: Optional[types.HttpRetryOptions] = None) -> BaseLlm:
+    """
+    The model every agent is built with, picked by SOUNDSPARK_LLM_BACKEND.
+
+    args:
+        model: Gemini model name
+        retry_options: Gemini http retry options, unused by the stub
+
+    return:
+        Gemini or StubLlm instance
+    """
+    backend = os.getenv("SOUNDSPARK_LLM_BACKEND", "gemini")
+    if backend == "stub":
+        latency = os.getenv("SOUNDSPARK_STUB_LATENCY") or os.getenv("SOUNDSPARK_STUB_LATENCY_MS", "0")
+        parse_latency_spec(latency)  # fail at build time on a bad spec, not on the first request
+        # keeps the gemini model name so built-in tools (google_search) still accept the request
+        return StubLlm(model=model, latency=latency, seed=int(os.getenv("SOUNDSPARK_STUB_SEED", 0)))
+    if backend != "gemini":
+        raise ValueError(f"unknown SOUNDSPARK_LLM_BACKEND {backend!r}, expected 'gemini' or 'stub'")
+
+    from google.adk.models.google_llm import Gemini
+    return Gemini(model=model, retry_options=retry_options)
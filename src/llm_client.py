@@ -1,9 +1,12 @@
-import os, time, json
+import os, time, json, random
 class LLMClient:
     def __init__(self, provider="mock"):
         self.provider = provider
         self.api_key = os.getenv("LLM_API_KEY")
 
     def call(self, prompt, max_tokens=512, temperature=0.4):
-        time.sleep(0.2)
+        # mock latency follows the stub model's distribution (src/llm_backend.py), 200 ms when unset
+        from src.llm_backend import parse_latency_spec, sample_latency_ms
+        latency = parse_latency_spec(os.getenv("SOUNDSPARK_STUB_LATENCY") or "200")
+        time.sleep(sample_latency_ms(latency, "llm_client", random.Random(prompt)) / 1000.0)
         return {"text": '{"mock": "response"}', "raw": "mock"}
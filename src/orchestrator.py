@@ -1,36 +1,65 @@
-from src.tools.feature_extractor import compute_basic_descriptors
-from google.adk.agents import SequentialAgent, LlmAgent, Agent
-from google.adk.models.google_llm import Gemini
-from google.adk.tools import google_search, AgentTool, load_memory
-from google.adk.tools.function_tool import FunctionTool
-from google.adk.apps.app import App, ResumabilityConfig, EventsCompactionConfig
-from google.adk.tools.tool_context import ToolContext
-from utils.retry_config import retry_config
 import warnings
-
-from utils.output_schema import ClassificationOutput
-from src.tools.mcp_sound_tool import mcp_sound_server
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional
+
+# ADK, the agent classes, the DSP tools and the MCP client are imported inside the
+# factories, so `import src.orchestrator` is cheap and nothing heavy loads until an app
+# is actually built (the same split as app.py, see utils/cold_start_budget.json)
+if TYPE_CHECKING:
+    from google.adk.agents import Agent, LlmAgent, SequentialAgent
+    from google.adk.apps.app import App
+    from src.agents.audio_feature_agent import FastFeatureAgent
+    from src.agents.classifier_agent import LocalClassifierAgent
+    from src.agents.response_cache_agent import ResponseCacheAgent
 
 warnings.filterwarnings("ignore")
 
+
+def _model():
+    from src.llm_backend import make_model
+    from utils.retry_config import retry_config
+
+    return make_model(retry_options=retry_config)
+
+# Every stage is built by a factory so the same stage can be instantiated for more than
+# one pipeline (an ADK agent can only ever have a single parent).
+
 # ================================================
-# 1 Audio Feature Extracter tool 
-_feature_agent_instance = Agent(
-    name="feature_agent",
-    model=Gemini(model="gemini-2.5-flash-lite", retry_options=retry_config), 
-    description="A simple agent that can describe the given audio sample.",
-    instruction="""
-    You are a audio feature extrator agent, you are not suppose to chat with user.
-    1. The user will provide a prompt containing a file path.
-    2. Use the 'compute_basic_descriptors' tool with that 'audio_path' to extract audio features.
-    3. Your final output MUST be a valid JSON object with a SINGLE key 
-       named 'descriptor'.
-    """,
-    tools=[compute_basic_descriptors],
-    output_key="descriptors"
-)
-
-print("[orchestrator] : Audio feature agent created")
+# 1 Audio Feature Extracter tool
+def make_feature_agent() -> "Agent":
+    from google.adk.agents import Agent
+    # async, pool backed version of the DSP tool, the sync one would block the event loop
+    from src.tools.pooled_tools import compute_basic_descriptors
+
+    return Agent(
+        name="feature_agent",
+        model=_model(),
+        description="A simple agent that can describe the given audio sample.",
+        instruction="""
+        You are a audio feature extrator agent, you are not suppose to chat with user.
+        1. The user will provide a prompt containing a file path.
+        2. Use the 'compute_basic_descriptors' tool with that 'audio_path' to extract audio features.
+        3. Your final output MUST be a valid JSON object with a SINGLE key
+           named 'descriptor'.
+        """,
+        tools=[compute_basic_descriptors],
+        output_key="descriptors"
+    )
+
+# deterministic front for the feature agent, runs the extractor without an LLM round trip
+# and only delegates to the feature agent when it can't find the audio in the prompt
+def make_feature_stage() -> "FastFeatureAgent":
+    from src.agents.audio_feature_agent import FastFeatureAgent
+    from src.tools.mcp_sound_tool import warm_mcp_callback
+
+    return FastFeatureAgent(
+        name="feature_fast_path",
+        description="Runs compute_basic_descriptors directly on the audio path in the prompt.",
+        sub_agents=[make_feature_agent()],
+        output_key="descriptors",
+        # first stage of the analysis pipeline, start waking the MCP server so it's warm by sample search
+        before_agent_callback=warm_mcp_callback,
+    )
 
 # ==================================================
 
@@ -41,26 +70,54 @@ print("[orchestrator] : Audio feature agent created")
 
 
 # ==================================================
-# 2 Classifier agent, to classify the genre, mood of the given audio sample 
-_classifier_agent_instance = Agent(
-    name="classifier_agent",
-    model=Gemini(model="gemini-2.5-flash-lite", retry_options=retry_config),
-    instruction="""
-    You are an expert audio classifier.
-    
-    1. You will receive JSON string {descriptors} containing audio features.
-    2. Analyze these features to determine the nature of the sound.
-    3. STRICTLY Return JSON with keys: 
-        "style_tags" (list of up to 4 descriptive tags), 
-        "genre_suggestions" (list up to 3), 
-        "texture" (one of: 'gritty','warm','bright','dark','percussive','smooth','wide'), 
-        "confidence" (0-1 float). 
-    """,
-    output_schema=ClassificationOutput,
-    output_key="classification",
-)
-
-print("[orchestrator] : Audio Classifier agent created")
+# 2 Classifier agent, to classify the genre, mood of the given audio sample
+def make_classifier_agent() -> "Agent":
+    from google.adk.agents import Agent
+    from utils.output_schema import ClassificationOutput
+
+    return Agent(
+        name="classifier_agent",
+        model=_model(),
+        instruction="""
+        You are an expert audio classifier.
+
+        1. You will receive JSON string {descriptors} containing audio features.
+        2. Analyze these features to determine the nature of the sound.
+        3. STRICTLY Return JSON with keys:
+            "style_tags" (list of up to 4 descriptive tags),
+            "genre_suggestions" (list up to 3),
+            "texture" (one of: 'gritty','warm','bright','dark','percussive','smooth','wide'),
+            "confidence" (0-1 float).
+        """,
+        output_schema=ClassificationOutput,
+        output_key="classification",
+    )
+
+# local nearest-centroid classifier in front of the LLM one, the Gemini call only
+# happens for low confidence results (or always / never, depending on `mode`)
+# `mode` and `confidence_threshold` default to SOUNDSPARK_CLASSIFIER_MODE / _CONFIDENCE
+def make_classifier_stage(mode: Optional[str] = None, confidence_threshold: Optional[float] = None) -> "LocalClassifierAgent":
+    from src.agents.classifier_agent import LocalClassifierAgent
+
+    settings = {"mode": mode, "confidence_threshold": confidence_threshold}
+    return LocalClassifierAgent(
+        name="classifier_stage",
+        description="Classifies descriptors locally and falls back to the LLM classifier when unsure.",
+        sub_agents=[make_classifier_agent()],
+        output_key="classification",
+        **{k: v for k, v in settings.items() if v is not None},
+    )
+
+# near duplicate uploads with the same ask skip classification altogether
+def make_cached_classifier_stage(mode: Optional[str] = None, confidence_threshold: Optional[float] = None) -> "ResponseCacheAgent":
+    from src.agents.response_cache_agent import ResponseCacheAgent
+
+    return ResponseCacheAgent(
+        name="classifier_cache",
+        description="Serves the classification from the response cache for near identical descriptors and prompt intent.",
+        sub_agents=[make_classifier_stage(mode, confidence_threshold)],
+        output_key="classification",
+    )
 
 # ==================================================
 
@@ -72,31 +129,52 @@ print("[orchestrator] : Audio Classifier agent created")
 
 # ===================================================
 
-# 3. Recommender agent, 
-_recommender_agent = Agent(
-    name="recommender_agent",
-    model=Gemini(model="gemini-2.5-flash-lite", retry_options=retry_config),
-    instruction="""You are a sound recommender, who have professional and creative knowledge about sound designing and musical genres.
-    1. use the {descriptors} and {classification} information of the audio given by the user and user prompt
-    2. if user prompt has an intent or goal to do with given sound use that to give recommendations of the sounds or you can use your own creative approach 
-    3. Style rules snippet (JSON) which lists typical layers, fx_chains, sample_keywords and preset_tweaks for the detected style.
-    
-    Produce a JSON object: {{
-        "recommendations": [
-            {{ "id": "<id>", "type":"layer|fx_chain|preset_tweak|sample_keyword|variation",
-            "title":"", "short_description":"", "actionable_parameters":{{}}, "confidence":0.0 }}
-        ]
-        }}
-
-    Constraints:
-    - Produce 4 recommendations, ranked by confidence (highest first).
-    - For each "actionable_parameters" include concrete parameters (e.g. cutoff_hz, gain_db, synth: 'sine', filter: {{...}}).
-    - Output MUST BE a JSON
-    """,
-    output_key="recommendations",
-) 
-
-print("[orchestrator] : Recommender Agent is created")
+# 3. Recommender agent,
+def make_recommender_agent() -> "Agent":
+    from google.adk.agents import Agent
+    from src.tools.pooled_tools import find_similar_sounds
+
+    return Agent(
+        name="recommender_agent",
+        model=_model(),
+        instruction="""You are a sound recommender, who have professional and creative knowledge about sound designing and musical genres.
+        1. use the {descriptors} and {classification} information of the audio given by the user and user prompt
+        2. if user prompt has an intent or goal to do with given sound use that to give recommendations of the sounds or you can use your own creative approach
+        3. Style rules snippet (JSON) which lists typical layers, fx_chains, sample_keywords and preset_tweaks for the detected style.
+
+        Produce a JSON object: {{
+            "recommendations": [
+                {{ "id": "<id>", "type":"layer|fx_chain|preset_tweak|sample_keyword|variation",
+                "title":"", "short_description":"", "actionable_parameters":{{}}, "confidence":0.0 }}
+            ]
+            }}
+
+        Constraints:
+        - Produce 4 recommendations, ranked by confidence (highest first).
+        - For each "actionable_parameters" include concrete parameters (e.g. cutoff_hz, gain_db, synth: 'sine', filter: {{...}}).
+        - Output MUST BE a JSON
+        - you may call 'find_similar_sounds' with the audio path from the user prompt to see which previously analyzed or rendered sounds are closest, and use them as references
+        """,
+        tools=[find_similar_sounds],
+        output_key="recommendations",
+    )
+
+# the recommender LLM call is the one worth caching, most traffic is a few sound categories
+def make_recommender_stage() -> "ResponseCacheAgent":
+    from src.agents.response_cache_agent import ResponseCacheAgent
+
+    return ResponseCacheAgent(
+        name="recommender_cache",
+        description="Serves recommendations from the response cache for near identical descriptors and prompt intent.",
+        sub_agents=[make_recommender_agent()],
+        output_key="recommendations",
+        # the recommender reads the classification. The find_similar_sounds neighbours it may
+        # look at are left out of the key: they shift with every indexed file, and a
+        # near-identical re-upload is itself a neighbour of the original. A cached answer can
+        # miss the newest neighbours until it expires (SOUNDSPARK_RESPONSE_CACHE_TTL)
+        context_keys=["classification"],
+    )
+
 # ===================================================
 
 
@@ -104,85 +182,185 @@ print("[orchestrator] : Recommender Agent is created")
 # ===================================================
 
 # 4. sample search agent
-_sample_search_agent = Agent(
-    name="sample_search_agent",
-    model=Gemini(model="gemini-2.5-flash-lite", retry_options=retry_config),
-    description="This agent will rely on recommendations and search for such sounds and show it to users to preview it",
-    instruction="""You are a sample sound searcher
-    - using the type layer in {recommendations}, use the tool 'mcp_sound_server' to look for 5 distict sounds to recommend to user
-    - lit the 5 found sounds in below manner 
-        - found sound sample name : it's preview URL IMPORTATN! THE URL COMES AFTER SOUND NAME AND ALL URLs MUST BE WORKING ONES  
-    """,
-    tools=[mcp_sound_server],
-    output_key='preview_sounds'
-)
+def make_sample_search_agent() -> "Agent":
+    from google.adk.agents import Agent
+    from src.tools.mcp_sound_tool import get_mcp_sound_server, await_mcp_callback
+
+    return Agent(
+        name="sample_search_agent",
+        model=_model(),
+        description="This agent will rely on recommendations and search for such sounds and show it to users to preview it",
+        instruction="""You are a sample sound searcher
+        - using the type layer in {recommendations}, use the tool 'mcp_sound_server' to look for 5 distict sounds to recommend to user
+        - lit the 5 found sounds in below manner
+            - found sound sample name : it's preview URL IMPORTATN! THE URL COMES AFTER SOUND NAME AND ALL URLs MUST BE WORKING ONES
+        """,
+        tools=[get_mcp_sound_server()],
+        output_key='preview_sounds',
+        # only this stage needs the server, so only this stage waits for it to wake up
+        before_agent_callback=await_mcp_callback,
+    )
 # ===================================================
 
 
 
 # root agent to do the talking with user and aggregation of the things
-_seggregator_agent = Agent(
-    name="seggregator_agent",
-    model=Gemini(model="gemini-2.5-flash-lite", retry_options=retry_config),
-    description="This is the main face of the sound designer agent, it will manage other subagents too and pass them the key info needed",
-    instruction="""
-    Combine these three results into one response
-    - {classification} turn this JSON into bullet point, consider Top level to be parent and do indentation for childs bullet points, REDACT CONFIDENCE VALUE
-    - {recommendations} turn this JSON into bullet point, consider Top level to be parent and do indentation for childs bullet points REDACT CONFIDENCE VALUE & DON'T REWRITE 'short_description'
-    - {preview_sounds}, DON'T REWRITE AND PRESERVE THE STRUCTURE
-    - All points MUST be one liner
-    """,
-)
-   
+def make_seggregator_agent() -> "Agent":
+    from google.adk.agents import Agent
+
+    return Agent(
+        name="seggregator_agent",
+        model=_model(),
+        description="This is the main face of the sound designer agent, it will manage other subagents too and pass them the key info needed",
+        instruction="""
+        Combine these three results into one response
+        - {classification} turn this JSON into bullet point, consider Top level to be parent and do indentation for childs bullet points, REDACT CONFIDENCE VALUE
+        - {recommendations} turn this JSON into bullet point, consider Top level to be parent and do indentation for childs bullet points REDACT CONFIDENCE VALUE & DON'T REWRITE 'short_description'
+        - {preview_sounds}, DON'T REWRITE AND PRESERVE THE STRUCTURE
+        - All points MUST be one liner
+        """,
+    )
+
+
+# ===================================================
+# Agents and apps are built on first use (get_orchestrator_app / get_chat_app),
+# importing this module doesn't construct anything.
+# ===================================================
+
+@lru_cache(maxsize=None)
+def get_orchestrator() -> "SequentialAgent":
+    from google.adk.agents import SequentialAgent
+
+    _feature_fast_path = make_feature_stage()
+    print("[orchestrator] : Audio feature agent created")
 
-print("[orchestrator] : Root agent to use orchestrator is created")
+    _classifier_stage = make_cached_classifier_stage()
+    print("[orchestrator] : Audio Classifier agent created")
 
+    _recommender_agent = make_recommender_stage()
+    print("[orchestrator] : Recommender Agent is created")
 
+    _sample_search_agent = make_sample_search_agent()
 
-# Orchestrator pipeline 
-orchestrator = SequentialAgent(
-    name= "orchestrator",
-    description="This is the start of the pipeline that orchestrates and runs the sub-agents in the sequential manner.",
-    sub_agents=[_feature_agent_instance, _classifier_agent_instance, _recommender_agent, _sample_search_agent, _seggregator_agent], 
-)
+    _seggregator_agent = make_seggregator_agent()
+    print("[orchestrator] : Root agent to use orchestrator is created")
 
-print("[orchestrator] : Orchestrator  Pipeline created")
+    # Orchestrator pipeline
+    orchestrator = SequentialAgent(
+        name= "orchestrator",
+        description="This is the start of the pipeline that orchestrates and runs the sub-agents in the sequential manner.",
+        sub_agents=[_feature_fast_path, _classifier_stage, _recommender_agent, _sample_search_agent, _seggregator_agent],
+    )
 
+    print("[orchestrator] : Orchestrator  Pipeline created")
+    return orchestrator
 
 
-# Orchestrator App Wrapper for advanced feature access
-orchestrator_app = App(
-    name="agents",
-    root_agent=orchestrator,   # TODO : we need to replace orchestrator with an agent that can take these values and work on them, root agent is messing up.
-    resumability_config=ResumabilityConfig(is_resumable=True),
-)
+@lru_cache(maxsize=None)
+def get_orchestrator_app() -> "App":
+    from google.adk.apps.app import App, ResumabilityConfig
+    from src.tracing import app_plugins
+
+    # Orchestrator App Wrapper for advanced feature access
+    return App(
+        name="agents",
+        root_agent=get_orchestrator(),   # TODO : we need to replace orchestrator with an agent that can take these values and work on them, root agent is messing up.
+        resumability_config=ResumabilityConfig(is_resumable=True),
+        plugins=app_plugins(),
+    )
 
 #  =================================================================================================================
-#  We need a light pipeline route, in case user didn't share or wants any audio file analysis and suggestion on that 
+#  DAG mode: same stages plus the synth parameter agent, scheduled by the state keys they read and write, so
+#  independent branches (e.g. synth params vs classifier -> recommender -> sample search) run concurrently
 #  =================================================================================================================
 
-# lighter chat_agent without any heavy tools and MCP calls and with low latency to reply to user   
-chat_agent = LlmAgent(
-    name="chat_agent",
-    model=Gemini(model="gemini-2.5-flash-lite", retry_options=retry_config),
-    description="This agent deals with a scenario where user don't need any file analysis or have sound designing sample suggestions user might ask like: what was my previously sent file, It will simply do the database Session look up for this instead of redoing the orchestrator pipeline",
-    instruction="""You are SoundSpark's conversational assistant. 
-    - Answer user questions about music, sound design and recommendations use the session context.
-    - if user asks about previous conversation use 'load_memory' to look for the context 
-    - Do not assume or invent user's uploaded files. If the user refers to 'my previous file' and no session file exists, ask them to re-upload or provide the file path.
-    - If the user asks a general chatty question unrelated to audio (e.g., 'how are you', 'what plugins are good for reverb'), simply reply if unsure you may use google_search tool.
-    - If unclear whether we need audio analysis, choose "clarify" and ask a 1-line clarifying question.
-    """,
-    tools=[google_search]  #TODO : Use load_memory tool via VertexAI
-)
-
+def build_orchestrator_dag_app() -> "App":
+    """
+    Builds the DAG flavoured orchestrator app, with fresh agent instances.
+    The synth agent's tool call JSON lands in state under 'synth_call'.
+    """
+    from google.adk.apps.app import App
+    from src.pipeline_dag import Stage, build_dag_agent
+    from src.tracing import app_plugins
+    from synthesize import make_synth_agent
+
+    stages = [
+        Stage(make_feature_stage(), requires=(), produces=("descriptors",)),
+        Stage(make_cached_classifier_stage(), requires=("descriptors",), produces=("classification",)),
+        Stage(make_recommender_stage(), requires=("descriptors", "classification"), produces=("recommendations",)),
+        Stage(make_sample_search_agent(), requires=("recommendations",), produces=("preview_sounds",)),
+        Stage(make_seggregator_agent(), requires=("classification", "recommendations", "preview_sounds"), produces=()),
+        Stage(make_synth_agent(output_key="synth_call"), requires=("descriptors",), produces=("synth_call",)),
+    ]
+    dag = build_dag_agent(
+        name="orchestrator_dag",
+        stages=stages,
+        description="Runs the orchestrator stages as a dependency graph, independent branches in parallel.",
+    )
+    print("[orchestrator] : Orchestrator DAG Pipeline created")
+
+    # not resumable: ADK's resumable LlmAgent end-of-agent check reads the last two events
+    # of its branch, and a single-reply agent alone in a parallel branch only has one
+    return App(
+        name="agents",
+        root_agent=dag,
+        plugins=app_plugins(),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_orchestrator_dag_app() -> "App":
+    return build_orchestrator_dag_app()
 
+#  =================================================================================================================
+#  We need a light pipeline route, in case user didn't share or wants any audio file analysis and suggestion on that
+#  =================================================================================================================
 
+# lighter chat_agent without any heavy tools and MCP calls and with low latency to reply to user
+@lru_cache(maxsize=None)
+def get_chat_agent() -> "LlmAgent":
+    from google.adk.agents import LlmAgent
+    from google.adk.tools import google_search
+
+    return LlmAgent(
+        name="chat_agent",
+        model=_model(),
+        description="This agent deals with a scenario where user don't need any file analysis or have sound designing sample suggestions user might ask like: what was my previously sent file, It will simply do the database Session look up for this instead of redoing the orchestrator pipeline",
+        instruction="""You are SoundSpark's conversational assistant.
+        - Answer user questions about music, sound design and recommendations use the session context.
+        - if user asks about previous conversation use 'load_memory' to look for the context
+        - Do not assume or invent user's uploaded files. If the user refers to 'my previous file' and no session file exists, ask them to re-upload or provide the file path.
+        - If the user asks a general chatty question unrelated to audio (e.g., 'how are you', 'what plugins are good for reverb'), simply reply if unsure you may use google_search tool.
+        - If unclear whether we need audio analysis, choose "clarify" and ask a 1-line clarifying question.
+        """,
+        tools=[google_search]  #TODO : Use load_memory tool via VertexAI
+    )
 
 
 # Chat App wrapper in case user just gives prompt and wants no audio analysis for sound design
-chat_app = App(
-    name="agents",
-    root_agent=chat_agent,
-    resumability_config=ResumabilityConfig(is_resumable=True),
-) 
+@lru_cache(maxsize=None)
+def get_chat_app() -> "App":
+    from google.adk.apps.app import App, ResumabilityConfig
+    from src.tracing import app_plugins
+
+    return App(
+        name="agents",
+        root_agent=get_chat_agent(),
+        resumability_config=ResumabilityConfig(is_resumable=True),
+        plugins=app_plugins(),
+    )
+
+
+_LAZY_ATTRS = {
+    "orchestrator": get_orchestrator,
+    "orchestrator_app": get_orchestrator_app,
+    "chat_agent": get_chat_agent,
+    "chat_app": get_chat_app,
+}
+
+
+def __getattr__(name):
+    # the old module level names still resolve, built on first access
+    if name in _LAZY_ATTRS:
+        return _LAZY_ATTRS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,84 @@
+from typing import Iterable, List, NamedTuple, Tuple
+
+from google.adk.agents import BaseAgent, ParallelAgent, SequentialAgent
+
+
+class Stage(NamedTuple):
+    """One pipeline stage and the session state keys it reads / writes"""
+    agent: BaseAgent
+    requires: Tuple[str, ...] = ()
+    produces: Tuple[str, ...] = ()
+
+
+def _plan(stages: List[Stage], available: Iterable[str] = ()) -> List[List[List[Stage]]]:
+    """
+    Turns the dependency graph into steps -> parallel branches -> sequential chains.
+
+    Each step starts from every stage whose inputs are already in state. Each of those
+    becomes its own branch, and a branch keeps absorbing the next stage that only needs
+    what that branch (plus earlier steps) produces, up to the next fork. So a chain like
+    classifier -> recommender -> sample search never waits on an unrelated sibling branch.
+    """
+    done = set(available)
+    remaining = list(stages)
+    steps = []
+    while remaining:
+        ready = [s for s in remaining if set(s.requires) <= done]
+        if not ready:
+            missing = {k for s in remaining for k in s.requires} - done
+            raise ValueError(f"pipeline stages can never run, nothing produces: {sorted(missing)}")
+
+        claimed = {id(s) for s in ready}
+        branches = []
+        for root in ready:
+            chain = [root]
+            produced = done | set(root.produces)
+            while True:
+                nxt = [s for s in remaining if id(s) not in claimed and set(s.requires) <= produced]
+                # stop at forks, the next step fans them out in parallel
+                if len(nxt) != 1:
+                    break
+                chain.append(nxt[0])
+                claimed.add(id(nxt[0]))
+                produced |= set(nxt[0].produces)
+            branches.append(chain)
+
+        steps.append(branches)
+        for chain in branches:
+            for s in chain:
+                done |= set(s.produces)
+        remaining = [s for s in remaining if id(s) not in claimed]
+    return steps
+
+
+def build_dag_agent(name: str, stages: List[Stage], available: Iterable[str] = (), description: str = "") -> BaseAgent:
+    """
+    Builds an ADK agent tree that runs `stages` in dependency order, with independent
+    branches under a ParallelAgent so wall-clock time follows the critical path.
+
+    args:
+        name: name of the root agent
+        stages: Stage list, state keys in requires/produces are the dependency edges
+        available: state keys that already exist before the pipeline starts
+        description: root agent description
+
+    return:
+        SequentialAgent of steps, each step a single agent / chain or a ParallelAgent of chains
+    """
+    steps: List[BaseAgent] = []
+    for i, branches in enumerate(_plan(stages, available)):
+        branch_agents = []
+        for j, chain in enumerate(branches):
+            if len(chain) == 1:
+                branch_agents.append(chain[0].agent)
+            else:
+                branch_agents.append(SequentialAgent(
+                    name=f"{name}_step{i}_branch{j}",
+                    sub_agents=[s.agent for s in chain],
+                ))
+        if len(branch_agents) == 1:
+            steps.append(branch_agents[0])
+        else:
+            steps.append(ParallelAgent(name=f"{name}_step{i}", sub_agents=branch_agents))
+
+    return SequentialAgent(name=name, description=description, sub_agents=steps)
@@ -0,0 +1,338 @@
+# src/tools/analysis_engine.py
+import numpy as np
+from functools import cached_property
+from typing import List, Optional, Tuple
+
+from src.tools.audio_store import load_audio
+from utils.lazy_import import lazy_import
+
+librosa = lazy_import("librosa")
+signal = lazy_import("scipy.signal")
+
+# STFT settings shared by every spectral descriptor, these are librosa's defaults
+# so the numbers match what the per-feature librosa calls used to produce
+N_FFT = 2048
+HOP_LENGTH = 512
+
+N_MFCC = 20
+
+# ITU-R BS.1770 K-weighting as (gain dB, Q, center Hz) of the shelf and high pass stages,
+# redesigned for the engine's sample rate (libebur128's derivation, reproduces the 48 kHz table)
+_K_SHELF = (3.999843853973347, 0.7071752369554196, 1681.974450955533)
+_K_HIGHPASS = (0.5003270373238773, 38.13547087602444)
+LUFS_FLOOR = -70.0
+
+# backends of AnalysisEngine.pitch, see there
+PITCH_BACKENDS = ("pyin", "yin", "pyin_voiced", "pyin_decimated")
+# YIN aperiodicity threshold, frames whose best dip is above it count as unvoiced
+YIN_THRESHOLD = 0.2
+# frames this far below the loudest one are silence for the pitch trackers
+PITCH_TOP_DB = 40.0
+# pitch resolution of the reduced pyin backends, in semitones. pyin's Viterbi is dense
+# in the number of pitch states, and we only need the nearest semitone
+PYIN_COARSE_RESOLUTION = 0.5
+# frame to frame level jump counted as an onset by the excerpt scan
+EXCERPT_ONSET_DB = 3.0
+
+
+def _k_weighting(sr: int):
+    """(b, a) biquads of the BS.1770 pre-filter at `sr`"""
+    g, q, fc = _K_SHELF
+    k = np.tan(np.pi * fc / sr)
+    vh = 10 ** (g / 20.0)
+    vb = vh ** 0.4996667741545416
+    a0 = 1.0 + k / q + k * k
+    shelf = (
+        np.array([vh + vb * k / q + k * k, 2.0 * (k * k - vh), vh - vb * k / q + k * k]) / a0,
+        np.array([a0, 2.0 * (k * k - 1.0), 1.0 - k / q + k * k]) / a0,
+    )
+
+    q, fc = _K_HIGHPASS
+    k = np.tan(np.pi * fc / sr)
+    a0 = 1.0 + k / q + k * k
+    highpass = (
+        np.array([1.0, -2.0, 1.0]),
+        np.array([a0, 2.0 * (k * k - 1.0), 1.0 - k / q + k * k]) / a0,
+    )
+    return [shelf, highpass]
+
+
+class AnalysisEngine:
+    """
+    Single-pass analysis graph for one decoded audio signal.
+
+    Every intermediate (STFT magnitude, mel power, onset envelope, HPSS split) is
+    computed lazily on first access and then shared, so asking for the centroid,
+    bandwidth, beat and harmonic/percussive energy only pays for one STFT.
+
+    args:
+        y: mono audio signal
+        sr: sample rate of y
+        n_fft: FFT size of the shared STFT
+        hop_length: hop size of the shared STFT
+    """
+
+    def __init__(self, y: np.ndarray, sr: int, n_fft: int = N_FFT, hop_length: int = HOP_LENGTH):
+        self.y = y
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+
+    @classmethod
+    def from_file(cls, path: str, sr: Optional[int] = 22050, **kwargs) -> "AnalysisEngine":
+        # the decoded buffer is shared with the renderer, see audio_store
+        y, sr = load_audio(path, sr=sr)
+        return cls(y, sr, **kwargs)
+
+    @property
+    def duration(self) -> float:
+        return float(len(self.y) / self.sr)
+
+    def excerpt(self, start: int, end: int) -> "AnalysisEngine":
+        """fresh engine over samples [start, end) with the same STFT settings"""
+        return AnalysisEngine(self.y[start:end], self.sr, n_fft=self.n_fft, hop_length=self.hop_length)
+
+    def excerpt_windows(self, k: int, seconds: float) -> List[Tuple[int, int, int]]:
+        """
+        Picks k representative windows of `seconds` out of the signal cut into equal tiles.
+        Tiles are ranked by level and split into k equally sized strata, each stratum is
+        represented by its tile with the most typical onset density. Only a time domain
+        RMS pass touches the whole signal.
+
+        return:
+            list of (start sample, end sample, number of tiles the window stands for),
+            a single whole-signal window when the signal is under 2 * k windows long
+        """
+        win = int(round(seconds * self.sr))
+        n_tiles = len(self.y) // win if win > 0 else 0
+        if k <= 0 or n_tiles < 2 * k:
+            return [(0, len(self.y), 1)]
+
+        rms = librosa.feature.rms(y=self.y, frame_length=self.n_fft, hop_length=self.hop_length)[0]
+        level = 20.0 * np.log10(np.maximum(rms, 1e-6))
+        onsets = np.diff(level, prepend=level[0]) > EXCERPT_ONSET_DB
+
+        # frames -> tiles, a tile owns the frames whose centre falls inside it
+        tile_of_frame = np.minimum(np.arange(len(level)) * self.hop_length // win, n_tiles - 1)
+        counts = np.bincount(tile_of_frame, minlength=n_tiles)
+        tile_level = np.bincount(tile_of_frame, weights=level, minlength=n_tiles) / np.maximum(counts, 1)
+        tile_onsets = np.bincount(tile_of_frame, weights=onsets, minlength=n_tiles)
+
+        windows = []
+        for stratum in np.array_split(np.argsort(tile_level, kind="stable"), k):
+            typical = np.median(tile_onsets[stratum])
+            tile = int(stratum[np.argmin(np.abs(tile_onsets[stratum] - typical))])
+            windows.append((tile * win, (tile + 1) * win, len(stratum)))
+        return sorted(windows)
+
+    # ---------------- shared spectral nodes ----------------
+
+    @cached_property
+    def stft(self) -> np.ndarray:
+        """complex STFT of the signal, the root every spectral node hangs off"""
+        return librosa.stft(self.y, n_fft=self.n_fft, hop_length=self.hop_length)
+
+    @cached_property
+    def magnitude(self) -> np.ndarray:
+        return np.abs(self.stft)
+
+    @cached_property
+    def power(self) -> np.ndarray:
+        return self.magnitude ** 2
+
+    @cached_property
+    def mel_db(self) -> np.ndarray:
+        """log-power mel spectrogram, the same input librosa.onset uses internally"""
+        mel = librosa.feature.melspectrogram(S=self.power, sr=self.sr)
+        return librosa.power_to_db(mel)
+
+    @cached_property
+    def onset_envelope(self) -> np.ndarray:
+        return librosa.onset.onset_strength(S=self.mel_db, sr=self.sr, hop_length=self.hop_length)
+
+    @cached_property
+    def hpss(self):
+        """
+        harmonic / percussive signals, librosa.effects.hpss(y) without its own STFT: the
+        masks are applied to the shared complex spectrogram and each part is inverted
+        """
+        harmonic, percussive = librosa.decompose.hpss(self.stft)
+        return tuple(
+            librosa.istft(S, hop_length=self.hop_length, n_fft=self.n_fft, length=len(self.y))
+            for S in (harmonic, percussive)
+        )
+
+    # ---------------- descriptors ----------------
+
+    def tempo(self):
+        tempo, _ = librosa.beat.beat_track(onset_envelope=self.onset_envelope, sr=self.sr, hop_length=self.hop_length)
+        return tempo
+
+    def spectral_centroid(self) -> np.ndarray:
+        return librosa.feature.spectral_centroid(S=self.magnitude, sr=self.sr, n_fft=self.n_fft, hop_length=self.hop_length)
+
+    def spectral_bandwidth(self) -> np.ndarray:
+        return librosa.feature.spectral_bandwidth(S=self.magnitude, sr=self.sr, n_fft=self.n_fft, hop_length=self.hop_length)
+
+    def zero_crossing_rate(self) -> np.ndarray:
+        # time-domain and cheap, no point in routing it through the spectrum
+        return librosa.feature.zero_crossing_rate(self.y, frame_length=self.n_fft, hop_length=self.hop_length)
+
+    def rms(self) -> np.ndarray:
+        return librosa.feature.rms(y=self.y, frame_length=self.n_fft, hop_length=self.hop_length)
+
+    def harmonic_rms(self) -> np.ndarray:
+        return librosa.feature.rms(y=self.hpss[0], frame_length=self.n_fft, hop_length=self.hop_length)
+
+    def percussive_rms(self) -> np.ndarray:
+        return librosa.feature.rms(y=self.hpss[1], frame_length=self.n_fft, hop_length=self.hop_length)
+
+    # ---------------- extended descriptors ----------------
+
+    def mfcc(self, n_mfcc: int = N_MFCC) -> np.ndarray:
+        """DCT of the shared log-mel spectrogram, no second mel pass"""
+        return librosa.feature.mfcc(S=self.mel_db, sr=self.sr, n_mfcc=n_mfcc)
+
+    def chroma(self) -> np.ndarray:
+        return librosa.feature.chroma_stft(S=self.power, sr=self.sr, n_fft=self.n_fft, hop_length=self.hop_length)
+
+    def spectral_contrast(self) -> np.ndarray:
+        return librosa.feature.spectral_contrast(S=self.magnitude, sr=self.sr, n_fft=self.n_fft, hop_length=self.hop_length)
+
+    def spectral_rolloff(self) -> np.ndarray:
+        return librosa.feature.spectral_rolloff(S=self.magnitude, sr=self.sr, n_fft=self.n_fft, hop_length=self.hop_length)
+
+    def spectral_flatness(self) -> np.ndarray:
+        return librosa.feature.spectral_flatness(S=self.magnitude, n_fft=self.n_fft, hop_length=self.hop_length)
+
+    def onset_rate(self) -> float:
+        """detected onsets per second, picked off the shared onset envelope"""
+        onsets = librosa.onset.onset_detect(onset_envelope=self.onset_envelope, sr=self.sr, hop_length=self.hop_length)
+        return float(len(onsets) / max(self.duration, 1e-9))
+
+    def loudness_lufs(self) -> float:
+        """
+        Integrated loudness (ITU-R BS.1770): K-weighted mean square over 400 ms blocks
+        with 75% overlap, absolute gate at -70 LUFS and relative gate 10 LU below.
+        Block energies come off one cumulative sum, so gating is a couple of vector ops.
+        """
+        y = self.y.astype(np.float64)
+        for b, a in _k_weighting(self.sr):
+            y = signal.lfilter(b, a, y)
+
+        block, step = int(round(0.4 * self.sr)), int(round(0.1 * self.sr))
+        csum = np.concatenate([[0.0], np.cumsum(y * y)])
+        if len(y) < block:
+            z = np.array([csum[-1] / max(len(y), 1)])
+        else:
+            starts = np.arange(0, len(y) - block + 1, step)
+            z = (csum[starts + block] - csum[starts]) / block
+
+        with np.errstate(divide="ignore"):
+            level = -0.691 + 10.0 * np.log10(z)
+        gated = z[level > LUFS_FLOOR]
+        if gated.size == 0:
+            return LUFS_FLOOR
+        relative = -0.691 + 10.0 * np.log10(gated.mean()) - 10.0
+        gated = z[(level > LUFS_FLOOR) & (level > relative)]
+        return float(max(-0.691 + 10.0 * np.log10(gated.mean()), LUFS_FLOOR))
+
+    def pitch(self, fmin: float, fmax: float, backend: str = "pyin") -> np.ndarray:
+        """
+        Per frame f0 in Hz, NaN where unvoiced. Frame rates differ between backends,
+        only frame statistics (nanmean) are comparable.
+
+        args:
+            fmin, fmax: search range in Hz
+            backend:
+                pyin: librosa.pyin over the whole signal, the reference
+                yin: vectorized YIN with an aperiodicity voicing gate, no Viterbi
+                pyin_voiced: coarse pyin over the non-silent stretches only
+                pyin_decimated: coarse pyin on the signal decimated down to ~4 * fmax
+        """
+        if backend == "pyin":
+            f0, _, _ = librosa.pyin(self.y, fmin=fmin, fmax=fmax, sr=self.sr)
+            return f0
+        if backend == "yin":
+            return _yin(self.y, self.sr, fmin, fmax, self.n_fft, self.hop_length)
+        if backend == "pyin_voiced":
+            intervals = librosa.effects.split(self.y, top_db=PITCH_TOP_DB, frame_length=self.n_fft, hop_length=self.hop_length)
+            if len(intervals) == 0:
+                return np.full(1, np.nan)
+            y = np.concatenate([self.y[a:b] for a, b in intervals])
+            return _coarse_pyin(y, self.sr, fmin, fmax, self.n_fft, self.hop_length)
+        if backend == "pyin_decimated":
+            # below ~4 * fmax the top octave folds into subharmonic errors
+            factor = max(1, int(self.sr / (4.0 * fmax)))
+            y = signal.decimate(self.y, factor, ftype="fir") if factor > 1 else self.y
+            # same frame duration, so fmin keeps two periods per frame
+            return _coarse_pyin(y, self.sr / factor, fmin, fmax, max(self.n_fft // factor, 256), max(self.hop_length // factor, 64))
+        raise ValueError(f"unknown pitch backend '{backend}', expected one of {PITCH_BACKENDS}")
+
+
+def _coarse_pyin(y: np.ndarray, sr: float, fmin: float, fmax: float, frame_length: int, hop_length: int) -> np.ndarray:
+    if len(y) < frame_length:
+        y = np.pad(y, (0, frame_length - len(y)))
+    f0, _, _ = librosa.pyin(
+        y, fmin=fmin, fmax=fmax, sr=sr, frame_length=frame_length, hop_length=hop_length,
+        resolution=PYIN_COARSE_RESOLUTION,
+    )
+    return f0
+
+
+def _yin(y: np.ndarray, sr: int, fmin: float, fmax: float, frame_length: int, hop_length: int,
+         threshold: float = YIN_THRESHOLD) -> np.ndarray:
+    """
+    YIN (de Cheveigne & Kawahara) over all frames at once: FFT cross-correlation for the
+    difference function, cumulative mean normalization, first dip under `threshold` with
+    parabolic refinement. Frames with no such dip, or near silent ones, are NaN.
+    Lags are searched an octave below fmin so notes under the range clamp to fmin
+    instead of dropping out as unvoiced.
+
+    `frame_length` is a minimum: at high sample rates the frame grows to the next power of
+    two that holds the longest lag plus an integration window as long again. The hop, and
+    so the frame grid, stays as given.
+    """
+    min_lag = max(1, int(np.floor(sr / fmax)))
+    max_lag = int(np.ceil(2.0 * sr / fmin))
+    if frame_length < 2 * max_lag + 2:
+        frame_length = 1 << int(np.ceil(np.log2(2 * max_lag + 2)))
+    window = frame_length - max_lag
+
+    y = np.pad(np.asarray(y, dtype=np.float64), frame_length // 2)
+    if len(y) < frame_length:
+        y = np.pad(y, (0, frame_length - len(y)))
+    frames = librosa.util.frame(y, frame_length=frame_length, hop_length=hop_length)
+
+    # r(tau) = sum_{j < window} x_j x_{j + tau}
+    n_fft = 1 << int(np.ceil(np.log2(frame_length + window)))
+    spec = np.fft.rfft(frames, n=n_fft, axis=0)
+    head = np.fft.rfft(frames[:window], n=n_fft, axis=0)
+    acf = np.fft.irfft(np.conj(head) * spec, n=n_fft, axis=0)[:max_lag + 1]
+
+    # e(tau) = sum_{j < window} x_{j + tau}^2
+    csum = np.concatenate([np.zeros((1, frames.shape[1])), np.cumsum(frames ** 2, axis=0)])
+    energy = csum[window:window + max_lag + 1] - csum[:max_lag + 1]
+    diff = np.maximum(energy[0] + energy - 2.0 * acf, 0.0)
+
+    lags = np.arange(1, max_lag + 1)[:, None]
+    cmnd = diff[1:] * lags / np.maximum(np.cumsum(diff[1:], axis=0), 1e-12)
+    cmnd = cmnd[min_lag - 1:]  # row i is tau = min_lag + i
+
+    # first local minimum under the threshold
+    trough = np.zeros_like(cmnd, dtype=bool)
+    trough[1:-1] = (cmnd[1:-1] < cmnd[:-2]) & (cmnd[1:-1] <= cmnd[2:])
+    candidates = trough & (cmnd < threshold)
+    voiced = candidates.any(axis=0)
+    idx = np.clip(candidates.argmax(axis=0), 1, len(cmnd) - 2)
+
+    cols = np.arange(cmnd.shape[1])
+    left, mid, right = cmnd[idx - 1, cols], cmnd[idx, cols], cmnd[idx + 1, cols]
+    denom = left - 2.0 * mid + right
+    shift = np.where(np.abs(denom) > 1e-12, 0.5 * (left - right) / np.where(denom == 0, 1.0, denom), 0.0)
+    # periods past 1 / fmin report fmin, like pyin's bounded search does
+    f0 = np.maximum(sr / (min_lag + idx + np.clip(shift, -1.0, 1.0)), fmin)
+
+    frame_db = 10.0 * np.log10(np.maximum(energy[0], 1e-20))
+    voiced &= frame_db > frame_db.max() - PITCH_TOP_DB
+    return np.where(voiced, f0, np.nan)
@@ -0,0 +1,221 @@
+# src/tools/audio_store.py
+"""
+Decode-once audio buffers shared by the analysis and render paths.
+
+A file is decoded a single time at its native rate with all its channels, every (sample
+rate, mono or not, resampler) variant asked for afterwards is derived once off that buffer
+and kept next to it. Mono variants are downmixed before resampling, like librosa.load. Callers
+get read-only NumPy views of the stored arrays, so the extractor (AnalysisEngine) and the
+renderer (apply_patch / render_batch) work off the same memory instead of each running
+their own librosa.load.
+
+Buffers are keyed by (absolute path, mtime, size), an edited file decodes again, and the
+store is bounded in bytes with least recently used eviction.
+
+For process pool workers a buffer can be exported into shared memory (`share`) and mapped
+back without a copy on the other side (`attach`).
+"""
+import os
+import threading
+from collections import OrderedDict
+from multiprocessing import shared_memory
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from utils.lazy_import import lazy_import
+
+sf = lazy_import("soundfile")
+librosa = lazy_import("librosa")
+
+DEFAULT_MAX_MB = 512
+# librosa.load's default, keeps resampled buffers sample identical to the old loads
+RESAMPLE_TYPE = "soxr_hq"
+
+
+def _readonly(y: np.ndarray) -> np.ndarray:
+    view = y.view()
+    view.flags.writeable = False
+    return view
+
+
+class AudioBuffer:
+    """
+    One decoded file: the native rate signal plus its derived variants.
+
+    args:
+        y: native rate float32 signal, (channels, frames)
+        sr: native sample rate
+    """
+
+    def __init__(self, y: np.ndarray, sr: int):
+        self.native_sr = int(sr)
+        y = np.ascontiguousarray(np.atleast_2d(y), dtype=np.float32)
+        self.channels = y.shape[0]
+        self._variants: Dict[Tuple[int, bool, str], np.ndarray] = {(self.native_sr, False, ""): y}
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(v.nbytes for v in self._variants.values())
+
+    def get(self, sr: Optional[int] = None, mono: bool = True, res_type: str = RESAMPLE_TYPE) -> np.ndarray:
+        """
+        read-only view at `sr` (native rate when None), derived on first request.
+        `res_type` is any librosa.resample type, only used when `sr` differs from the native rate.
+
+        return:
+            (frames,) when mono or the file has one channel, (channels, frames) otherwise
+        """
+        sr = self.native_sr if sr is None else int(sr)
+        mono = mono or self.channels == 1
+        with self._lock:
+            y = self._variant(sr, mono, res_type)
+        return _readonly(y)
+
+    def _variant(self, sr: int, mono: bool, res_type: str) -> np.ndarray:
+        src = self._variants[(self.native_sr, False, "")]
+        if sr == self.native_sr:
+            if self.channels == 1:
+                return src[0]
+            res_type = ""
+        y = self._variants.get((sr, mono, res_type))
+        if y is None:
+            if sr == self.native_sr:
+                y = src.mean(axis=0)
+            else:
+                # resample works along the last axis, all channels in one call
+                native = self._variant(self.native_sr, True, "") if mono else src
+                y = librosa.resample(native, orig_sr=self.native_sr, target_sr=sr, res_type=res_type)
+            y = np.ascontiguousarray(y, dtype=np.float32)
+            self._variants[(sr, mono, res_type)] = y
+        return y
+
+
+def decode(path: str) -> Tuple[np.ndarray, int]:
+    """native rate (channels, frames) float32 decode, librosa's loaders for what libsndfile can't read"""
+    try:
+        data, sr = sf.read(path, dtype="float32", always_2d=True)
+        return data.T, int(sr)
+    except Exception:
+        y, sr = librosa.load(path, sr=None, mono=False)
+        return y, int(sr)
+
+
+class AudioStore:
+    """
+    LRU store of AudioBuffers keyed by file identity.
+
+    args:
+        max_bytes: total size of all buffers and variants kept, 0 keeps nothing
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.decodes = 0
+        self.hits = 0
+        self._buffers: "OrderedDict[tuple, AudioBuffer]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(path: str) -> tuple:
+        st = os.stat(path)
+        return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+    def buffer(self, path: str) -> AudioBuffer:
+        key = self._key(path)
+        with self._lock:
+            buf = self._buffers.get(key)
+            if buf is not None:
+                self._buffers.move_to_end(key)
+                self.hits += 1
+                return buf
+        # decode outside the lock, a concurrent decode of the same file just loses the race
+        buf = AudioBuffer(*decode(path))
+        with self._lock:
+            self.decodes += 1
+            buf = self._buffers.setdefault(key, buf)
+        return buf
+
+    def load(self, path: str, sr: Optional[int] = 22050, mono: bool = True,
+             res_type: str = RESAMPLE_TYPE) -> Tuple[np.ndarray, int]:
+        """
+        Drop-in for librosa.load(path, sr=sr, mono=mono, res_type=res_type).
+
+        return:
+            (read-only float32 view, (frames,) or (channels, frames), sample rate)
+        """
+        buf = self.buffer(path)
+        y = buf.get(sr, mono, res_type)
+        self._evict()
+        return y, (buf.native_sr if sr is None else int(sr))
+
+    def _evict(self):
+        with self._lock:
+            total = sum(b.nbytes for b in self._buffers.values())
+            while self._buffers and total > self.max_bytes:
+                _, buf = self._buffers.popitem(last=False)
+                total -= buf.nbytes
+
+    def release(self, path: str) -> None:
+        """drops every buffer of `path`"""
+        path = os.path.abspath(path)
+        with self._lock:
+            for key in [k for k in self._buffers if k[0] == path]:
+                del self._buffers[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buffers.clear()
+
+
+_store: Optional[AudioStore] = None
+_store_lock = threading.Lock()
+
+
+def get_audio_store() -> AudioStore:
+    """
+    Process wide store configured from the environment.
+
+    env:
+        SOUNDSPARK_AUDIO_STORE_MB: memory budget of the store, 0 decodes on every load
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = AudioStore(int(float(os.getenv("SOUNDSPARK_AUDIO_STORE_MB", DEFAULT_MAX_MB)) * 1024 * 1024))
+        return _store
+
+
+def load_audio(path: str, sr: Optional[int] = 22050, mono: bool = True,
+               res_type: str = RESAMPLE_TYPE) -> Tuple[np.ndarray, int]:
+    """librosa.load(path, sr=sr, mono=mono, res_type=res_type) through the process audio store"""
+    return get_audio_store().load(path, sr, mono, res_type)
+
+
+# ---------------- shared memory for process pools ----------------
+
+def share(y: np.ndarray) -> Tuple[shared_memory.SharedMemory, Dict]:
+    """
+    Copies `y` into a new shared memory block.
+
+    return:
+        (block, the owner closes and unlinks it once the workers are done;
+         picklable handle for attach)
+    """
+    shm = shared_memory.SharedMemory(create=True, size=max(y.nbytes, 1))
+    np.ndarray(y.shape, dtype=y.dtype, buffer=shm.buf)[...] = y
+    return shm, {"name": shm.name, "shape": y.shape, "dtype": y.dtype.str}
+
+
+# worker side mappings, kept open for the life of the worker so views stay valid
+_attached: Dict[str, shared_memory.SharedMemory] = {}
+
+
+def attach(handle: Dict) -> np.ndarray:
+    """read-only view of a buffer exported with share, no copy"""
+    shm = _attached.get(handle["name"])
+    if shm is None:
+        shm = shared_memory.SharedMemory(name=handle["name"])
+        _attached[handle["name"]] = shm
+    return _readonly(np.ndarray(handle["shape"], dtype=np.dtype(handle["dtype"]), buffer=shm.buf))
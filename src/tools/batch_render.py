@@ -0,0 +1,92 @@
+# src/tools/batch_render.py
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.tools.audio_store import attach, share
+from src.tools.synthesis_demo import load_render_input, render_patch, write_render
+
+
+def _render_job(y: np.ndarray, sr: int, job: Dict[str, Any]) -> Dict[str, Any]:
+    """Render + write one variation off an already decoded buffer. Runs in the pool workers."""
+    params = job.get("params") or {}
+    try:
+        out = render_patch(y, sr, params, mix_ratio=float(job.get("mix_ratio", 0.75)))
+        write_render(job["out_path"], out, sr)
+        return {"ok": True, "path": job["out_path"], "params": params}
+    except Exception as e:
+        return {"ok": False, "path": job.get("out_path"), "error": str(e)}
+
+
+def _render_shared(handle: Dict[str, Any], sr: int, job: Dict[str, Any]) -> Dict[str, Any]:
+    """_render_job off a buffer the parent put in shared memory, no per job pickling of the signal"""
+    return _render_job(attach(handle), sr, job)
+
+
+def render_batch(jobs: List[Dict[str, Any]], workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Batch version of apply_patch for many (input, params, out_path) jobs.
+
+    Every distinct (input_audio_path, sr) pair is decoded and resampled at most once
+    (through the audio store, so a file the analysis already decoded isn't decoded again),
+    then all of its variations are rendered off that shared buffer, fanned out over a
+    process pool that maps the buffers from shared memory.
+
+    arg:
+        jobs: list of dicts with the apply_patch keys
+              {"input_audio_path", "out_path", "params", "sr" (optional, native rate when
+              missing), "mix_ratio" (optional)}
+        workers: process count, defaults to SOUNDSPARK_RENDER_WORKERS or the cpu count.
+                 1 renders everything in this process.
+
+    return:
+        one result dict per job, in the order the jobs were given
+    """
+    if workers is None:
+        workers = int(os.getenv("SOUNDSPARK_RENDER_WORKERS", os.cpu_count() or 1))
+
+    # decode each source once
+    groups: "OrderedDict[tuple, List[int]]" = OrderedDict()
+    for idx, job in enumerate(jobs):
+        sr = job.get("sr")
+        key = (job["input_audio_path"], int(sr) if sr is not None else None)
+        groups.setdefault(key, []).append(idx)
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(jobs)
+    buffers = {}
+    for key, idxs in groups.items():
+        try:
+            buffers[key] = load_render_input(key[0], sr=key[1])
+        except Exception as e:
+            for idx in idxs:
+                results[idx] = {"ok": False, "path": jobs[idx].get("out_path"), "error": f"failed to load {key[0]}: {e}"}
+
+    pending = [(idx, key) for key, idxs in groups.items() if key in buffers for idx in idxs]
+
+    if workers <= 1 or len(pending) <= 1:
+        for idx, key in pending:
+            y, sr = buffers[key]
+            results[idx] = _render_job(y, sr, jobs[idx])
+        return results
+
+    blocks, handles = [], {}
+    try:
+        for key in {key for _, key in pending}:
+            shm, handles[key] = share(buffers[key][0])
+            blocks.append(shm)
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+            futures = {idx: pool.submit(_render_shared, handles[key], buffers[key][1], jobs[idx]) for idx, key in pending}
+            for idx, fut in futures.items():
+                try:
+                    results[idx] = fut.result()
+                except Exception as e:
+                    results[idx] = {"ok": False, "path": jobs[idx].get("out_path"), "error": str(e)}
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+    return results
@@ -1,11 +1,12 @@
 # src/tools/code_exec_tool.py
 import re
 from typing import Dict, Any
-from src.tools.synthesis_demo import apply_patch
+from src.tools.synthesis_demo import apply_patch, render_preview
 
 
 ALLOWED_FUNCTIONS = {
-    "apply_patch": apply_patch
+    "apply_patch": apply_patch,
+    "render_preview": render_preview,
 }
 
 def simple_freq_extract(text: str):
@@ -78,7 +79,12 @@ def interpret_instructions(instructions: str, sr: int = 22050):
                 fb = float(fbm.group(1))
             except:
                 pass
-        params["delay"] = {"enabled": True, "ms": ms, "feedback": fb}
+        mode = "ping_pong" if re.search(r"ping[\s-]?pong", t) else "stereo" if "stereo" in t else "mono"
+        params["delay"] = {"enabled": True, "ms": ms, "feedback": fb, "mode": mode}
+
+    # Stereo width
+    if "wide" in t or "width" in t:
+        params["stereo_width"] = {"enabled": True, "width": 1.6}
 
     # Global filters
     if "lowpass" in t and "sub" not in t:
@@ -112,12 +118,12 @@ def execute_tool(function: str, args: Dict[str, Any], file_path: str, out_path:
 
     instructions = args.get("instructions", "")
     params = args.get("params")  # structured override
-    sr = int(args.get("sr", 22050))
+    sr = int(args["sr"]) if args.get("sr") is not None else None  # None renders at the native rate
     mix_ratio = float(args.get("mix_ratio", 0.75))
 
     # if instructions present and no params provided, parse them:
     if params is None:
-        params = interpret_instructions(instructions or "", None, sr)
+        params = interpret_instructions(instructions or "", sr)
 
     # finally call the function
     try:
@@ -0,0 +1,141 @@
+# src/tools/descriptor_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from utils.cache_dir import cache_path
+
+# in the soundspark cache dir (utils.cache_dir) by default, set SOUNDSPARK_DESCRIPTOR_CACHE="" to turn caching off
+DEFAULT_CACHE_PATH = cache_path("descriptor_cache.db")
+DEFAULT_MAX_ENTRIES = 2048
+
+
+def hash_audio(y: np.ndarray) -> str:
+    """Content hash of the decoded samples, so re-encoded or renamed copies of a file share an entry"""
+    return hashlib.sha256(np.ascontiguousarray(y, dtype=np.float32).tobytes()).hexdigest()
+
+
+def make_key(audio_hash: str, params: Dict[str, Any]) -> str:
+    """Cache key = audio content hash + every analysis parameter that changes the output"""
+    blob = audio_hash + json.dumps(params, sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class DescriptorCache:
+    """
+    Persistent, size bounded (LRU) cache of descriptor dicts backed by SQLite.
+
+    Besides the descriptors themselves it keeps a small (path, mtime, size) -> audio hash
+    index so a repeat upload of an unchanged file skips decoding as well as analysis.
+
+    args:
+        path: sqlite file to store the cache in
+        max_entries: number of descriptor rows kept, least recently used rows are evicted first
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS descriptors ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_descriptors_access ON descriptors(last_access)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL, audio_hash TEXT NOT NULL)"
+            )
+
+    # ---------------- file -> audio hash index ----------------
+
+    def lookup_file(self, path: str) -> Optional[str]:
+        """Audio hash of a file we decoded before, None if unknown or modified since"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT mtime_ns, size, audio_hash FROM files WHERE path = ?", (os.path.abspath(path),)
+            ).fetchone()
+        if row and row[0] == st.st_mtime_ns and row[1] == st.st_size:
+            return row[2]
+        return None
+
+    def remember_file(self, path: str, audio_hash: str) -> None:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (path, mtime_ns, size, audio_hash) VALUES (?, ?, ?, ?)",
+                (os.path.abspath(path), st.st_mtime_ns, st.st_size, audio_hash),
+            )
+
+    # ---------------- descriptors ----------------
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT value FROM descriptors WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE descriptors SET last_access = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key: str, descriptors: Dict[str, Any]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO descriptors (key, value, last_access) VALUES (?, ?, ?)",
+                (key, json.dumps(descriptors), time.time()),
+            )
+            # LRU eviction, drop everything past the newest max_entries rows
+            self._conn.execute(
+                "DELETE FROM descriptors WHERE key NOT IN "
+                "(SELECT key FROM descriptors ORDER BY last_access DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM descriptors").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM descriptors")
+            self._conn.execute("DELETE FROM files")
+
+
+_cache: Optional[DescriptorCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_descriptor_cache() -> Optional[DescriptorCache]:
+    """
+    Process wide cache instance configured from the environment.
+
+    env:
+        SOUNDSPARK_DESCRIPTOR_CACHE: sqlite path, empty string disables the cache
+        SOUNDSPARK_DESCRIPTOR_CACHE_SIZE: max number of cached descriptor sets
+    return:
+        DescriptorCache or None when caching is disabled
+    """
+    global _cache
+    path = os.getenv("SOUNDSPARK_DESCRIPTOR_CACHE", DEFAULT_CACHE_PATH)
+    if not path:
+        return None
+    with _cache_lock:
+        if _cache is None or _cache.path != path:
+            max_entries = int(os.getenv("SOUNDSPARK_DESCRIPTOR_CACHE_SIZE", DEFAULT_MAX_ENTRIES))
+            _cache = DescriptorCache(path, max_entries=max_entries)
+        return _cache
@@ -0,0 +1,334 @@
+# src/tools/dsp_pool.py
+"""
+Process pool for the CPU heavy tools (analysis, rendering), awaitable from the agents.
+
+librosa / scipy work holds the interpreter for seconds; run inline in a tool or agent it
+stalls the event loop and with it every other session. Jobs submitted here run in
+separate worker processes while the caller's coroutine just waits.
+
+- bounded queue: at most workers + max_queue jobs are admitted, the next one fails fast
+  with DspPoolBusy instead of piling up
+- per job timeout and cancellation: a job that runs past its deadline, or whose awaiting
+  task gets cancelled, has its worker killed and replaced, so nothing keeps burning CPU
+- affinity: jobs tagged with the same key (the audio path) go back to the worker that
+  handled it last when that one is free, so its audio store / descriptor cache stay warm
+- priority: a freed worker goes to the highest priority job waiting, so interactive work
+  (preview renders) doesn't queue behind background full renders
+
+Workers are spawned on first use and live for the whole process. Each admitted job waits
+for its worker on a thread of the pool's own executor, sized to what admission allows, so a
+priority job never queues behind blocked waiters in asyncio's default executor. With 0
+workers jobs run on threads instead, which still keeps the event loop free.
+"""
+import asyncio
+import atexit
+import functools
+import multiprocessing
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_MAX_QUEUE = 32
+DEFAULT_TIMEOUT = 120.0
+# how often a waiting job checks for cancellation
+_POLL_SECONDS = 0.05
+# recent affinity keys remembered per worker
+_AFFINITY_KEYS = 8
+
+
+class DspPoolBusy(RuntimeError):
+    """the pool already holds as many jobs as it admits"""
+
+
+class DspTimeout(TimeoutError):
+    """a job ran past its deadline, its worker was killed"""
+
+
+def _warm_job():
+    import numpy as np
+    from src.tools.analysis_engine import AnalysisEngine
+    from src.tools.feature_extractor import describe
+    rng = np.random.default_rng(0)
+    describe(AnalysisEngine((0.1 * rng.standard_normal(22050)).astype(np.float32), 22050))
+    return True
+
+
+def _worker_main(conn):
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            return
+        if msg is None:
+            return
+        fn, args, kwargs = msg
+        try:
+            result = (True, fn(*args, **kwargs))
+        except BaseException as e:
+            result = (False, e)
+        try:
+            conn.send(result)
+        except Exception as e:
+            # unpicklable result or exception, send its description instead
+            conn.send((False, RuntimeError(f"{type(e).__name__}: {e} (while returning {type(result[1]).__name__})")))
+
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child = ctx.Pipe()
+        self.proc = ctx.Process(target=_worker_main, args=(child,), daemon=True, name="soundspark-dsp")
+        self.proc.start()
+        child.close()
+        self.keys = deque(maxlen=_AFFINITY_KEYS)
+
+    def kill(self):
+        try:
+            self.conn.close()
+        finally:
+            if self.proc.is_alive():
+                self.proc.kill()
+            self.proc.join(timeout=1.0)
+
+
+class DspPool:
+    """
+    args:
+        workers: worker processes, 0 runs jobs on threads
+        max_queue: jobs admitted beyond the ones running
+        timeout: default seconds from submission to result, None or <= 0 waits forever
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, max_queue: int = DEFAULT_MAX_QUEUE,
+                 timeout: Optional[float] = DEFAULT_TIMEOUT):
+        self.workers = max(0, workers)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout if timeout and timeout > 0 else None
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle = []
+        self._started = 0
+        self._cond = threading.Condition()
+        self._admitted = 0
+        self._waiting = Counter()  # priority -> jobs waiting for a worker
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._closed = False
+        self.completed = 0
+        self.timeouts = 0
+        self.cancelled = 0
+
+    # ---------------- admission ----------------
+
+    def _admit(self):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("dsp pool is closed")
+            if self._admitted >= max(self.workers, 1) + self.max_queue:
+                raise DspPoolBusy(f"dsp pool full ({self._admitted} jobs in flight)")
+            self._admitted += 1
+
+    def _release(self):
+        with self._cond:
+            self._admitted -= 1
+
+    @property
+    def in_flight(self) -> int:
+        return self._admitted
+
+    def _waiter_executor(self) -> ThreadPoolExecutor:
+        """one thread per admitted job, a waiting job always has one to block in"""
+        with self._cond:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=max(self.workers, 1) + self.max_queue,
+                                                    thread_name_prefix="soundspark-dsp-wait")
+            return self._executor
+
+    # ---------------- workers ----------------
+
+    def _checkout(self, affinity, deadline, cancel, priority=0) -> _Worker:
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    outranked = any(p > priority and n for p, n in self._waiting.items())
+                    if self._idle and not outranked:
+                        pick = next((w for w in self._idle if affinity is not None and affinity in w.keys), self._idle[-1])
+                        self._idle.remove(pick)
+                        return pick
+                    if self._started < self.workers:
+                        self._started += 1
+                        break
+                    if cancel.is_set():
+                        raise asyncio.CancelledError()
+                    if deadline is not None and time.monotonic() >= deadline:
+                        raise DspTimeout("timed out waiting for a free dsp worker")
+                    self._cond.wait(_POLL_SECONDS)
+            finally:
+                self._waiting[priority] -= 1
+                # a lower priority waiter may have been held back by this one
+                self._cond.notify_all()
+        try:
+            return _Worker(self._ctx)
+        except BaseException:
+            with self._cond:
+                self._started -= 1
+                self._cond.notify()
+            raise
+
+    def _checkin(self, worker: _Worker, healthy: bool):
+        with self._cond:
+            if healthy and not self._closed:
+                self._idle.append(worker)
+            else:
+                self._started -= 1
+            self._cond.notify_all()
+        if not healthy or self._closed:
+            worker.kill()
+
+    def _run_blocking(self, fn, args, kwargs, timeout, affinity, cancel: threading.Event, priority=0):
+        deadline = time.monotonic() + timeout if timeout else None
+        worker = self._checkout(affinity, deadline, cancel, priority)
+        healthy = False
+        try:
+            worker.conn.send((fn, args, kwargs))
+            while not worker.conn.poll(_POLL_SECONDS):
+                if cancel.is_set():
+                    self.cancelled += 1
+                    raise asyncio.CancelledError()
+                if deadline is not None and time.monotonic() >= deadline:
+                    self.timeouts += 1
+                    raise DspTimeout(f"{getattr(fn, '__name__', fn)} ran past {timeout:.0f}s, worker killed")
+                if not worker.proc.is_alive():
+                    raise RuntimeError(f"dsp worker died running {getattr(fn, '__name__', fn)}")
+            try:
+                ok, value = worker.conn.recv()
+            except (EOFError, OSError) as e:
+                raise RuntimeError(f"dsp worker died running {getattr(fn, '__name__', fn)}") from e
+            healthy = True
+        finally:
+            if healthy and affinity is not None:
+                worker.keys.append(affinity)
+            self._checkin(worker, healthy)
+        self.completed += 1
+        if not ok:
+            raise value
+        return value
+
+    # ---------------- public ----------------
+
+    def warm(self) -> None:
+        """
+        Starts every worker and runs a tiny analysis in each, so the DSP imports and numba
+        compilation are paid before traffic instead of by the first job on each worker.
+        """
+        if self.workers == 0:
+            _warm_job()
+            return
+        with self._cond:
+            missing = self.workers - self._started
+            self._started += missing
+        fresh = []
+        try:
+            for _ in range(missing):
+                fresh.append(_Worker(self._ctx))
+        finally:
+            with self._cond:
+                self._started -= missing - len(fresh)
+        for worker in fresh:
+            worker.conn.send((_warm_job, (), {}))
+        for worker in fresh:
+            healthy = False
+            try:
+                ok, value = worker.conn.recv()
+                healthy = ok
+            except Exception:
+                pass
+            self._checkin(worker, healthy)
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None, affinity: Any = None,
+                  priority: int = 0, **kwargs) -> Any:
+        """
+        Awaitable fn(*args, **kwargs) in a worker process. `fn` and its arguments have to be
+        picklable (module level functions, plain data).
+
+        args:
+            timeout: seconds for this job, defaults to the pool timeout
+            affinity: key of the data the job works on, e.g. the audio path
+            priority: jobs with a higher value get the next free worker first
+        raise:
+            DspPoolBusy when the queue is full, DspTimeout past the deadline,
+            whatever fn raised otherwise
+        """
+        self._admit()
+        cancel = threading.Event()
+        try:
+            if self.workers == 0:
+                return await asyncio.wait_for(asyncio.to_thread(fn, *args, **kwargs), timeout or self.timeout)
+            job = functools.partial(self._run_blocking, fn, args, kwargs, timeout or self.timeout, affinity,
+                                    cancel, priority)
+            return await asyncio.get_running_loop().run_in_executor(self._waiter_executor(), job)
+        except asyncio.CancelledError:
+            # the worker thread sees this within _POLL_SECONDS and kills the worker
+            cancel.set()
+            raise
+        finally:
+            self._release()
+
+    def run_sync(self, fn: Callable, *args, timeout: Optional[float] = None, affinity: Any = None, **kwargs) -> Any:
+        """blocking counterpart of run, for callers outside an event loop"""
+        self._admit()
+        try:
+            if self.workers == 0:
+                return fn(*args, **kwargs)
+            return self._run_blocking(fn, args, kwargs, timeout or self.timeout, affinity, threading.Event())
+        finally:
+            self._release()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._started -= len(idle)
+            executor, self._executor = self._executor, None
+            self._cond.notify_all()
+        if executor is not None:
+            # threads still busy with a job finish it, nothing new is admitted after close
+            executor.shutdown(wait=False)
+        for worker in idle:
+            try:
+                worker.conn.send(None)
+            except Exception:
+                pass
+            worker.kill()
+
+
+_pool: Optional[DspPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_dsp_pool() -> DspPool:
+    """
+    Process wide pool configured from the environment.
+
+    env:
+        SOUNDSPARK_DSP_WORKERS: worker processes, 0 runs jobs on threads in this process
+        SOUNDSPARK_DSP_QUEUE: jobs admitted on top of the running ones
+        SOUNDSPARK_DSP_TIMEOUT: seconds per job
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DspPool(
+                workers=int(os.getenv("SOUNDSPARK_DSP_WORKERS", DEFAULT_WORKERS)),
+                max_queue=int(os.getenv("SOUNDSPARK_DSP_QUEUE", DEFAULT_MAX_QUEUE)),
+                timeout=float(os.getenv("SOUNDSPARK_DSP_TIMEOUT", DEFAULT_TIMEOUT)),
+            )
+            atexit.register(_pool.close)
+        return _pool
+
+
+async def run_dsp(fn: Callable, *args, **kwargs) -> Any:
+    """get_dsp_pool().run shorthand"""
+    return await get_dsp_pool().run(fn, *args, **kwargs)
@@ -1,6 +1,15 @@
-import librosa
+import base64
+import os
+
 import numpy as np
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
+
+from src.tools.analysis_engine import N_MFCC, PITCH_BACKENDS, AnalysisEngine
+from src.tools.descriptor_cache import get_descriptor_cache, hash_audio, make_key
+from src.tools.vector_index import index_descriptors
+from utils.lazy_import import lazy_import
+
+librosa = lazy_import("librosa")
 
 def _to_scalar(x):
     """Convert numpy arrays / numpy scalars / iterables to Python native floats/ints when possible."""
@@ -28,64 +37,186 @@ def _to_scalar(x):
     except Exception:
         return x
 
+# pyin search range, part of the descriptor cache key since it changes estimated_pitch_hz
+PITCH_FMIN_NOTE = 'C2'
+PITCH_FMAX_NOTE = 'C7'
+
+# f0 estimator, see AnalysisEngine.pitch and utils/pitch_benchmark.py. YIN agrees with
+# full-file pyin to the semitone on our material at a few percent of its cost
+PITCH_BACKEND = os.getenv("SOUNDSPARK_PITCH_BACKEND", "yin")
+
+# "basic" is the nine scalar summary, "extended" adds the summary keys of describe_extended
+# and a float32 embedding (see EMBEDDING_LAYOUT), overridable per call
+DESCRIPTOR_MODE = os.getenv("SOUNDSPARK_DESCRIPTORS", "basic")
+
+# (name, size) of every block of the extended embedding, in order
+EMBEDDING_LAYOUT = (
+    ("mfcc_mean", N_MFCC),
+    ("mfcc_std", N_MFCC),
+    ("chroma", 12),
+    ("spectral_contrast", 7),
+    ("spectral_rolloff", 1),
+    ("spectral_flatness", 1),
+    ("onset_rate", 1),
+    ("loudness_lufs", 1),
+)
+EMBEDDING_DIM = sum(size for _, size in EMBEDDING_LAYOUT)
+
+# long uploads are analyzed on EXCERPT_WINDOWS representative windows of EXCERPT_SECONDS
+# (see AnalysisEngine.excerpt_windows), which bounds analysis time whatever the file
+# length. Files shorter than 2 * windows * seconds get the full analysis, 0 windows
+# always analyzes everything
+EXCERPT_WINDOWS = int(os.getenv("SOUNDSPARK_EXCERPT_WINDOWS", 4))
+EXCERPT_SECONDS = float(os.getenv("SOUNDSPARK_EXCERPT_SECONDS", 8.0))
+
+# keys of analyze_file's descriptors that are for code, not for the model's context: the
+# base64 embedding and the excerpt windows' metadata. The descriptor JSON leaves them out
+INTERNAL_KEYS = ("embedding", "excerpt")
+
+_PITCH_CLASSES = ("C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B")
+
+
 def compute_basic_descriptors(path: str, sr: int = 22050) -> Dict[str, Any]:
     """
     Compute lightweight descriptors for an audio file and return JSON-safe python types.
     Tempo is guaranteed to be either a float or None.
+
+    All spectral descriptors (centroid, bandwidth, onset/beat, HPSS energies) share
+    one STFT through AnalysisEngine instead of each recomputing the spectrum.
+    Results are cached by audio content hash, so a repeat upload skips analysis.
+    With SOUNDSPARK_DESCRIPTORS=extended the extended summary keys are included too.
+    """
+    descriptors = analyze_file(path, sr)[0]
+    return {k: v for k, v in descriptors.items() if k not in INTERNAL_KEYS}
+
+
+def extract_features(path: str, sr: int = 22050) -> Tuple[Dict[str, Any], np.ndarray]:
+    """
+    Extended analysis of an audio file.
+
+    return:
+        (JSON summary: basic + extended descriptor keys, float32 embedding of EMBEDDING_DIM)
+    """
+    descriptors = analyze_file(path, sr, mode="extended")[0]
+    summary = {k: v for k, v in descriptors.items() if k not in INTERNAL_KEYS}
+    return summary, decode_embedding(descriptors)
+
+
+def excerpt_info(path: str, sr: int = 22050) -> Optional[Dict[str, Any]]:
+    """
+    How the descriptors of `path` were estimated, kept out of the descriptor JSON.
+
+    return:
+        {"windows", "seconds", "coverage", "ci95"} (see describe_excerpts) for files analyzed
+        on excerpt windows, None when the whole file was analyzed
+    """
+    return analyze_file(path, sr)[0].get("excerpt")
+
+
+def analyze_file(path: str, sr: int = 22050, kind: str = "analyzed", mode: Optional[str] = None) -> Tuple[Dict[str, Any], str]:
+    """
+    compute_basic_descriptors plus the audio content hash. Every analyzed file also lands
+    in the vector index (see vector_index.py) under `kind`, for find_similar.
+
+    args:
+        mode: "basic" or "extended", defaults to SOUNDSPARK_DESCRIPTORS
+    return:
+        (descriptors, audio hash), extended descriptors carry the base64 "embedding", long
+        files the "excerpt" metadata (both in INTERNAL_KEYS)
+    """
+    mode = mode or DESCRIPTOR_MODE
+    if mode not in ("basic", "extended"):
+        raise ValueError(f"unknown descriptor mode '{mode}', expected 'basic' or 'extended'")
+    if PITCH_BACKEND not in PITCH_BACKENDS:
+        raise ValueError(f"unknown SOUNDSPARK_PITCH_BACKEND '{PITCH_BACKEND}', expected one of {PITCH_BACKENDS}")
+    cache = get_descriptor_cache()
+    params = {"sr": sr, "pitch_fmin": PITCH_FMIN_NOTE, "pitch_fmax": PITCH_FMAX_NOTE, "pitch_backend": PITCH_BACKEND}
+    if mode == "extended":
+        # basic entries keep their old keys
+        params["mode"] = mode
+    if EXCERPT_WINDOWS > 0:
+        params["excerpts"] = [EXCERPT_WINDOWS, EXCERPT_SECONDS]
+    # HPSS energies from the istft'd parts, entries with the old spectral estimate miss
+    params["hpss"] = "istft"
+
+    # unchanged file we've seen before -> no decode, no analysis
+    if cache is not None:
+        audio_hash = cache.lookup_file(path)
+        if audio_hash is not None:
+            hit = cache.get(make_key(audio_hash, params))
+            if hit is not None:
+                index_descriptors(path, audio_hash, hit, kind)
+                return hit, audio_hash
+
+    engine = AnalysisEngine.from_file(path, sr=sr)
+    audio_hash = hash_audio(engine.y)
+
+    if cache is None:
+        descriptors = _analyze(engine, extended=mode == "extended")
+    else:
+        # same audio under a different name / re-upload -> decode only
+        cache.remember_file(path, audio_hash)
+        key = make_key(audio_hash, params)
+        descriptors = cache.get(key)
+        if descriptors is None:
+            descriptors = _analyze(engine, extended=mode == "extended")
+            cache.put(key, descriptors)
+
+    index_descriptors(path, audio_hash, descriptors, kind)
+    return descriptors, audio_hash
+
+
+def _analyze(engine: AnalysisEngine, extended: bool) -> Dict[str, Any]:
+    windows = engine.excerpt_windows(EXCERPT_WINDOWS, EXCERPT_SECONDS)
+    if len(windows) == 1:
+        return describe(engine, extended)
+    return describe_excerpts(engine, windows, extended)
+
+
+def describe(engine: AnalysisEngine, extended: bool = False) -> Dict[str, Any]:
     """
-    y, sr = librosa.load(path, sr=sr, mono=True)
-    duration = float(len(y) / sr)
+    Build the descriptor JSON out of an already loaded AnalysisEngine.
 
+    args:
+        engine: analysis graph of the decoded audio
+        extended: also add describe_extended's keys
+    return:
+        dict with the descriptor keys, JSON-safe values
+    """
     # tempo (may be scalar or array-like)
     try:
-        tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
-        # print(f"[feature extractor] : The tempo = {tempo}")
-        changed_tempo = _to_scalar(tempo)
-        # print(f"[feature extractor] : Changed The tempo = {changed_tempo}")
-        # ensure tempo is float (or None)
-        if tempo is not None:
-            try:
-                tempo = float(tempo)
-            except Exception:
-                pass
+        changed_tempo = _to_scalar(engine.tempo())
     except Exception:
-        tempo = None
+        changed_tempo = None
 
-    # spectral features
-    spec_cent = _to_scalar(np.mean(librosa.feature.spectral_centroid(y=y, sr=sr)))
-    spec_bw = _to_scalar(np.mean(librosa.feature.spectral_bandwidth(y=y, sr=sr)))
-    zcr = _to_scalar(np.mean(librosa.feature.zero_crossing_rate(y)))
-    rms = _to_scalar(np.mean(librosa.feature.rms(y=y)))
+    # spectral features, all off the one shared magnitude spectrogram
+    spec_cent = _to_scalar(np.mean(engine.spectral_centroid()))
+    spec_bw = _to_scalar(np.mean(engine.spectral_bandwidth()))
+    zcr = _to_scalar(np.mean(engine.zero_crossing_rate()))
+    rms = _to_scalar(np.mean(engine.rms()))
 
     # Harmonic and Percussive Energy
-    # First, separate the audio into harmonic and percussive components
-    y_harmonic, y_percussive = librosa.effects.hpss(y)
-    
-    # Calculate the mean RMS energy for each component
-    harmonic_energy = _to_scalar(np.mean(librosa.feature.rms(y=y_harmonic)))
-    percussive_energy = _to_scalar(np.mean(librosa.feature.rms(y=y_percussive)))
-
-    # print(f"harmonic_energy: {harmonic_energy, type(harmonic_energy)}\n percussive_energy: {percussive_energy, type(percussive_energy)}")
-    
+    # HPSS masks the shared STFT (no second forward transform), each component is inverted once
+    harmonic_energy = _to_scalar(np.mean(engine.harmonic_rms()))
+    percussive_energy = _to_scalar(np.mean(engine.percussive_rms()))
+
     # --- Pitch Feature ---
-    
+
     # 8. Estimated Pitch
-    # We use pyin (probabilistic YIN) to estimate the fundamental frequency (F0)
-    # This returns f0 (pitch), voiced_flag, and voiced_probs
-    f0, _, _ = librosa.pyin(
-        y, 
-        fmin=librosa.note_to_hz('C2'), 
-        fmax=librosa.note_to_hz('C7')
+    # Fundamental frequency (F0) per frame, through the configured backend (YIN by default,
+    # pyin being the slow reference)
+    f0 = engine.pitch(
+        fmin=librosa.note_to_hz(PITCH_FMIN_NOTE),
+        fmax=librosa.note_to_hz(PITCH_FMAX_NOTE),
+        backend=PITCH_BACKEND,
     )
-    
+
     # f0 contains NaN for unvoiced frames. We use np.nanmean
     # to calculate the average pitch, *ignoring* the unvoiced frames.
     estimated_pitch = _to_scalar(np.nanmean(f0))
 
-    # print(f"estimated pitch : {estimated_pitch}")
-
-    return {
-        "duration": duration,
+    descriptors = {
+        "duration": engine.duration,
         "tempo": changed_tempo,
         "spectral_centroid": spec_cent,
         "spectral_bandwidth": spec_bw,
@@ -94,4 +225,119 @@ def compute_basic_descriptors(path: str, sr: int = 22050) -> Dict[str, Any]:
         "harmonic_energy": harmonic_energy,
         "percussive_energy": percussive_energy,
         "estimated_pitch_hz": estimated_pitch if not np.isnan(estimated_pitch) else 0.0,
-    }
\ No newline at end of file
+    }
+    if extended:
+        descriptors.update(describe_extended(engine))
+    return descriptors
+
+
+def extended_embedding(engine: AnalysisEngine) -> np.ndarray:
+    """
+    Fixed length float32 embedding laid out as EMBEDDING_LAYOUT. Every block is a
+    per-frame matrix off the shared spectrogram reduced along the frame axis in one go.
+    """
+    mfcc = engine.mfcc()
+    blocks = [
+        mfcc.mean(axis=1),
+        mfcc.std(axis=1),
+        engine.chroma().mean(axis=1),
+        engine.spectral_contrast().mean(axis=1),
+        [engine.spectral_rolloff().mean()],
+        [engine.spectral_flatness().mean()],
+        [engine.onset_rate()],
+        [engine.loudness_lufs()],
+    ]
+    return np.concatenate([np.asarray(b, dtype=np.float32).reshape(-1) for b in blocks])
+
+
+def embedding_block(embedding: np.ndarray, name: str) -> np.ndarray:
+    """slice of `embedding` holding the EMBEDDING_LAYOUT block `name`"""
+    start = 0
+    for block, size in EMBEDDING_LAYOUT:
+        if block == name:
+            return embedding[start:start + size]
+        start += size
+    raise KeyError(name)
+
+
+def describe_extended(engine: AnalysisEngine) -> Dict[str, Any]:
+    """
+    JSON summary of the extended embedding plus the embedding itself, base64 of the
+    float32 bytes (EMBEDDING_DIM * 4 bytes) so it stays compact in caches and state.
+    """
+    emb = extended_embedding(engine)
+    chroma = embedding_block(emb, "chroma")
+    return {
+        "spectral_rolloff": float(embedding_block(emb, "spectral_rolloff")[0]),
+        "spectral_flatness": float(embedding_block(emb, "spectral_flatness")[0]),
+        "spectral_contrast": float(embedding_block(emb, "spectral_contrast").mean()),
+        "onset_rate": float(embedding_block(emb, "onset_rate")[0]),
+        "loudness_lufs": float(embedding_block(emb, "loudness_lufs")[0]),
+        "chroma_peak": _PITCH_CLASSES[int(np.argmax(chroma))],
+        "embedding": base64.b64encode(emb.tobytes()).decode("ascii"),
+    }
+
+
+def decode_embedding(descriptors: Dict[str, Any]) -> Optional[np.ndarray]:
+    """float32 embedding out of extended descriptors, None for basic ones"""
+    blob = descriptors.get("embedding")
+    if not blob:
+        return None
+    return np.frombuffer(base64.b64decode(blob), dtype=np.float32).copy()
+
+
+def describe_excerpts(engine: AnalysisEngine, windows, extended: bool = False) -> Dict[str, Any]:
+    """
+    Whole-signal descriptors estimated from excerpt windows: every window is described on
+    its own and the values are combined weighted by the number of tiles each window
+    stands for. Tempo is the median over windows, pitch the mean over voiced windows and
+    loudness a power mean.
+
+    Adds "excerpt": {"windows", "seconds", "coverage", "ci95"} (an INTERNAL_KEYS entry,
+    read it through excerpt_info), where ci95 is the 95%
+    half-width per descriptor from the spread across windows (standard error with the
+    finite population correction). The full analysis value usually falls within it.
+
+    args:
+        engine: analysis graph of the whole decoded audio
+        windows: (start, end, weight) list from engine.excerpt_windows
+        extended: also combine describe_extended's keys and embedding
+    """
+    parts = [describe(engine.excerpt(a, b), extended) for a, b, _ in windows]
+    weights = np.array([w for _, _, w in windows], dtype=float)
+    k, n_tiles = len(parts), weights.sum()
+    fpc = np.sqrt(max(n_tiles - k, 0.0) / max(n_tiles - 1, 1.0))
+
+    combined, ci95 = {}, {}
+    for key in parts[0]:
+        if key in ("duration", "embedding", "chroma_peak"):
+            continue
+        vals = np.array([p.get(key) if p.get(key) is not None else np.nan for p in parts], dtype=float)
+        ok = ~np.isnan(vals)
+        if key == "estimated_pitch_hz":
+            ok &= vals > 0  # 0.0 means no voiced frames in that window
+        if not ok.any():
+            combined[key] = 0.0 if key == "estimated_pitch_hz" else None
+            continue
+        v, w = vals[ok], weights[ok]
+        if key == "tempo":
+            combined[key] = float(np.median(v))
+        elif key == "loudness_lufs":
+            combined[key] = float(10.0 * np.log10(np.average(10.0 ** (v / 10.0), weights=w)))
+        else:
+            combined[key] = float(np.average(v, weights=w))
+        if len(v) > 1:
+            ci95[key] = float(1.96 * v.std(ddof=1) / np.sqrt(len(v)) * fpc)
+
+    descriptors = {"duration": engine.duration, **combined}
+    if extended:
+        emb = np.average(np.stack([decode_embedding(p) for p in parts]), axis=0, weights=weights).astype(np.float32)
+        descriptors["chroma_peak"] = _PITCH_CLASSES[int(np.argmax(embedding_block(emb, "chroma")))]
+        descriptors["embedding"] = base64.b64encode(emb.tobytes()).decode("ascii")
+    descriptors["excerpt"] = {
+        "windows": k,
+        "seconds": EXCERPT_SECONDS,
+        "coverage": round(sum(b - a for a, b, _ in windows) / max(len(engine.y), 1), 4),
+        "ci95": {key: round(v, 6) for key, v in ci95.items()},
+    }
+    return descriptors
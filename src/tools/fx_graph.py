@@ -0,0 +1,188 @@
+# src/tools/fx_graph.py
+"""
+Synthesis params compiled into an ordered effect graph.
+
+compile_patch turns a params dict (utils.output_schema.Params) into a tuple of nodes once
+per (params, sr, mix_ratio):
+- filter coefficients are designed up front as second order sections, through the
+  butter_sos cache of synthesis_demo
+- adjacent linear filter stages (global_lowpass / global_highpass) are fused into a
+  single sosfilt call over the concatenated sections
+- the graph keeps no per file state, so one compiled graph renders every file at that
+  rate (render_patch, the render_batch variations, the streaming renderer)
+
+Stages run in FX_ORDER unless the params carry an "fx_order" list: the listed stages run
+first in that order, enabled stages it leaves out follow in their default order.
+"""
+import json
+from functools import lru_cache
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+from src.tools.synthesis_demo import (
+    _add_delay,
+    _add_noise,
+    _add_pingpong_delay,
+    _add_stereo_delay,
+    _sine_wave,
+    _soft_distort,
+    _stereo_width,
+    butter_sos,
+    scipy_signal,
+)
+
+# the chain apply_patch has always run
+FX_ORDER = ("sub_sine", "noise", "distortion", "global_lowpass", "global_highpass", "delay", "stereo_width")
+# stages that are plain cutoffs in the params and fuse with their neighbours
+FILTER_STAGES = {"global_lowpass": "low", "global_highpass": "high"}
+
+_DELAYS = {"stereo": _add_stereo_delay, "ping_pong": _add_pingpong_delay}
+
+
+class FxNode:
+    """
+    One compiled stage.
+
+    args:
+        kind: sub_sine | noise | distortion | filter | delay | stereo_width
+        stages: the params stages it covers, several for a fused filter
+        opts: stage settings with defaults filled in, filters carry their "sos"
+    """
+    __slots__ = ("kind", "stages", "opts")
+
+    def __init__(self, kind: str, stages: Tuple[str, ...], opts: Dict[str, Any]):
+        self.kind = kind
+        self.stages = stages
+        self.opts = opts
+
+    def __repr__(self):
+        return f"FxNode({self.kind}, {'+'.join(self.stages)})"
+
+
+class FxGraph:
+    """
+    Compiled chain for one (params, sr, mix_ratio), immutable and shared between renders.
+
+    args:
+        nodes: stages in processing order
+        sr: sample rate the coefficients were designed for
+        mix_ratio: dry share when the sub sine is layered in
+    """
+
+    def __init__(self, nodes: Tuple[FxNode, ...], sr: int, mix_ratio: float):
+        self.nodes = nodes
+        self.sr = sr
+        self.mix_ratio = mix_ratio
+
+    @property
+    def order(self) -> Tuple[str, ...]:
+        """params stages in the order they run"""
+        return tuple(stage for node in self.nodes for stage in node.stages)
+
+    def render(self, y: np.ndarray) -> np.ndarray:
+        """
+        args:
+            y: input at self.sr, (frames,) or (channels, frames), never modified in place
+        return:
+            rendered and clip-safe signal, (frames,) or (channels, frames)
+        """
+        out = y
+        for node in self.nodes:
+            out = self._run(node, out)
+
+        # Normalize and clip-safe
+        maxv = np.max(np.abs(out)) + 1e-9
+        if maxv > 1.0:
+            out = out / maxv * 0.95
+        return out
+
+    def _run(self, node: FxNode, out: np.ndarray) -> np.ndarray:
+        opts, sr = node.opts, self.sr
+        if node.kind == "filter":
+            return scipy_signal.sosfilt(opts["sos"], out)
+        if node.kind == "sub_sine":
+            sub = _sine_wave(opts["freq_hz"], out.shape[-1] / sr, sr=sr, amp=opts["amp"])
+            if opts["sos"] is not None:
+                sub = scipy_signal.sosfilt(opts["sos"], sub)
+            return out * self.mix_ratio + sub * (1.0 - self.mix_ratio)
+        if node.kind == "noise":
+            return _add_noise(out, opts["amp"])
+        if node.kind == "distortion":
+            return _soft_distort(out, drive=opts["drive"])
+        if node.kind == "delay":
+            # no normalize in the middle of the chain: render() scales once at the end, like
+            # the streaming renderer, so stages after the delay see the same levels in both
+            delay_fn = _DELAYS.get(opts["mode"], _add_delay)
+            return delay_fn(out, sr, delay_ms=opts["ms"], feedback=opts["feedback"], tail_s=opts["tail_s"],
+                            normalize=False)
+        if node.kind == "stereo_width":
+            return _stereo_width(out, sr, width=opts["width"], haas_ms=opts["haas_ms"])
+        raise ValueError(f"unknown fx node {node.kind}")
+
+
+def stage_order(params: Dict[str, Any]) -> Tuple[str, ...]:
+    """FX_ORDER rearranged by params["fx_order"], unknown and repeated names are ignored"""
+    listed = [s for s in params.get("fx_order") or () if s in FX_ORDER]
+    listed = list(dict.fromkeys(listed))
+    return tuple(listed + [s for s in FX_ORDER if s not in listed])
+
+
+def _stage_opts(stage: str, p: Dict[str, Any], sr: int) -> Dict[str, Any]:
+    if stage == "sub_sine":
+        cutoff = p.get("lowpass_cutoff")
+        return {
+            "freq_hz": p.get("freq_hz", p.get("ratio_freq_hz", 55.0)),
+            "amp": p.get("amp", 0.5),
+            "sos": butter_sos("low", float(cutoff), sr) if cutoff else None,
+        }
+    if stage == "noise":
+        return {"amp": p.get("amp", 0.01)}
+    if stage == "distortion":
+        return {"drive": p.get("drive", 1.0)}
+    if stage == "delay":
+        return {"mode": p.get("mode", "mono"), "ms": p.get("ms", 60), "feedback": p.get("feedback", 0.15),
+                "tail_s": p.get("tail_ms", 0) / 1000.0}
+    return {"width": p.get("width", 1.0), "haas_ms": p.get("haas_ms", 0.0)}
+
+
+def _compile(params: Dict[str, Any], sr: int, mix_ratio: float) -> FxGraph:
+    nodes = []
+    for stage in stage_order(params):
+        if stage in FILTER_STAGES:
+            if not params.get(stage):
+                continue
+            sos = butter_sos(FILTER_STAGES[stage], float(params[stage]), sr)
+            if nodes and nodes[-1].kind == "filter":
+                # two filters in a row are one longer cascade, a single sosfilt call runs both
+                prev = nodes.pop()
+                sos = np.concatenate([prev.opts["sos"], sos])
+                nodes.append(FxNode("filter", prev.stages + (stage,), {"sos": sos}))
+            else:
+                nodes.append(FxNode("filter", (stage,), {"sos": sos}))
+            continue
+        p = params.get(stage) or {}
+        if p.get("enabled", False):
+            nodes.append(FxNode(stage, (stage,), _stage_opts(stage, p, sr)))
+    return FxGraph(tuple(nodes), sr, mix_ratio)
+
+
+@lru_cache(maxsize=128)
+def _compile_cached(key: str, sr: int, mix_ratio: float) -> FxGraph:
+    return _compile(json.loads(key), sr, mix_ratio)
+
+
+def compile_patch(params: Any, sr: int, mix_ratio: float = 0.75) -> FxGraph:
+    """
+    Compiled graph of `params` at `sr`, cached so renders of the same patch (across
+    files, variations and requests) skip the filter design.
+
+    args:
+        params: params dict or a utils.output_schema.Params model
+        sr: sample rate of the signals it will render
+        mix_ratio: wet and dry ratio of the fx into original file
+    """
+    if hasattr(params, "model_dump"):
+        params = params.model_dump(exclude_none=True)
+    key = json.dumps(params or {}, sort_keys=True, default=str)
+    return _compile_cached(key, int(sr), float(mix_ratio))
@@ -1,12 +1,13 @@
 from google.adk.tools.mcp_tool.mcp_toolset import McpToolset
 from google.adk.tools.mcp_tool.mcp_session_manager import StreamableHTTPConnectionParams
+from google.adk.agents.callback_context import CallbackContext
 
 import os
 import asyncio
+from typing import Optional
 from dotenv import load_dotenv
 
-from utils.mcp_wakeup import wait_for_wakeup
-from utils.run_sessions import run_session
+from utils.mcp_wakeup import wait_for_wakeup, DEFAULT_MAX_WAKE_SECONDS
 
 
 # load_dotenv()
@@ -18,27 +19,97 @@ freesound_api_key = os.getenv("FREESOUND_API_KEY", "")
 mcp_server_uri = os.getenv("MCP_SERVER_URI", "https://freesound-mcp-server.onrender.com")+"/mcp"
 
 
-print("[MCP_TOOL] : Checking the MCP server status")
-
-ok = asyncio.run(wait_for_wakeup(mcp_server_uri, on_wakeup_message=print))
-
-if ok:
-    print("[MCP_TOOL]: Server woke up!!")
-else:
-    print("[MCP_TOOL]: Server did NOT wake up in time")
-
-
-# MCP integration with Everything Server
-mcp_sound_server = McpToolset(
-    connection_params=StreamableHTTPConnectionParams(
-        url= mcp_server_uri,
-        headers= {"Authorization": freesound_api_key},
-    ),
-)
-
-print("[MCP_TOOL]: MCP Tool created")
-
-
-
-
-
+# ================================================================
+# The free tier server sleeps when idle and can take minutes to wake.
+# Nothing blocks at import any more: the toolset is built on first use
+# and the wake-up probe runs as a background task, only the sample
+# search stage waits for it (see await_mcp_ready).
+# ================================================================
+
+_mcp_sound_server: Optional[McpToolset] = None
+_wakeup_task: Optional[asyncio.Task] = None
+_server_ready = False
+
+
+def get_mcp_sound_server() -> McpToolset:
+    """MCP toolset for the freesound server, created on first call"""
+    global _mcp_sound_server
+    if _mcp_sound_server is None:
+        # MCP integration with Everything Server
+        _mcp_sound_server = McpToolset(
+            connection_params=StreamableHTTPConnectionParams(
+                url= mcp_server_uri,
+                headers= {"Authorization": freesound_api_key},
+            ),
+        )
+        print("[MCP_TOOL]: MCP Tool created")
+    return _mcp_sound_server
+
+
+def mcp_status() -> str:
+    """readiness state: 'ready', 'waking', 'unreachable' or 'cold' (nobody asked yet)"""
+    if _server_ready:
+        return "ready"
+    if _wakeup_task is None:
+        return "cold"
+    if not _wakeup_task.done():
+        return "waking"
+    return "unreachable"
+
+
+async def _wake(max_wait: float) -> bool:
+    global _server_ready
+    ok = await wait_for_wakeup(mcp_server_uri, max_wait=max_wait, on_wakeup_message=print)
+    if ok:
+        print("[MCP_TOOL]: Server woke up!!")
+    else:
+        print("[MCP_TOOL]: Server did NOT wake up in time")
+    _server_ready = ok
+    return ok
+
+
+def start_mcp_wakeup(max_wait: float = DEFAULT_MAX_WAKE_SECONDS) -> Optional[asyncio.Task]:
+    """
+    Kick off the wake-up probe in the background on the running event loop and return
+    immediately. Idempotent: an in-flight probe on this loop is reused, and once the
+    server answered nothing is probed again. A finished failed probe (or one left on
+    an old event loop) is restarted.
+    """
+    global _wakeup_task
+    if _server_ready:
+        return None
+    loop = asyncio.get_running_loop()
+    stale = _wakeup_task is None or _wakeup_task.get_loop() is not loop or _wakeup_task.done()
+    if stale:
+        print("[MCP_TOOL] : Checking the MCP server status in the background")
+        _wakeup_task = loop.create_task(_wake(max_wait))
+    return _wakeup_task
+
+
+async def ensure_mcp_ready(max_wait: float = DEFAULT_MAX_WAKE_SECONDS) -> bool:
+    """Wait for the background probe (starting one if needed), True when the server is up"""
+    task = start_mcp_wakeup(max_wait)
+    if task is None:
+        return True
+    return await asyncio.shield(task)
+
+
+# ---------------- agent callbacks ----------------
+
+def warm_mcp_callback(callback_context: CallbackContext):
+    """before_agent_callback for the first pipeline stage: start waking the server, don't wait"""
+    start_mcp_wakeup()
+    return None
+
+
+async def await_mcp_callback(callback_context: CallbackContext):
+    """before_agent_callback for the stage that actually calls MCP: wait for the server"""
+    await ensure_mcp_ready()
+    return None
+
+
+def __getattr__(name):
+    # keeps `from src.tools.mcp_sound_tool import mcp_sound_server` working, lazily
+    if name == "mcp_sound_server":
+        return get_mcp_sound_server()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,38 @@
+# src/tools/pooled_tools.py
+"""
+Async versions of the CPU heavy ADK tools, run on the dsp pool (see dsp_pool.py) so an
+analysis doesn't stall the other sessions' event loop. Names, signatures and docstrings
+match the sync tools, the models see the same tool either way.
+"""
+import os
+from typing import Any, Dict
+
+from src.tools import feature_extractor, vector_index
+from src.tools.dsp_pool import run_dsp
+
+
+async def compute_basic_descriptors(path: str, sr: int = 22050) -> Dict[str, Any]:
+    """
+    Compute lightweight descriptors for an audio file and return JSON-safe python types.
+    Tempo is guaranteed to be either a float or None.
+
+    args:
+        path: audio file path from the user's prompt
+        sr: analysis sample rate
+    """
+    return await run_dsp(feature_extractor.compute_basic_descriptors, path, sr, affinity=os.path.abspath(path))
+
+
+async def find_similar_sounds(audio_path: str, k: int = 5) -> Dict[str, Any]:
+    """
+    Finds sounds from the library of previously analyzed and rendered files that are
+    closest to the given audio (timbre, dynamics, tempo and pitch).
+
+    Args:
+        audio_path: path of the user's audio file
+        k: number of similar sounds to return
+
+    Returns:
+        dict with "similar": list of {"path", "kind", "distance"}, smaller distance is more similar
+    """
+    return await run_dsp(vector_index.find_similar_sounds, audio_path, k, affinity=os.path.abspath(audio_path))
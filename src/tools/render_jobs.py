@@ -0,0 +1,107 @@
+# src/tools/render_jobs.py
+"""
+Background full renders with a status handle.
+
+In preview mode the user gets a short excerpt right away (synthesis_demo.render_preview)
+and the full length render is submitted here: it runs as a task on the event loop (the
+DSP itself on the dsp pool) while the response goes out. Each job gets an id that front
+ends poll (server.py GET /render/{id}) or await.
+
+Job status goes queued -> running -> done | error | cancelled. Finished jobs are kept for
+lookup up to MAX_FINISHED_JOBS, oldest dropped first.
+"""
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+MAX_FINISHED_JOBS = 256
+
+_FINAL = ("done", "error", "cancelled")
+
+
+class RenderJob:
+    """
+    args:
+        out_path: file the full render writes
+    """
+
+    def __init__(self, out_path: str):
+        self.id = uuid.uuid4().hex
+        self.out_path = out_path
+        self.status = "queued"
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in _FINAL
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job": self.id, "status": self.status, "path": self.out_path, "error": self.error,
+            "result": self.result,
+            "elapsed_s": round((self.finished or time.time()) - self.created, 3),
+        }
+
+    async def wait(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """status dict once the job is finished, waiting never cancels the job itself"""
+        if self._task is not None and not self._task.done():
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        return self.to_dict()
+
+    async def _run(self, render: Callable[[], Awaitable[Dict[str, Any]]]):
+        self.status = "running"
+        self.started = time.time()
+        try:
+            self.result = await render()
+            self.status = "done" if self.result.get("ok") else "error"
+            self.error = self.result.get("error")
+        except asyncio.CancelledError:
+            self.status = "cancelled"
+            raise
+        except Exception as e:
+            self.status = "error"
+            self.error = f"{type(e).__name__}: {e}"
+        finally:
+            self.finished = time.time()
+            _prune()
+
+
+_jobs: "OrderedDict[str, RenderJob]" = OrderedDict()
+
+
+def _prune():
+    finished = [job_id for job_id, job in _jobs.items() if job.done]
+    for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[job_id]
+
+
+def submit_render(render: Callable[[], Awaitable[Dict[str, Any]]], out_path: str) -> RenderJob:
+    """
+    Starts `render()` in the background on the running loop.
+
+    args:
+        render: coroutine function doing the full render, returns the usual {"ok", ...} dict
+        out_path: file it writes, reported in the status
+    """
+    job = RenderJob(out_path)
+    _jobs[job.id] = job
+    job._task = asyncio.get_running_loop().create_task(job._run(render))
+    return job
+
+
+def get_render_job(job_id: str) -> Optional[RenderJob]:
+    return _jobs.get(job_id)
+
+
+async def wait_render_jobs(timeout: Optional[float] = None) -> None:
+    """waits for every unfinished job, for one-shot runs that exit after the last prompt"""
+    pending = [job._task for job in _jobs.values() if job._task is not None and not job._task.done()]
+    if pending:
+        await asyncio.wait(pending, timeout=timeout)
@@ -0,0 +1,126 @@
+# src/tools/response_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+from utils.cache_dir import cache_path
+
+# next to descriptor_cache.db by default, set SOUNDSPARK_RESPONSE_CACHE="" to turn it off
+DEFAULT_CACHE_PATH = cache_path("response_cache.db")
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_TTL_SECONDS = 24 * 3600
+
+
+def make_response_key(namespace: str, signature: Any) -> str:
+    """Key = the state key being cached + a JSON-able signature of everything the answer depends on"""
+    blob = namespace + json.dumps(signature, sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent cache of agent outputs (any JSON-able state value) backed by SQLite.
+
+    Entries expire `ttl` seconds after they were written, and the table is kept to
+    `max_entries` rows by evicting the least recently used ones.
+
+    args:
+        path: sqlite file to store the cache in
+        max_entries: number of rows kept
+        ttl: seconds an entry stays valid, 0 or less means no expiry
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_access ON responses(last_access)")
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl > 0 and now - created > self.ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self._expired(row[1], now):
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Any) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            if self.ttl > 0:
+                self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            # LRU eviction, drop everything past the newest max_entries rows
+            self._conn.execute(
+                "DELETE FROM responses WHERE key NOT IN "
+                "(SELECT key FROM responses ORDER BY last_access DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """
+    Process wide cache instance configured from the environment.
+
+    env:
+        SOUNDSPARK_RESPONSE_CACHE: sqlite path, empty string disables the cache
+        SOUNDSPARK_RESPONSE_CACHE_SIZE: max number of cached responses
+        SOUNDSPARK_RESPONSE_CACHE_TTL: seconds a response stays valid
+    return:
+        ResponseCache or None when caching is disabled
+    """
+    global _cache
+    path = os.getenv("SOUNDSPARK_RESPONSE_CACHE", DEFAULT_CACHE_PATH)
+    if not path:
+        return None
+    with _cache_lock:
+        if _cache is None or _cache.path != path:
+            _cache = ResponseCache(
+                path,
+                max_entries=int(os.getenv("SOUNDSPARK_RESPONSE_CACHE_SIZE", DEFAULT_MAX_ENTRIES)),
+                ttl=float(os.getenv("SOUNDSPARK_RESPONSE_CACHE_TTL", DEFAULT_TTL_SECONDS)),
+            )
+        return _cache
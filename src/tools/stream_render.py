@@ -0,0 +1,292 @@
+# src/tools/stream_render.py
+import os
+import tempfile
+from typing import Any, Dict, Optional
+
+import numpy as np
+import soundfile as sf
+from scipy.signal import lfilter, sosfilt
+
+from src.tools.fx_graph import compile_patch
+from src.tools.synthesis_demo import RENDER_CHANNELS, _as_stereo
+
+DEFAULT_BLOCK_SIZE = 65536
+
+
+# ================================================================
+# Stateful block processors, each one carries whatever it needs
+# between blocks so the concatenated output equals a one-shot render.
+# All of them work along the last axis, like render_patch.
+# ================================================================
+
+class _Filter:
+    """SOS cascade (a compiled fx_graph filter node) with its sosfilt zi carried across blocks"""
+
+    def __init__(self, sos):
+        self.sos = sos
+        self.zi = None
+
+    def __call__(self, x):
+        if self.zi is None:
+            self.zi = np.zeros((self.sos.shape[0],) + x.shape[:-1] + (2,))
+        y, self.zi = sosfilt(self.sos, x, zi=self.zi)
+        return y
+
+
+class _Comb:
+    """Feedback comb y[n] = x[n] + fb * y[n - d], the last d outputs are the delay line"""
+
+    def __init__(self, delay_samples, feedback):
+        self.d = delay_samples
+        self.fb = feedback
+        self.hist = None
+
+    def __call__(self, x):
+        if self.d <= 0:
+            return x * (1.0 + self.fb)
+        lead, n, d = x.shape[:-1], x.shape[-1], self.d
+        if self.hist is None:
+            self.hist = np.zeros(lead + (d,))
+        rows = -(-n // d)
+        padded = np.zeros(lead + (rows * d,))
+        padded[..., :n] = x
+        # same row folding as synthesis_demo._comb, the first row feeds back off the history
+        y, _ = lfilter([1.0], [1.0, -self.fb], padded.reshape(lead + (rows, d)), axis=-2,
+                       zi=(self.fb * self.hist)[..., None, :])
+        y = y.reshape(lead + (-1,))[..., :n]
+        self.hist = np.concatenate([self.hist, y], axis=-1)[..., -d:]
+        return y
+
+
+class _Delay:
+    """Plain d sample delay line"""
+
+    def __init__(self, delay_samples):
+        self.d = max(delay_samples, 0)
+        self.buf = None
+
+    def __call__(self, x):
+        if self.d == 0:
+            return x
+        if self.buf is None:
+            self.buf = np.zeros(x.shape[:-1] + (self.d,))
+        joined = np.concatenate([self.buf, x], axis=-1)
+        self.buf = joined[..., x.shape[-1]:]
+        return joined[..., :x.shape[-1]]
+
+
+class _DelayFx:
+    """Streaming counterpart of _add_delay / _add_stereo_delay / _add_pingpong_delay (without the normalize)"""
+
+    def __init__(self, sr, delay_ms, feedback, mode="mono", spread=1.5):
+        d = int(sr * delay_ms / 1000.0)
+        self.mode = mode
+        self.fb = feedback
+        if mode == "stereo":
+            self.left = _Comb(d, feedback)
+            self.right = _Comb(int(sr * delay_ms * spread / 1000.0), feedback)
+        elif mode == "ping_pong":
+            self.even = _Comb(2 * d, feedback ** 2)
+            self.odd = _Delay(d)
+        else:
+            self.comb = _Comb(d, feedback)
+
+    def __call__(self, x):
+        if self.mode == "stereo":
+            x = _as_stereo(x)
+            return np.stack([self.left(x[0]), self.right(x[1])])
+        if self.mode == "ping_pong":
+            mid = x if x.ndim == 1 else x.mean(axis=0)
+            even = self.even(mid)
+            odd = self.fb * self.odd(even)
+            if x.ndim == 1:
+                return np.stack([even, x + odd])
+            dry = _as_stereo(x)
+            return np.stack([dry[0] + (even - mid), dry[1] + odd])
+        return self.comb(x)
+
+
+class _WidthFx:
+    """Streaming counterpart of synthesis_demo._stereo_width, the Haas offset is a delay line"""
+
+    def __init__(self, sr, width, haas_ms):
+        self.width = width
+        self.haas = _Delay(int(sr * max(haas_ms, 0.0) / 1000.0))
+
+    def __call__(self, x):
+        x = _as_stereo(x)
+        left, right = x[0], self.haas(x[1])
+        mid = 0.5 * (left + right)
+        side = (0.5 * self.width) * (left - right)
+        return np.stack([mid + side, mid - side])
+
+
+class _SubSine:
+    """sub sine layer, the sample counter keeps the phase continuous across blocks"""
+
+    def __init__(self, sr, opts, mix_ratio):
+        self.sr = sr
+        self.opts = opts
+        self.mix_ratio = mix_ratio
+        self.lp = _Filter(opts["sos"]) if opts["sos"] is not None else None
+        self.n = 0
+
+    def __call__(self, x):
+        t = (self.n + np.arange(x.shape[-1])) / self.sr
+        self.n += x.shape[-1]
+        sub = self.opts["amp"] * np.sin(2 * np.pi * self.opts["freq_hz"] * t)
+        if self.lp is not None:
+            sub = self.lp(sub)
+        return x * self.mix_ratio + sub * (1.0 - self.mix_ratio)
+
+
+class _PatchStream:
+    """apply_patch's compiled effect graph (fx_graph), fed one block at a time"""
+
+    def __init__(self, sr: int, params: Dict[str, Any], mix_ratio: float):
+        self.sr = sr
+        graph = compile_patch(params, sr, mix_ratio)
+        self.stages = [self._stage(node, mix_ratio) for node in graph.nodes]
+        kinds = [node.kind for node in graph.nodes]
+
+        # the ring-out tail only goes through the delay and what follows it, the same as
+        # _delay_input padding at the delay in the one-shot render
+        self.delay_at = kinds.index("delay") if "delay" in kinds else len(kinds)
+        self.delay_lead = ()
+        self.tail = 0
+        # stereo delays and the width stage always put out left / right
+        self.stereo = False
+        for node in graph.nodes:
+            if node.kind == "delay":
+                self.tail = int(sr * max(node.opts["tail_s"], 0.0))
+                self.stereo |= node.opts["mode"] in ("stereo", "ping_pong")
+            elif node.kind == "stereo_width":
+                self.stereo = True
+
+    def _stage(self, node, mix_ratio):
+        opts = node.opts
+        if node.kind == "filter":
+            return _Filter(opts["sos"])
+        if node.kind == "sub_sine":
+            return _SubSine(self.sr, opts, mix_ratio)
+        if node.kind == "noise":
+            return lambda x: x + np.random.randn(*x.shape) * opts["amp"]
+        if node.kind == "distortion":
+            return lambda x: np.tanh(x * opts["drive"])
+        if node.kind == "delay":
+            return _DelayFx(self.sr, opts["ms"], opts["feedback"], mode=opts["mode"])
+        return _WidthFx(self.sr, opts["width"], opts["haas_ms"])
+
+    def out_channels(self, in_channels: int) -> int:
+        """channels of the rendered output for a source of `in_channels`"""
+        return 2 if self.stereo else in_channels
+
+    def process(self, x: np.ndarray, tail: bool = False) -> np.ndarray:
+        """
+        x: (frames,) or (channels, frames) block. tail=True marks the zero padded ring-out after the source ended,
+        which starts at the delay stage; its channel layout follows what the delay was fed.
+        """
+        out = x
+        start = 0
+        if tail:
+            start = self.delay_at
+            out = np.zeros(self.delay_lead + x.shape[-1:])
+        for i, stage in enumerate(self.stages[start:], start):
+            if i == self.delay_at:
+                self.delay_lead = out.shape[:-1]
+            out = stage(out)
+        return out
+
+
+def _source_blocks(path: str, block_size: int, sr: Optional[int], channels: int):
+    """
+    Yield float32 blocks laid out like load_render_input: (frames,) when `channels` is 1
+    (the source is downmixed first, as the audio store does), (channels, frames) otherwise.
+    Resamples on the fly with a soxr stream when sr differs.
+    """
+    native_sr = sf.info(path).samplerate
+    resampler = None
+    if sr is not None and sr != native_sr:
+        import soxr
+        resampler = soxr.ResampleStream(native_sr, sr, channels, dtype="float32", quality="HQ")
+
+    for block in sf.blocks(path, blocksize=block_size, dtype="float32", always_2d=True):
+        # soxr and soundfile both take (frames, channels)
+        if channels == 1:
+            block = block.mean(axis=1)
+        if resampler is not None:
+            block = resampler.resample_chunk(block, last=False)
+        if len(block):
+            yield block.T
+    if resampler is not None:
+        last = resampler.resample_chunk(np.zeros((0, channels) if channels > 1 else 0, dtype=np.float32), last=True)
+        if len(last):
+            yield last.T
+
+
+def apply_patch_streaming(
+    input_audio_path: str,
+    out_path: str,
+    params: Optional[Dict[str, Any]] = None,
+    sr: Optional[int] = None,
+    mix_ratio: float = 0.75,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+) -> Dict[str, Any]:
+    """
+    Block based apply_patch for long audio, memory stays O(block_size) instead of
+    several times the file length.
+
+    Reads with soundfile.blocks, keeping the source channels like apply_patch, carries
+    filter zi, delay lines and the sine phase between blocks, and writes incrementally. The final peak normalization needs the
+    global peak, so pass 1 writes float32 to a temp file next to out_path and pass 2
+    streams it into out_path scaled.
+
+    arg:
+        input_audio_path: original audio file path
+        out_path: path of the rendered file, format picked from the extension
+        params: structured synthesis parameters (same as apply_patch)
+        sr: output sample rate, None renders at the file's native rate
+        mix_ratio: wet and dry ratio of the fx into original file
+        block_size: frames read per block
+
+    return:
+        same metadata dict as apply_patch
+    """
+    params = params or {}
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    info = sf.info(input_audio_path)
+    rate = sr if sr is not None else info.samplerate
+    # source channels are kept unless SOUNDSPARK_RENDER_CHANNELS=mono, like the one-shot render
+    in_channels = 1 if RENDER_CHANNELS == "mono" else info.channels
+    chain = _PatchStream(rate, params, mix_ratio)
+    channels = chain.out_channels(in_channels)
+
+    fd, tmp_path = tempfile.mkstemp(suffix=".wav", dir=os.path.dirname(out_path) or ".")
+    os.close(fd)
+    peak = 0.0
+    try:
+        # pass 1: render
+        with sf.SoundFile(tmp_path, "w", samplerate=rate, channels=channels, subtype="FLOAT") as tmp:
+            def emit(block):
+                nonlocal peak
+                peak = max(peak, float(np.max(np.abs(block)))) if block.size else peak
+                tmp.write(block.T.astype(np.float32))
+
+            for block in _source_blocks(input_audio_path, block_size, sr, in_channels):
+                emit(chain.process(block))
+            remaining = chain.tail
+            while remaining > 0:
+                n = min(block_size, remaining)
+                emit(chain.process(np.zeros(n), tail=True))
+                remaining -= n
+
+        # pass 2: normalize and clip-safe into the real output
+        gain = 0.95 / (peak + 1e-9) if peak + 1e-9 > 1.0 else 1.0
+        with sf.SoundFile(out_path, "w", samplerate=rate, channels=channels) as out:
+            for block in sf.blocks(tmp_path, blocksize=block_size, dtype="float32", always_2d=True):
+                out.write(block * gain)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return {"ok": True, "path": out_path, "params": params}
@@ -1,125 +1,338 @@
 # src/tools/synthesis_demo.py
 import os
 import numpy as np
-import soundfile as sf
-import librosa
-from scipy.signal import butter, lfilter, fftconvolve
+from functools import lru_cache
 from typing import Dict, Any, Optional
 
+from src.tools.audio_store import load_audio
+from utils.lazy_import import lazy_import
+
+# heavy DSP deps are bound lazily so importing the tool (and the app) stays fast
+sf = lazy_import("soundfile")
+scipy_signal = lazy_import("scipy.signal")
+librosa = lazy_import("librosa")
+
 # from src.tools.code_exec_tool import interpret_instructions
 
+# native keeps the source channels through the render, mono downmixes on load like before
+RENDER_CHANNELS = os.getenv("SOUNDSPARK_RENDER_CHANNELS", "native").lower()
+# rate of renders whose call doesn't ask for one: native renders at the source's own rate
+# without resampling, a number (e.g. 22050, the old behaviour) resamples everything to it
+_RENDER_SR = os.getenv("SOUNDSPARK_RENDER_SR", "native")
+RENDER_SR = None if _RENDER_SR.lower() == "native" else int(_RENDER_SR)
+# librosa.resample type for renders at another rate than the source's. soxr_hq is libsoxr's
+# polyphase resampler and measured 2-3x faster than scipy's resample_poly ("polyphase") here
+RENDER_RESAMPLER = os.getenv("SOUNDSPARK_RENDER_RESAMPLER", "soxr_hq")
+# preview renders: seconds of source, which part of it (loudest | first) and the highest
+# rate they render at
+PREVIEW_SECONDS = float(os.getenv("SOUNDSPARK_PREVIEW_SECONDS", 6))
+PREVIEW_START = os.getenv("SOUNDSPARK_PREVIEW_START", "loudest").lower()
+PREVIEW_SR = int(os.getenv("SOUNDSPARK_PREVIEW_SR", 22050))
+
 def load_mono(path: str, sr: int = 22050):
-    y, sr2 = librosa.load(path, sr=sr, mono=True)
-    return y, sr
+    """read-only mono view at `sr`, decoded once per file and shared with the analysis (audio_store)"""
+    return load_audio(path, sr=sr)
+
+def load_render_input(path: str, sr: Optional[int] = None):
+    """
+    read-only render input at `sr` (RENDER_SR when None, so the native rate by default):
+    (frames,) for mono files or SOUNDSPARK_RENDER_CHANNELS=mono, (channels, frames) otherwise.
+    Comes from the same decoded buffer as load_mono; a resampled variant is computed once
+    per (file, rate) and kept in the audio store for the next render.
+
+    return:
+        (signal, sample rate it is at)
+    """
+    return load_audio(path, sr=sr if sr is not None else RENDER_SR,
+                      mono=RENDER_CHANNELS == "mono", res_type=RENDER_RESAMPLER)
 
 def _sine_wave(freq_hz: float, duration_s: float, sr: int = 22050, amp: float = 0.5):
     t = np.linspace(0, duration_s, int(sr * duration_s), endpoint=False)
     return amp * np.sin(2 * np.pi * freq_hz * t)
 
-def _lowpass(signal, cutoff, sr, order=4):
+@lru_cache(maxsize=256)
+def butter_sos(btype: str, cutoff: float, sr: int, order: int = 4) -> np.ndarray:
+    """
+    Butterworth design in second order sections, done once per (btype, cutoff, sr, order).
+    SOS keeps low cutoffs at high rates stable where the transfer function form drifts.
+    The returned array is shared between callers, never modify it (sosfilt needs it writable).
+    """
     nyquist = 0.5 * sr
     norm_cutoff = max(1e-6, min(cutoff / nyquist, 0.999))
-    b, a = butter(order, norm_cutoff, btype='low', analog=False)
-    return lfilter(b, a, signal)
+    return scipy_signal.butter(order, norm_cutoff, btype=btype, analog=False, output="sos")
+
+def _lowpass(signal, cutoff, sr, order=4):
+    return scipy_signal.sosfilt(butter_sos("low", float(cutoff), int(sr), order), signal)
 
 def _highpass(signal, cutoff, sr, order=4):
-    nyquist = 0.5 * sr
-    norm_cutoff = max(1e-6, min(cutoff / nyquist, 0.999))
-    b, a = butter(order, norm_cutoff, btype='high', analog=False)
-    return lfilter(b, a, signal)
+    return scipy_signal.sosfilt(butter_sos("high", float(cutoff), int(sr), order), signal)
 
 def _soft_distort(signal, drive=1.0):
     # simple tanh distortion
     return np.tanh(signal * drive)
 
-def _add_delay(signal, sr, delay_ms=60, feedback=0.2):
-    delay_s = delay_ms / 1000.0
-    delay_samples = int(sr * delay_s)
-    out = np.copy(signal)
-    for i in range(delay_samples, len(signal)):
-        out[i] += feedback * out[i - delay_samples]
+def _comb(signal, delay_samples, feedback):
+    """
+    Feedback comb y[n] = x[n] + feedback * y[n - delay_samples], along the last axis.
+
+    The recursion only ever looks exactly one delay back, so folding the signal into
+    rows of `delay_samples` turns it into a first order IIR running down the rows;
+    a single lfilter call along the row axis then handles every column (and channel) at once.
+    """
+    n = signal.shape[-1]
+    if delay_samples <= 0:
+        # degenerate case of the old per-sample loop: every sample fed back onto itself once
+        return signal * (1.0 + feedback)
+    lead = signal.shape[:-1]
+    rows = -(-n // delay_samples)
+    padded = np.zeros(lead + (rows * delay_samples,), dtype=np.result_type(signal, np.float32))
+    padded[..., :n] = signal
+    out = scipy_signal.lfilter([1.0], [1.0, -feedback], padded.reshape(lead + (rows, delay_samples)), axis=-2)
+    return out.reshape(lead + (-1,))[..., :n].astype(padded.dtype, copy=False)
+
+def _delay_input(signal, sr, tail_s):
+    # zero tail so the echoes can ring out past the end of the source
+    tail = int(sr * max(tail_s, 0.0))
+    if tail == 0:
+        return signal
+    return np.concatenate([signal, np.zeros(signal.shape[:-1] + (tail,), dtype=signal.dtype)], axis=-1)
+
+def _as_stereo(signal):
+    """
+    (2, frames) view of a render signal: mono is duplicated, more than two channels fold
+    onto left / right by alternating channels (L R L R ... as in the common layouts).
+    """
+    if signal.ndim == 1:
+        return np.broadcast_to(signal, (2, signal.shape[-1]))
+    if signal.shape[0] == 2:
+        return signal
+    if signal.shape[0] == 1:
+        return np.broadcast_to(signal[0], (2, signal.shape[-1]))
+    return np.stack([signal[0::2].mean(axis=0), signal[1::2].mean(axis=0)])
+
+def _normalize_delay(out):
     # normalize
     m = np.max(np.abs(out)) + 1e-9
     if m > 1.0:
         out = out / m * 0.95
     return out
 
+def _add_delay(signal, sr, delay_ms=60, feedback=0.2, tail_s=0.0, normalize=True):
+    delay_s = delay_ms / 1000.0
+    delay_samples = int(sr * delay_s)
+    out = _comb(_delay_input(signal, sr, tail_s), delay_samples, feedback)
+    return _normalize_delay(out) if normalize else out
+
+def _add_stereo_delay(signal, sr, delay_ms=60, feedback=0.2, spread=1.5, tail_s=0.0, normalize=True):
+    """
+    Two independent combs, the right one `spread` times longer, each fed by its own side
+    of the source (both by the same signal for mono input). Returns (2, frames).
+    normalize=False leaves the level to the caller (the fx graph normalizes once at its end).
+    """
+    x = _as_stereo(_delay_input(signal, sr, tail_s))
+    left = _comb(x[0], int(sr * delay_ms / 1000.0), feedback)
+    right = _comb(x[1], int(sr * delay_ms * spread / 1000.0), feedback)
+    out = np.stack([left, right])
+    return _normalize_delay(out) if normalize else out
+
+def _add_pingpong_delay(signal, sr, delay_ms=60, feedback=0.2, tail_s=0.0, normalize=True):
+    """
+    Echoes alternate right / left. Echo k (gain feedback**k, k * delay) lands on the right
+    for odd k and on the left for even k, which is a comb at twice the delay with
+    feedback**2 on the left and the same comb delayed once and scaled by feedback on the right.
+    The echoes are fed by the mid signal, the dry source keeps its own image.
+    Returns (2, frames).
+    """
+    x = _delay_input(signal, sr, tail_s)
+    mid = x if x.ndim == 1 else x.mean(axis=0)
+    d = int(sr * delay_ms / 1000.0)
+    even = _comb(mid, 2 * d, feedback ** 2)
+    odd = np.zeros_like(even)
+    if d < len(even):
+        odd[d:] = feedback * even[:len(even) - d]
+    if x.ndim == 1:
+        out = np.stack([even, x + odd])
+    else:
+        dry = _as_stereo(x)
+        out = np.stack([dry[0] + (even - mid), dry[1] + odd])
+    return _normalize_delay(out) if normalize else out
+
+def _stereo_width(signal, sr, width=1.0, haas_ms=0.0):
+    """
+    Mid / side width: the side signal is scaled by `width` (0 folds to mono, 2 doubles it).
+    A mono source has no side, `haas_ms` delays the right channel to create one first.
+    Returns (2, frames).
+    """
+    x = _as_stereo(signal)
+    left, right = x[0], x[1]
+    d = min(int(sr * max(haas_ms, 0.0) / 1000.0), right.shape[-1])
+    if d > 0:
+        right = np.concatenate([np.zeros(d, dtype=right.dtype), right[:right.shape[-1] - d]])
+    mid = 0.5 * (left + right)
+    side = (0.5 * width) * (left - right)
+    return np.stack([mid + side, mid - side])
+
 def _add_noise(signal, noise_amp=0.02):
-    noise = np.random.randn(len(signal)) * noise_amp
+    noise = np.random.randn(*signal.shape) * noise_amp
     return signal + noise
 
+def render_patch(
+    y: np.ndarray,
+    sr: int,
+    params: Dict[str, Any],
+    mix_ratio: float = 0.75
+) -> np.ndarray:
+    """
+    Pure render step of apply_patch: takes an already decoded signal and returns the
+    processed one, without touching the disk. `y` is never modified in place, so one
+    decoded buffer can be shared by many renders.
+
+    The params are compiled into an effect graph (fx_graph.compile_patch) that is cached
+    per (params, sr, mix_ratio), so filters are designed once and the same graph renders
+    every file at that rate. Every stage works on the last (time) axis, so multichannel
+    input goes through the filters and combs in one call for all channels, no per channel loop.
+
+    arg:
+        y: decoded input signal, (frames,) or (channels, frames)
+        sr: sample rate of y
+        params: structured synthesis parameters, "fx_order" reorders the stages
+        mix_ratio: wet and dry ratio of the fx into original file
+
+    return:
+        rendered signal, (frames,) for mono input without stereo fx, (channels, frames) otherwise
+    """
+    from src.tools.fx_graph import compile_patch
+    return compile_patch(params, sr, mix_ratio).render(y)
+
+def write_render(out_path: str, out: np.ndarray, sr: int) -> None:
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    # multichannel renders are (channels, frames), soundfile wants (frames, channels)
+    sf.write(out_path, out.T.astype(np.float32), sr)
+
+# files longer than this (seconds) go through the streaming renderer
+STREAM_RENDER_SECONDS = float(os.getenv("SOUNDSPARK_STREAM_RENDER_SECONDS", 600))
+
+def _should_stream(path: str) -> bool:
+    try:
+        return sf.info(path).duration > STREAM_RENDER_SECONDS
+    except Exception:
+        # formats libsndfile can't open still go through librosa's loaders
+        return False
+
 def apply_patch(
     input_audio_path: str,
     out_path: str,
     instructions: Optional[str] = None,
     params: Optional[Dict[str, Any]] = None,
-    sr: int = 22050,
-    mix_ratio: float = 0.75
+    sr: Optional[int] = None,
+    mix_ratio: float = 0.75,
+    streaming: Optional[bool] = None
 ) -> Dict[str, Any]:
     """
     High-level tool: loads input audio, interprets instructions or params,
     applies synthesis and effects and writes out_path.
     Returns metadata with applied params and path.
+    Long files (over SOUNDSPARK_STREAM_RENDER_SECONDS) are rendered block by block
+    through stream_render so memory doesn't scale with the file length; that path
+    runs the same compiled effect graph but off the mono downmix.
 
     arg:
         input_audio_path: original audio file path uploaded by the user 
         out_path: path of a new synthesized file being written to
         instructions: LLM given JSON based instructions
         params: LLM suggested tweaks
-        sr: sample rate of the audio file
+        sr: render (and output) sample rate, None keeps the source's native rate
+            (or SOUNDSPARK_RENDER_SR when that is set to a number)
         mix_ration: wet and dry ratio of the fx into original file
+        streaming: force (True) or disable (False) the block based renderer, None decides by duration
 
     return:
         JSON String that has output path to synthesized file, and applied params on it 
     """
-    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    if streaming is None:
+        streaming = _should_stream(input_audio_path)
+    if streaming:
+        from src.tools.stream_render import apply_patch_streaming
+        return apply_patch_streaming(input_audio_path, out_path, params=params,
+                                     sr=sr if sr is not None else RENDER_SR, mix_ratio=mix_ratio)
 
-    # load
-    y, sr = load_mono(input_audio_path, sr=sr)
-    duration = len(y) / sr
+    # load, with the source channels unless SOUNDSPARK_RENDER_CHANNELS=mono
+    y, sr = load_render_input(input_audio_path, sr=sr)
 
     # If params are explicitly provided, trust them. Otherwise parse instructions.
     # if params is None:
     #     params = interpret_instructions(instructions or "", y, sr)
 
-    # Start with original (or silence) and build layers
-    base = y.copy()
-    out = base.copy()
-
-    # SUB-SINE layer
-    if params.get("sub_sine", {}).get("enabled", False):
-        f = params["sub_sine"].get("freq_hz", params["sub_sine"].get("ratio_freq_hz", 55.0))
-        amp = params["sub_sine"].get("amp", 0.5)
-        sub = _sine_wave(f, duration, sr=sr, amp=amp)
-        # optional lowpass on sub
-        if params["sub_sine"].get("lowpass_cutoff"):
-            sub = _lowpass(sub, params["sub_sine"]["lowpass_cutoff"], sr)
-        out = out * mix_ratio + sub * (1.0 - mix_ratio)
-
-    # Noise
-    if params.get("noise", {}).get("enabled", False):
-        out = _add_noise(out, params["noise"].get("amp", 0.01))
-
-    # Distortion
-    if params.get("distortion", {}).get("enabled", False):
-        drive = params["distortion"].get("drive", 1.0)
-        out = _soft_distort(out, drive=drive)
-
-    # Lowpass/Highpass global
-    if params.get("global_lowpass"):
-        out = _lowpass(out, params["global_lowpass"], sr)
-    if params.get("global_highpass"):
-        out = _highpass(out, params["global_highpass"], sr)
-
-    # Delay
-    if params.get("delay", {}).get("enabled", False):
-        out = _add_delay(out, sr, delay_ms=params["delay"].get("ms", 60), feedback=params["delay"].get("feedback", 0.15))
-
-    # Normalize and clip-safe
-    maxv = np.max(np.abs(out)) + 1e-9
-    if maxv > 1.0:
-        out = out / maxv * 0.95
-
-    sf.write(out_path, out.astype(np.float32), sr)
+    out = render_patch(y, sr, params, mix_ratio=mix_ratio)
+    write_render(out_path, out, sr)
 
     return {"ok": True, "path": out_path, "params": params}
+
+def preview_window(y: np.ndarray, sr: int, seconds: float, start: str = "loudest"):
+    """
+    (first frame, end frame) of the `seconds` long excerpt a preview renders: the start of
+    the file, or the window with the most energy on a 100 ms grid (one cumsum, no framing).
+    """
+    n = y.shape[-1]
+    width = min(n, max(1, int(sr * seconds)))
+    if start == "first" or width >= n:
+        return 0, width
+    mono = y if y.ndim == 1 else y.mean(axis=0)
+    energy = np.concatenate([[0.0], np.cumsum(np.square(mono, dtype=np.float64))])
+    starts = np.arange(0, n - width + 1, max(1, sr // 10))
+    best = int(starts[np.argmax(energy[starts + width] - energy[starts])])
+    return best, best + width
+
+def render_preview(
+    input_audio_path: str,
+    out_path: str,
+    instructions: Optional[str] = None,
+    params: Optional[Dict[str, Any]] = None,
+    sr: Optional[int] = None,
+    mix_ratio: float = 0.75,
+    seconds: Optional[float] = None,
+    start: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Low latency counterpart of apply_patch: renders only a short excerpt of the input at
+    a reduced rate (at most SOUNDSPARK_PREVIEW_SR) so the user hears the patch right away,
+    while the full render is still running. The excerpt is cut at the native rate and only
+    the excerpt gets resampled, so the cost doesn't grow with the file length past the decode.
+    Files long enough for the streaming renderer are previewed from their start without a
+    full decode.
+
+    arg:
+        input_audio_path: original audio file path uploaded by the user
+        out_path: path of the preview file, written as is (use .wav, no encode cost)
+        instructions / params / mix_ratio: same as apply_patch
+        sr: rate the full render is asked for, the preview renders at min(sr, PREVIEW_SR)
+        seconds: excerpt length, defaults to SOUNDSPARK_PREVIEW_SECONDS
+        start: "loudest" or "first", defaults to SOUNDSPARK_PREVIEW_START
+
+    return:
+        apply_patch's metadata plus "preview": {"start_s", "seconds", "sr"}
+    """
+    seconds = PREVIEW_SECONDS if seconds is None else seconds
+    start = start or PREVIEW_START
+    params = params or {}
+
+    if _should_stream(input_audio_path):
+        native_sr = sf.info(input_audio_path).samplerate
+        y, _ = sf.read(input_audio_path, frames=int(native_sr * seconds), dtype="float32", always_2d=True)
+        y = y.T if RENDER_CHANNELS != "mono" and y.shape[1] > 1 else y.mean(axis=1)
+        first, last = 0, y.shape[-1]
+    else:
+        y, native_sr = load_render_input(input_audio_path, sr=None)
+        first, last = preview_window(y, native_sr, seconds, start)
+
+    rate = min(sr or RENDER_SR or native_sr, native_sr, PREVIEW_SR)
+    excerpt = y[..., first:last]
+    if rate != native_sr:
+        excerpt = librosa.resample(np.ascontiguousarray(excerpt), orig_sr=native_sr, target_sr=rate,
+                                   res_type=RENDER_RESAMPLER)
+
+    out = render_patch(excerpt, rate, params, mix_ratio=mix_ratio)
+    write_render(out_path, out, rate)
+
+    return {"ok": True, "path": out_path, "params": params,
+            "preview": {"start_s": round(first / native_sr, 3), "seconds": round((last - first) / native_sr, 3), "sr": rate}}
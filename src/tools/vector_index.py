@@ -0,0 +1,445 @@
+# src/tools/vector_index.py
+"""
+Persistent nearest-neighbour index over the descriptor vectors of every analyzed (and,
+optionally, rendered) file.
+
+Layout of the index directory:
+    header.json      dim, trained list / PQ sizes, how many rows the IVF covers
+    vectors.f32      raw float32 rows, appended in place and read through np.memmap
+    meta.db          row id -> audio hash, path, kind ("analyzed" / "rendered")
+    ivf_*.npy        optional IVF coarse quantizer: centroids, row order grouped by list, list offsets
+    pq_*.npz/.npy    optional product quantization codebooks and per row uint8 codes
+
+An open index notices a build done by another process (the CLI next to a running server)
+through header.json, which is replaced on every build, and reloads the IVF / PQ arrays.
+
+Search never loads the vectors into RAM: without IVF it streams the memmap in chunks,
+with IVF it only touches the rows of the `nprobe` closest lists (plus rows added since
+the last build), and with PQ it ranks those by their uint8 codes and reads exact vectors
+only to rerank the best few.
+
+usage:
+    python -m src.tools.vector_index add tests/sample_audio/*.wav
+    python -m src.tools.vector_index build --nlist 512 --pq-m 4
+    python -m src.tools.vector_index query tests/sample_audio/pluck.wav -k 5
+"""
+import argparse
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.cache_dir import cache_path
+
+# next to the descriptor cache by default, set SOUNDSPARK_VECTOR_INDEX="" to turn indexing off
+DEFAULT_INDEX_PATH = cache_path("vector_index")
+
+SEARCH_CHUNK_ROWS = 65536
+PQ_CENTROIDS = 256
+
+# (center, spread) of every descriptor feature, the vector is in units of spread so plain
+# euclidean distance weighs timbre, dynamics, tempo and pitch comparably
+_FEATURES = (
+    ("log2_centroid", 10.5, 0.6),
+    ("log2_bandwidth", 10.5, 0.6),
+    ("zero_crossing_rate", 0.05, 0.03),
+    ("percussive_ratio", 0.2, 0.15),
+    ("rms_db", -20.0, 8.0),
+    ("tempo", 120.0, 30.0),
+    ("pitch_octaves", 0.0, 1.0),
+)
+DESCRIPTOR_DIM = len(_FEATURES)
+
+
+def descriptor_vector(desc: Dict[str, Any]) -> np.ndarray:
+    """
+    args:
+        desc: compute_basic_descriptors output
+    return:
+        float32 vector of DESCRIPTOR_DIM standardized features, missing values sit at the center
+    """
+    def val(key, default):
+        v = desc.get(key)
+        return float(v) if v else default
+
+    harm, perc = val("harmonic_energy", 0.0), val("percussive_energy", 0.0)
+    pitch = val("estimated_pitch_hz", 0.0)
+    raw = (
+        math.log2(max(val("spectral_centroid", 2 ** 10.5), 1.0)),
+        math.log2(max(val("spectral_bandwidth", 2 ** 10.5), 1.0)),
+        val("zero_crossing_rate", 0.05),
+        perc / (harm + perc) if harm + perc > 0 else 0.2,
+        20.0 * math.log10(max(val("rms", 0.1), 1e-6)),
+        val("tempo", 120.0),
+        math.log2(pitch / 110.0) if pitch > 0 else 0.0,
+    )
+    return np.array([(x - c) / s for x, (_, c, s) in zip(raw, _FEATURES)], dtype=np.float32)
+
+
+def _sq_dists(x: np.ndarray, c: np.ndarray) -> np.ndarray:
+    """(n, m) squared euclidean distances between rows of x and rows of c"""
+    d = (x * x).sum(1)[:, None] - 2.0 * (x @ c.T) + (c * c).sum(1)[None, :]
+    return np.maximum(d, 0.0)
+
+
+def _kmeans(x: np.ndarray, k: int, iters: int, rng: np.random.Generator) -> np.ndarray:
+    """plain Lloyd's k-means, empty clusters are re-seeded from random points"""
+    k = min(k, len(x))
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(iters):
+        labels = _sq_dists(x, centroids).argmin(1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, x)
+        counts = np.bincount(labels, minlength=k)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = x[rng.choice(len(x), int(empty.sum()))]
+    return centroids
+
+
+def _top_k(dists: np.ndarray, ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    if len(dists) > k:
+        part = np.argpartition(dists, k)[:k]
+        dists, ids = dists[part], ids[part]
+    order = np.argsort(dists, kind="stable")
+    return dists[order], ids[order]
+
+
+class VectorIndex:
+    """
+    Append-only vector store with optional IVF / PQ acceleration, see the module docstring.
+
+    args:
+        root: index directory, created on first use
+        dim: vector size, fixed when the index is created
+    """
+
+    def __init__(self, root: str = DEFAULT_INDEX_PATH, dim: int = DESCRIPTOR_DIM):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._header_path = os.path.join(root, "header.json")
+        self._vectors_path = os.path.join(root, "vectors.f32")
+        self._stamp = None
+        if os.path.exists(self._header_path):
+            self._read_header()
+            if self.header["dim"] != dim:
+                raise ValueError(f"index at {root} holds {self.header['dim']}-d vectors, asked for {dim}")
+        else:
+            self.header = {"dim": dim, "nlist": 0, "pq_m": 0, "trained_count": 0}
+            self._save_header()
+        open(self._vectors_path, "ab").close()
+
+        # autocommit, add() runs its own BEGIN IMMEDIATE so appends from several processes
+        # (the dsp pool workers) serialize on the database lock
+        self._conn = sqlite3.connect(os.path.join(root, "meta.db"), check_same_thread=False, isolation_level=None, timeout=30.0)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS items ("
+                "id INTEGER PRIMARY KEY, audio_hash TEXT UNIQUE NOT NULL, path TEXT NOT NULL, kind TEXT NOT NULL, added REAL NOT NULL)"
+            )
+        self._ivf = None
+        self._pq = None
+
+    @property
+    def dim(self) -> int:
+        return self.header["dim"]
+
+    def __len__(self) -> int:
+        return os.path.getsize(self._vectors_path) // (4 * self.dim)
+
+    def _save_header(self):
+        tmp = self._header_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.header, f)
+        os.replace(tmp, self._header_path)
+        self._stamp = self._header_stamp()
+
+    def _header_stamp(self) -> Tuple[int, int]:
+        # os.replace gives every saved header a new inode, the mtime covers in place edits
+        st = os.stat(self._header_path)
+        return st.st_ino, st.st_mtime_ns
+
+    def _read_header(self):
+        stamp = self._header_stamp()
+        with open(self._header_path) as f:
+            self.header = json.load(f)
+        self._stamp = stamp
+
+    def _refresh(self):
+        """re-reads the header, and drops the loaded IVF / PQ, after a build by another process"""
+        try:
+            stale = self._header_stamp() != self._stamp
+        except FileNotFoundError:
+            return
+        if stale:
+            with self._lock:
+                self._read_header()
+                self._ivf = self._pq = None
+
+    def _vectors(self) -> np.ndarray:
+        n = len(self)
+        if n == 0:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(n, self.dim))
+
+    # ---------------- writes ----------------
+
+    def add(self, vector: np.ndarray, audio_hash: str, path: str, kind: str = "analyzed") -> int:
+        """Appends one vector, a known audio hash only gets its path / kind refreshed. Returns the row id."""
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        if len(vector) != self.dim:
+            raise ValueError(f"expected a {self.dim}-d vector, got {len(vector)}")
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT id FROM items WHERE audio_hash = ?", (audio_hash,)).fetchone()
+                if row is not None:
+                    self._conn.execute("UPDATE items SET path = ?, kind = ? WHERE id = ?", (os.path.abspath(path), kind, row[0]))
+                    row_id = row[0]
+                else:
+                    row_id = len(self)
+                    with open(self._vectors_path, "ab") as f:
+                        f.write(vector.tobytes())
+                    self._conn.execute(
+                        "INSERT INTO items (id, audio_hash, path, kind, added) VALUES (?, ?, ?, ?, ?)",
+                        (row_id, audio_hash, os.path.abspath(path), kind, time.time()),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row_id
+
+    def id_of(self, audio_hash: str) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute("SELECT id FROM items WHERE audio_hash = ?", (audio_hash,)).fetchone()
+        return row[0] if row else None
+
+    def items(self, ids: Sequence[int]) -> Dict[int, Dict[str, Any]]:
+        ids = [int(i) for i in ids]
+        if not ids:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, audio_hash, path, kind FROM items WHERE id IN ({','.join('?' * len(ids))})", ids
+            ).fetchall()
+        return {r[0]: {"id": r[0], "audio_hash": r[1], "path": r[2], "kind": r[3]} for r in rows}
+
+    # ---------------- IVF / PQ training ----------------
+
+    def build(self, nlist: Optional[int] = None, pq_m: int = 0, sample_size: int = 65536, iters: int = 20, seed: int = 0):
+        """
+        Trains the coarse quantizer (and PQ codebooks when pq_m > 0) on a sample of the rows
+        and assigns every row. Rows added afterwards are searched exhaustively until the next build.
+
+        args:
+            nlist: number of IVF lists, default ~sqrt(n)
+            pq_m: number of PQ sub-quantizers (uint8 code each), 0 keeps exact distances
+            sample_size: rows used for training
+            iters: k-means iterations
+            seed: training RNG seed
+        """
+        vecs = self._vectors()
+        n = len(vecs)
+        if n == 0:
+            raise ValueError("nothing to build an index over, add vectors first")
+        rng = np.random.default_rng(seed)
+        nlist = int(nlist or max(1, round(math.sqrt(n))))
+        sample = np.asarray(vecs[np.sort(rng.choice(n, min(n, sample_size), replace=False))])
+
+        centroids = _kmeans(sample, nlist, iters, rng).astype(np.float32)
+        labels = np.concatenate([
+            _sq_dists(np.asarray(vecs[i:i + SEARCH_CHUNK_ROWS]), centroids).argmin(1)
+            for i in range(0, n, SEARCH_CHUNK_ROWS)
+        ])
+        order = np.argsort(labels, kind="stable").astype(np.int64)
+        offsets = np.searchsorted(labels[order], np.arange(len(centroids) + 1)).astype(np.int64)
+        np.save(os.path.join(self.root, "ivf_centroids.npy"), centroids)
+        np.save(os.path.join(self.root, "ivf_order.npy"), order)
+        np.save(os.path.join(self.root, "ivf_offsets.npy"), offsets)
+
+        if pq_m > 0:
+            groups = np.array_split(np.arange(self.dim), min(pq_m, self.dim))
+            books = [_kmeans(sample[:, g], PQ_CENTROIDS, iters, rng).astype(np.float32) for g in groups]
+            codes = np.lib.format.open_memmap(os.path.join(self.root, "pq_codes.npy"), mode="w+", dtype=np.uint8, shape=(n, len(groups)))
+            for i in range(0, n, SEARCH_CHUNK_ROWS):
+                chunk = np.asarray(vecs[i:i + SEARCH_CHUNK_ROWS])
+                for j, (g, book) in enumerate(zip(groups, books)):
+                    codes[i:i + len(chunk), j] = _sq_dists(chunk[:, g], book).argmin(1)
+            codes.flush()
+            del codes
+            # sub-vectors can differ in width, so one array per sub-quantizer
+            np.savez(os.path.join(self.root, "pq_books.npz"), *books)
+            np.savez(os.path.join(self.root, "pq_groups.npz"), *groups)
+
+        self.header.update(nlist=len(centroids), pq_m=len(groups) if pq_m > 0 else 0, trained_count=n)
+        self._save_header()
+        self._ivf = self._pq = None
+        print(f"[vector_index] : built IVF{len(centroids)}{f',PQ{pq_m}' if pq_m else ''} over {n} vectors")
+
+    def _load_ivf(self):
+        if self._ivf is None and self.header["nlist"]:
+            load = lambda name: np.load(os.path.join(self.root, name), mmap_mode="r")
+            self._ivf = (np.load(os.path.join(self.root, "ivf_centroids.npy")), load("ivf_order.npy"), load("ivf_offsets.npy"))
+            if self.header["pq_m"]:
+                unpack = lambda name: [a for _, a in sorted(np.load(os.path.join(self.root, name)).items(), key=lambda kv: int(kv[0].split("_")[1]))]
+                self._pq = (unpack("pq_books.npz"), unpack("pq_groups.npz"), load("pq_codes.npy"))
+        return self._ivf
+
+    # ---------------- search ----------------
+
+    def _exact(self, vecs: np.ndarray, rows: np.ndarray, q: np.ndarray) -> np.ndarray:
+        return ((np.asarray(vecs[rows]) - q) ** 2).sum(1)
+
+    def search(self, query: np.ndarray, k: int = 5, nprobe: int = 8, rerank: int = 4, exclude: Sequence[int] = ()) -> List[Tuple[int, float]]:
+        """
+        args:
+            query: vector of size dim
+            k: neighbours to return
+            nprobe: IVF lists scanned, more is slower and more exact
+            rerank: with PQ, k * rerank candidates get their exact distance computed
+            exclude: row ids left out of the result (e.g. the query file itself)
+        return:
+            list of (row id, euclidean distance), closest first
+        """
+        q = np.asarray(query, dtype=np.float32).reshape(-1)
+        self._refresh()
+        vecs = self._vectors()
+        n = len(vecs)
+        want = k + len(exclude)
+        if n == 0:
+            return []
+
+        ivf = self._load_ivf()
+        if ivf is None:
+            # exhaustive, streamed in chunks off the memmap
+            best_d, best_i = np.zeros(0, np.float32), np.zeros(0, np.int64)
+            for i in range(0, n, SEARCH_CHUNK_ROWS):
+                chunk = np.asarray(vecs[i:i + SEARCH_CHUNK_ROWS])
+                d = ((chunk - q) ** 2).sum(1)
+                best_d, best_i = _top_k(np.concatenate([best_d, d]), np.concatenate([best_i, np.arange(i, i + len(chunk))]), want)
+        else:
+            centroids, order, offsets = ivf
+            lists = np.argsort(_sq_dists(q[None, :], centroids)[0])[:nprobe]
+            rows = np.concatenate([order[offsets[l]:offsets[l + 1]] for l in lists] + [np.arange(self.header["trained_count"], n)])
+            rows = np.sort(rows)  # sequential memmap reads
+            if self._pq is not None and len(rows) > want * rerank:
+                books, groups, codes = self._pq
+                # asymmetric distance: per sub-quantizer table of query-to-centroid distances, summed over codes
+                tables = [_sq_dists(q[None, g], book)[0] for g, book in zip(groups, books)]
+                trained = rows[rows < self.header["trained_count"]]
+                row_codes = np.asarray(codes[trained])
+                approx = sum(t[row_codes[:, j]] for j, t in enumerate(tables))
+                _, cand = _top_k(approx, trained, want * rerank)
+                rows = np.sort(np.concatenate([cand, rows[rows >= self.header["trained_count"]]]))
+            best_d, best_i = _top_k(self._exact(vecs, rows, q), rows, want)
+
+        skip = set(int(e) for e in exclude)
+        return [(int(i), float(math.sqrt(d))) for d, i in zip(best_d, best_i) if int(i) not in skip][:k]
+
+
+_index: Optional[VectorIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_vector_index() -> Optional[VectorIndex]:
+    """
+    Process wide index configured from the environment.
+
+    env:
+        SOUNDSPARK_VECTOR_INDEX: index directory, empty string disables indexing
+    return:
+        VectorIndex or None when disabled
+    """
+    global _index
+    path = os.getenv("SOUNDSPARK_VECTOR_INDEX", DEFAULT_INDEX_PATH)
+    if not path:
+        return None
+    with _index_lock:
+        if _index is None or _index.root != path:
+            _index = VectorIndex(path)
+        return _index
+
+
+def index_descriptors(path: str, audio_hash: str, descriptors: Dict[str, Any], kind: str = "analyzed") -> Optional[int]:
+    """adds one analyzed file to the process index, no-op when indexing is disabled"""
+    index = get_vector_index()
+    if index is None:
+        return None
+    return index.add(descriptor_vector(descriptors), audio_hash, path, kind)
+
+
+def find_similar(path: str, k: int = 5, nprobe: int = 8) -> List[Dict[str, Any]]:
+    """
+    k nearest previously analyzed / rendered sounds to the audio at `path`.
+
+    args:
+        path: audio file, analyzed (through the descriptor cache) if needed
+        k: number of neighbours
+        nprobe: IVF lists scanned when the index is built
+    return:
+        list of {"path", "kind", "distance"}, closest first, the file itself excluded
+    """
+    from src.tools.feature_extractor import analyze_file
+
+    index = get_vector_index()
+    if index is None:
+        return []
+    descriptors, audio_hash = analyze_file(path)
+    own = index.id_of(audio_hash)
+    hits = index.search(descriptor_vector(descriptors), k=k, nprobe=nprobe, exclude=[own] if own is not None else [])
+    meta = index.items([i for i, _ in hits])
+    return [
+        {"path": meta[i]["path"], "kind": meta[i]["kind"], "distance": round(d, 4)}
+        for i, d in hits if i in meta
+    ]
+
+
+def find_similar_sounds(audio_path: str, k: int = 5) -> Dict[str, Any]:
+    """
+    Finds sounds from the library of previously analyzed and rendered files that are
+    closest to the given audio (timbre, dynamics, tempo and pitch).
+
+    Args:
+        audio_path: path of the user's audio file
+        k: number of similar sounds to return
+
+    Returns:
+        dict with "similar": list of {"path", "kind", "distance"}, smaller distance is more similar
+    """
+    return {"similar": find_similar(audio_path, k=k)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SoundSpark descriptor vector index")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_add = sub.add_parser("add", help="analyze and index audio files")
+    p_add.add_argument("paths", nargs="+")
+    p_build = sub.add_parser("build", help="train IVF (and PQ) over the indexed vectors")
+    p_build.add_argument("--nlist", type=int, default=None)
+    p_build.add_argument("--pq-m", type=int, default=0)
+    p_query = sub.add_parser("query", help="nearest neighbours of an audio file")
+    p_query.add_argument("path")
+    p_query.add_argument("-k", type=int, default=5)
+    p_query.add_argument("--nprobe", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.cmd == "add":
+        from src.tools.feature_extractor import analyze_file
+        for p in args.paths:
+            analyze_file(p)
+        print(f"[vector_index] : {len(get_vector_index())} vectors indexed")
+    elif args.cmd == "build":
+        get_vector_index().build(nlist=args.nlist, pq_m=args.pq_m)
+    else:
+        t0 = time.perf_counter()
+        for hit in find_similar(args.path, k=args.k, nprobe=args.nprobe):
+            print(f"{hit['distance']:>8.3f}  {hit['kind']:<9} {hit['path']}")
+        print(f"[vector_index] : query took {(time.perf_counter() - t0) * 1000:.1f} ms")
@@ -0,0 +1,326 @@
+"""
+Request tracing: per agent wall time, LLM latency / tokens / errors, tool time and state sizes.
+
+Spans are written as JSON lines to SOUNDSPARK_TRACE_FILE, one object per finished span:
+
+    {"ts", "trace_id", "span_id", "parent_id", "kind", "name", "agent", "duration_ms", "status", ...attrs}
+
+kind is one of run (one runner invocation), agent, llm, tool. trace_id is the ADK
+invocation id, so every span of one request shares it. With SOUNDSPARK_OTLP_ENDPOINT set
+(e.g. http://localhost:4318) the same spans, plus ADK's own, also go to an OpenTelemetry
+collector over OTLP/HTTP.
+
+Agents, LLM calls and ADK tools (MCP included) are covered by TracingPlugin, registered on
+every App through app_plugins(). Work that doesn't go through an ADK tool (the feature fast
+path, apply_patch) is wrapped in get_tracer().span(...).
+
+usage:
+    SOUNDSPARK_TRACE_FILE=trace.jsonl python app.py
+    python -m src.tracing trace.jsonl          # per span p50/p95, token totals, errors
+"""
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from google.adk.plugins.base_plugin import BasePlugin
+
+
+class Span:
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "agent", "start", "wall", "attrs", "otel")
+
+    def __init__(self, name, kind, trace_id, parent_id, agent, attrs):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.agent = agent
+        self.start = time.perf_counter()
+        self.wall = time.time()
+        self.attrs = attrs
+        self.otel = None
+
+
+def _otel_value(value):
+    # OTel attributes only take primitives (and lists of them)
+    return value if isinstance(value, (str, bool, int, float)) else json.dumps(value, default=str)
+
+
+class Tracer:
+    """
+    Collects spans and writes them out. Disabled (every call a no-op) when neither a trace
+    file nor an OTLP endpoint is configured.
+
+    args:
+        path: JSON lines output file, "" for none
+        otlp_endpoint: base url of an OTLP/HTTP collector, "" for none
+    """
+
+    def __init__(self, path: str = "", otlp_endpoint: str = ""):
+        self.path = path
+        self.otlp_endpoint = otlp_endpoint
+        self._lock = threading.Lock()
+        self._file = None
+        self._otel = self._init_otel() if otlp_endpoint else None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path or self._otel)
+
+    def _init_otel(self):
+        try:
+            from opentelemetry import trace
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        except ImportError:
+            print("[tracing] : opentelemetry-sdk / opentelemetry-exporter-otlp-proto-http not installed, OTLP export disabled")
+            return None
+
+        provider = TracerProvider(resource=Resource.create({"service.name": "soundspark"}))
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=f"{self.otlp_endpoint.rstrip('/')}/v1/traces")))
+        # global provider, so ADK's own spans (google.adk tracer) land in the same collector
+        trace.set_tracer_provider(provider)
+        print(f"[tracing] : exporting spans to {self.otlp_endpoint}")
+        return trace.get_tracer("soundspark")
+
+    def start(self, name: str, kind: str, trace_id: Optional[str] = None, parent: Optional[Span] = None,
+              agent: Optional[str] = None, **attrs) -> Optional[Span]:
+        if not self.enabled:
+            return None
+        span = Span(name, kind, trace_id or (parent.trace_id if parent else None), parent.span_id if parent else None, agent, attrs)
+        if self._otel is not None:
+            from opentelemetry import trace
+            context = trace.set_span_in_context(parent.otel) if parent is not None and parent.otel is not None else None
+            span.otel = self._otel.start_span(f"{kind} {name}", context=context)
+        return span
+
+    def end(self, span: Optional[Span], status: str = "ok", **attrs):
+        if span is None:
+            return
+        span.attrs.update(attrs)
+        record = {
+            "ts": round(span.wall, 6),
+            "trace_id": span.trace_id,
+            "span_id": span.span_id,
+            "parent_id": span.parent_id,
+            "kind": span.kind,
+            "name": span.name,
+            "agent": span.agent,
+            "duration_ms": round((time.perf_counter() - span.start) * 1000.0, 3),
+            "status": status,
+            **span.attrs,
+        }
+        if span.otel is not None:
+            for key, value in record.items():
+                if value is not None and key not in ("ts", "trace_id", "span_id", "parent_id"):
+                    span.otel.set_attribute(f"soundspark.{key}", _otel_value(value))
+            if status != "ok":
+                from opentelemetry.trace import Status, StatusCode
+                span.otel.set_status(Status(StatusCode.ERROR, str(span.attrs.get("error", status))))
+            span.otel.end()
+        if self.path:
+            self._write(record)
+
+    def _write(self, record: dict):
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "a", buffering=1)
+            self._file.write(line)
+
+    @contextmanager
+    def span(self, name: str, kind: str = "tool", **kwargs):
+        """with-block span, the status turns to "error" (with the message) when the block raises"""
+        span = self.start(name, kind, **kwargs)
+        try:
+            yield span
+        except BaseException as e:
+            self.end(span, status="error", error=f"{type(e).__name__}: {e}")
+            raise
+        self.end(span)
+
+
+@lru_cache(maxsize=None)
+def get_tracer() -> Tracer:
+    """process wide tracer, configured from SOUNDSPARK_TRACE_FILE / SOUNDSPARK_OTLP_ENDPOINT on first use"""
+    return Tracer(os.getenv("SOUNDSPARK_TRACE_FILE", ""), os.getenv("SOUNDSPARK_OTLP_ENDPOINT", ""))
+
+
+def _state_size(state) -> Dict[str, Any]:
+    values = state.to_dict() if hasattr(state, "to_dict") else dict(state)
+    sizes = {k: len(json.dumps(v, default=str)) for k, v in values.items()}
+    return {"state_bytes": sum(sizes.values()), "state_key_bytes": sizes}
+
+
+def _usage(llm_response) -> Dict[str, Any]:
+    usage = llm_response.usage_metadata
+    if usage is None:
+        return {}
+    return {
+        "input_tokens": usage.prompt_token_count,
+        "output_tokens": usage.candidates_token_count,
+        "total_tokens": usage.total_token_count,
+    }
+
+
+class TracingPlugin(BasePlugin):
+    """
+    ADK plugin that turns runner / agent / model / tool callbacks into spans.
+
+    Open spans are keyed by invocation id plus agent name (agents and their LLM calls)
+    or function call id (tools), since one agent only runs once per invocation and
+    makes its model calls one after the other. Model errors end the LLM span with
+    status "error" and the next model call of the same agent is marked retry=True.
+    Retries done inside the genai http client are not visible here, they show up
+    as LLM latency.
+    """
+
+    def __init__(self, tracer: Tracer, name: str = "soundspark_tracing"):
+        super().__init__(name=name)
+        self.tracer = tracer
+        self._runs: Dict[str, Span] = {}
+        self._agents: Dict[tuple, Span] = {}
+        self._llm: Dict[tuple, Span] = {}
+        self._tools: Dict[tuple, Span] = {}
+        self._calls: Dict[tuple, int] = defaultdict(int)
+        self._failed = set()
+
+    def agent_span(self, invocation_id: str, agent_name: str) -> Optional[Span]:
+        """the open span of an agent, for manual child spans"""
+        return self._agents.get((invocation_id, agent_name))
+
+    async def before_run_callback(self, *, invocation_context):
+        self._runs[invocation_context.invocation_id] = self.tracer.start(
+            invocation_context.app_name, "run", trace_id=invocation_context.invocation_id,
+            session_id=invocation_context.session.id,
+        )
+
+    async def after_run_callback(self, *, invocation_context):
+        inv = invocation_context.invocation_id
+        self.tracer.end(self._runs.pop(inv, None), **_state_size(invocation_context.session.state))
+        for table in (self._agents, self._llm, self._tools, self._calls):
+            for key in [k for k in table if k[0] == inv]:
+                table.pop(key)
+        self._failed = {k for k in self._failed if k[0] != inv}
+
+    async def before_agent_callback(self, *, agent, callback_context):
+        inv = callback_context.invocation_id
+        parent_agent = agent.parent_agent.name if agent.parent_agent is not None else None
+        parent = self._agents.get((inv, parent_agent)) or self._runs.get(inv)
+        self._agents[(inv, agent.name)] = self.tracer.start(agent.name, "agent", trace_id=inv, parent=parent, agent=agent.name)
+
+    async def after_agent_callback(self, *, agent, callback_context):
+        span = self._agents.pop((callback_context.invocation_id, agent.name), None)
+        self.tracer.end(span, **_state_size(callback_context.state))
+
+    async def before_model_callback(self, *, callback_context, llm_request):
+        key = (callback_context.invocation_id, callback_context.agent_name)
+        self._calls[key] += 1
+        self._llm[key] = self.tracer.start(
+            llm_request.model or "llm", "llm", parent=self._agents.get(key), agent=callback_context.agent_name,
+            call=self._calls[key], retry=key in self._failed,
+        )
+        self._failed.discard(key)
+
+    async def after_model_callback(self, *, callback_context, llm_response):
+        if llm_response.partial:
+            return None
+        key = (callback_context.invocation_id, callback_context.agent_name)
+        span = self._llm.pop(key, None)
+        if llm_response.error_code:
+            self._failed.add(key)
+            self.tracer.end(span, status="error", error=f"{llm_response.error_code} {llm_response.error_message}")
+        else:
+            self.tracer.end(span, **_usage(llm_response))
+
+    async def on_model_error_callback(self, *, callback_context, llm_request, error):
+        key = (callback_context.invocation_id, callback_context.agent_name)
+        self._failed.add(key)
+        span = self._llm.pop(key, None)
+        self.tracer.end(span, status="error", error=f"{type(error).__name__}: {error}")
+
+    async def before_tool_callback(self, *, tool, tool_args, tool_context):
+        parent = self._agents.get((tool_context.invocation_id, tool_context.agent_name))
+        self._tools[(tool_context.invocation_id, tool_context.function_call_id)] = self.tracer.start(
+            tool.name, "tool", parent=parent, agent=tool_context.agent_name,
+            args_bytes=len(json.dumps(tool_args, default=str)),
+        )
+
+    async def after_tool_callback(self, *, tool, tool_args, tool_context, result):
+        span = self._tools.pop((tool_context.invocation_id, tool_context.function_call_id), None)
+        self.tracer.end(span, result_bytes=len(json.dumps(result, default=str)))
+
+    async def on_tool_error_callback(self, *, tool, tool_args, tool_context, error):
+        span = self._tools.pop((tool_context.invocation_id, tool_context.function_call_id), None)
+        self.tracer.end(span, status="error", error=f"{type(error).__name__}: {error}")
+
+
+@lru_cache(maxsize=None)
+def get_tracing_plugin() -> TracingPlugin:
+    return TracingPlugin(get_tracer())
+
+
+def app_plugins() -> List[BasePlugin]:
+    """plugins every App is built with, empty when tracing is off"""
+    return [get_tracing_plugin()] if get_tracer().enabled else []
+
+
+def agent_span(invocation_id: str, agent_name: str) -> Optional[Span]:
+    """open span of a running agent (None when tracing is off), parent for manual spans inside custom agents"""
+    return get_tracing_plugin().agent_span(invocation_id, agent_name) if get_tracer().enabled else None
+
+
+# ================================================================
+# trace file summary
+# ================================================================
+
+def summarize(path: str) -> Dict[str, dict]:
+    """
+    args:
+        path: JSON lines trace file
+    return:
+        {"<kind> <name>": {count, errors, p50_ms, p95_ms, p99_ms, input_tokens, output_tokens}}
+    """
+    groups = defaultdict(list)
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                rec = json.loads(line)
+                # llm spans are named after the model, group them per calling agent instead
+                label = rec["agent"] if rec["kind"] == "llm" else rec["name"]
+                groups[f"{rec['kind']} {label}"].append(rec)
+
+    summary = {}
+    for name, recs in sorted(groups.items()):
+        durations = np.array([r["duration_ms"] for r in recs])
+        summary[name] = {
+            "count": len(recs),
+            "errors": sum(r["status"] != "ok" for r in recs),
+            "p50_ms": round(float(np.percentile(durations, 50)), 2),
+            "p95_ms": round(float(np.percentile(durations, 95)), 2),
+            "p99_ms": round(float(np.percentile(durations, 99)), 2),
+            "input_tokens": sum(r.get("input_tokens") or 0 for r in recs),
+            "output_tokens": sum(r.get("output_tokens") or 0 for r in recs),
+        }
+    return summary
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("usage: python -m src.tracing <trace.jsonl>")
+        sys.exit(2)
+    print(f"{'span':<44}{'count':>7}{'err':>5}{'p50':>10}{'p95':>10}{'p99':>10}{'tok in':>10}{'tok out':>9}")
+    for name, s in summarize(sys.argv[1]).items():
+        print(f"{name:<44}{s['count']:>7}{s['errors']:>5}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}"
+              f"{s['input_tokens']:>10}{s['output_tokens']:>9}")
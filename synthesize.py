@@ -1,11 +1,16 @@
 from google.adk.agents import LlmAgent
-from google.adk.models.google_llm import Gemini
 from google.adk.apps.app import App, ResumabilityConfig
 
 from src.tools.code_exec_tool import execute_tool
+from src.tools.dsp_pool import get_dsp_pool
+from src.tools.render_jobs import submit_render
+from src.llm_backend import make_model
+from src.tracing import app_plugins, get_tracer
 
 import json
-from typing import Dict, Any
+import os
+from functools import lru_cache
+from typing import Dict, Any, Optional
 
 
 
@@ -33,106 +38,229 @@ from typing import Dict, Any
 #     resp = execute_tool(func, args, file_path, out_path)
 #     return resp
 
-def handle_llm_tool_call(
-    llm_json: Any, 
-    file_path: str, 
-    out_path: str
-) -> Dict[str, Any]:
+def _parse_tool_call(llm_json: Any, file_path: str, out_path: str):
     """
-    Accepts either:
-    - a dict representing the LLM tool call
-    - a JSON string containing the tool call
-
-    file_path  -> absolute/relative path of uploaded input audio
-    out_path   -> desired output synthesized file path
+    Validation half of handle_llm_tool_call.
 
-    Injects these into args, overrides the LLM output path, 
-    and calls execute_tool to run apply_patch.
+    return:
+        (function name, args with the forced paths), or (None, error dict)
     """
 
     # 1. Parse safely if llm_json is a string
     if isinstance(llm_json, str):
         llm_json = llm_json.strip()
         if not llm_json:
-            return {"ok": False, "error": "Empty LLM response string"}
+            return None, {"ok": False, "error": "Empty LLM response string"}
         try:
             call = json.loads(llm_json)
         except Exception as e:
-            return {"ok": False, "error": f"Failed to parse LLM JSON string: {e}"}
+            return None, {"ok": False, "error": f"Failed to parse LLM JSON string: {e}"}
     # 2. Accept dict directly
     elif isinstance(llm_json, dict):
         call = llm_json
     else:
-        return {"ok": False, "error": f"Unexpected LLM response type: {type(llm_json)}"}
+        return None, {"ok": False, "error": f"Unexpected LLM response type: {type(llm_json)}"}
 
     # 3. Validate tool
     if call.get("tool") != "synthesis_tool":
-        return {"ok": False, "error": f"Unsupported tool: {call.get('tool')}"}
+        return None, {"ok": False, "error": f"Unsupported tool: {call.get('tool')}"}
 
     func = call.get("function")
     if not func:
-        return {"ok": False, "error": "Missing 'function' field in LLM output"}
+        return None, {"ok": False, "error": "Missing 'function' field in LLM output"}
 
     # 4. Extract args
     args = call.get("args", {})
     if not isinstance(args, dict):
-        return {"ok": False, "error": "'args' must be a dict"}
+        return None, {"ok": False, "error": "'args' must be a dict"}
 
     # 5. Override paths (so agent cannot write anywhere else)
     args["input_audio_path"] = file_path
     args["out_path"] = out_path  # forced override for safety
+    return func, args
+
+
+def _index_render(out_path: str) -> None:
+    """analyzes a render into the similarity index, costs one extra analysis per render"""
+    try:
+        from src.tools.feature_extractor import analyze_file
+        analyze_file(out_path, kind="rendered")
+    except Exception as e:
+        print(f"[synthesize] : could not index the render ({e})")
+
+
+def handle_llm_tool_call(
+    llm_json: Any, 
+    file_path: str, 
+    out_path: str
+) -> Dict[str, Any]:
+    """
+    Accepts either:
+    - a dict representing the LLM tool call
+    - a JSON string containing the tool call
+
+    file_path  -> absolute/relative path of uploaded input audio
+    out_path   -> desired output synthesized file path
+
+    Injects these into args, overrides the LLM output path, 
+    and calls execute_tool to run apply_patch.
+    Blocks for the whole render, async callers use handle_llm_tool_call_async.
+    """
+    func, args = _parse_tool_call(llm_json, file_path, out_path)
+    if func is None:
+        return args
 
     # 6. Call your tool executor
     try:
-        resp = execute_tool(func, args, file_path, out_path)
-        return resp
+        with get_tracer().span(func, kind="tool", mix_ratio=args.get("mix_ratio")):
+            resp = execute_tool(func, args, file_path, out_path)
     except Exception as e:
         return {"ok": False, "error": f"execute_tool raised: {e}"}
 
+    # 7. Optionally analyze the render into the similarity index
+    if resp.get("ok") and os.getenv("SOUNDSPARK_INDEX_RENDERS", "0") == "1":
+        _index_render(out_path)
+    return resp
 
 
+async def handle_llm_tool_call_async(
+    llm_json: Any,
+    file_path: str,
+    out_path: str
+) -> Dict[str, Any]:
+    """
+    handle_llm_tool_call with the render (and render indexing) run on the dsp pool,
+    so the event loop keeps serving other sessions meanwhile.
+    """
+    func, args = _parse_tool_call(llm_json, file_path, out_path)
+    if func is None:
+        return args
+    return await _run_tool_async(func, args, file_path, out_path)
+
+
+async def _run_tool_async(func: str, args: Dict[str, Any], file_path: str, out_path: str,
+                          priority: int = 0) -> Dict[str, Any]:
+    pool = get_dsp_pool()
+    try:
+        with get_tracer().span(func, kind="tool", mix_ratio=args.get("mix_ratio")):
+            resp = await pool.run(execute_tool, func, args, file_path, out_path,
+                                  affinity=os.path.abspath(file_path), priority=priority)
+    except Exception as e:
+        return {"ok": False, "error": f"execute_tool raised: {e}"}
 
-synth_agent = LlmAgent(
-    model=Gemini(model="gemini-2.5-flash-lite"),
-    name="synth_agent",
-    instruction="""You are a sound creative synthesizer agent
-    - You take user prompt and the audio sample via audio_path
-    - if user has any intent for the sound try to choose fx process for that, otherwise you are free to create your own fx chain
-    - example: {
-                "tool": "synthesis_tool",
-                "function": "apply_patch",
-                "args": {
-                    "input_audio_path": "relative path",
-                    "out_path": "relative path",
-                    "sr": 22050,
-                    "mix_ratio": 0.75,
-                    "params": { ... }        // structured parameters (MUST)
+    if func == "apply_patch" and resp.get("ok") and os.getenv("SOUNDSPARK_INDEX_RENDERS", "0") == "1":
+        try:
+            await pool.run(_index_render, out_path, affinity=os.path.abspath(out_path))
+        except Exception as e:
+            print(f"[synthesize] : could not index the render ({e})")
+    return resp
+
+
+# previews jump the dsp pool queue ahead of full renders
+PREVIEW_PRIORITY = 10
+
+
+def preview_path_for(out_path: str) -> str:
+    """tests/synthesis_demo/x_layered.mp3 -> tests/synthesis_demo/x_layered_preview.wav"""
+    return f"{os.path.splitext(out_path)[0]}_preview.wav"
+
+
+async def handle_llm_tool_call_preview(
+    llm_json: Any,
+    file_path: str,
+    out_path: str
+) -> Dict[str, Any]:
+    """
+    Time to first audio version of handle_llm_tool_call_async: renders a short excerpt
+    (synthesis_demo.render_preview, ahead of other dsp pool work) and returns as soon as
+    it is written. The full render to `out_path` is queued in the background
+    (src/tools/render_jobs.py), its id comes back as the status handle.
+
+    return:
+        {"ok", "preview": render_preview result, "job": render job id, "status", "path": out_path}
+    """
+    func, args = _parse_tool_call(llm_json, file_path, out_path)
+    if func is None:
+        return args
+
+    preview_path = preview_path_for(out_path)
+    preview = await _run_tool_async("render_preview", dict(args, out_path=preview_path), file_path, preview_path,
+                                    priority=PREVIEW_PRIORITY)
+    # the full render goes on whatever happened to the preview
+    job = submit_render(lambda: _run_tool_async(func, args, file_path, out_path), out_path)
+    return {"ok": True, "preview": preview, "job": job.id, "status": job.status, "path": out_path}
+
+
+
+
+def make_synth_agent(output_key: Optional[str] = None) -> LlmAgent:
+    """
+    Builds the synth parameter agent. In the DAG orchestrator it runs inside the analysis
+    pipeline, next to the classifier branch, and stores its tool call JSON under `output_key`.
+    """
+    return LlmAgent(
+        model=make_model(),
+        name="synth_agent",
+        instruction="""You are a sound creative synthesizer agent
+        - You take user prompt and the audio sample via audio_path
+        - audio descriptors of the sample, when already analyzed: {descriptors?}
+        - if user has any intent for the sound try to choose fx process for that, otherwise you are free to create your own fx chain
+        - example: {
+                    "tool": "synthesis_tool",
+                    "function": "apply_patch",
+                    "args": {
+                        "input_audio_path": "relative path",
+                        "out_path": "relative path",
+                        "mix_ratio": 0.75,
+                        "params": { ... }        // structured parameters (MUST)
+                        }
                     }
-                }
-    - Rules & constraints:
-        1. Types: Use proper JSON types — numbers should be numbers (not strings), booleans true/false, arrays for lists, objects for maps.
-        2. If you include an instruction string, it will be parsed; **prefer** returning the structured `params` object (more reliable).
-        3. Allowed `params` keys (optional; include only those required): 
-            - "sub_sine": {"enabled": bool, "freq_hz": number, "amp": number (0-1), "lowpass_cutoff": number (hz) }
-            - "noise": {"enabled": bool, "amp": number}
-            - "distortion": {"enabled": bool, "drive": number}
-            - "delay": {"enabled": bool, "ms": integer, "feedback": number (0-1)}
-            - "global_lowpass": number (hz)
-            - "global_highpass": number (hz)
-        4. `mix_ratio` (0-1): proportion of original audio in final mix. Use values like 0.6, 0.75.
-        5. Keep numeric values realistic (Hz frequencies typically 20-20000, delay ms 10-600, amp 0-1, drive 0.5-3).
-        6. If uncertain about exact numbers, pick conservative defaults that produce musical results (e.g., sub_sine amp 0.4-0.6, lowpass 120Hz).
-        7. If you cannot find a clear param mapping, include a conservative default `params` object with `sub_sine.enabled = true` and sensible defaults.
-        8. **Do not** request arbitrary code execution or unvalidated paths.
-        9. Output must parse as JSON with no extra characters.
-    """,
-)
-
-synth_app = App(
-    name="synth_app",
-    root_agent=synth_agent,
-    resumability_config=ResumabilityConfig(is_resumable=True),
-)
+        - Rules & constraints:
+            1. Types: Use proper JSON types — numbers should be numbers (not strings), booleans true/false, arrays for lists, objects for maps.
+            2. If you include an instruction string, it will be parsed; **prefer** returning the structured `params` object (more reliable).
+            3. Allowed `params` keys (optional; include only those required): 
+                - "sub_sine": {"enabled": bool, "freq_hz": number, "amp": number (0-1), "lowpass_cutoff": number (hz) }
+                - "noise": {"enabled": bool, "amp": number}
+                - "distortion": {"enabled": bool, "drive": number}
+                - "delay": {"enabled": bool, "ms": integer, "feedback": number (0-1), "mode": "mono"|"stereo"|"ping_pong", "tail_ms": integer}
+                - "stereo_width": {"enabled": bool, "width": number (0-2, 1 keeps the source image), "haas_ms": number (0-40)}
+                - "global_lowpass": number (hz)
+                - "global_highpass": number (hz)
+                - "fx_order": list of the stage names above, processing order (default: sub_sine, noise, distortion, global_lowpass, global_highpass, delay, stereo_width)
+            4. `mix_ratio` (0-1): proportion of original audio in final mix. Use values like 0.6, 0.75.
+               Leave out `sr` so the render keeps the source's sample rate, only set it when the user asks for a specific rate.
+            5. Keep numeric values realistic (Hz frequencies typically 20-20000, delay ms 10-600, amp 0-1, drive 0.5-3).
+            6. If uncertain about exact numbers, pick conservative defaults that produce musical results (e.g., sub_sine amp 0.4-0.6, lowpass 120Hz).
+            7. If you cannot find a clear param mapping, include a conservative default `params` object with `sub_sine.enabled = true` and sensible defaults.
+            8. **Do not** request arbitrary code execution or unvalidated paths.
+            9. Output must parse as JSON with no extra characters.
+        """,
+        output_key=output_key,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_synth_agent() -> LlmAgent:
+    return make_synth_agent()
+
+
+@lru_cache(maxsize=None)
+def get_synth_app() -> App:
+    return App(
+        name="synth_app",
+        root_agent=get_synth_agent(),
+        resumability_config=ResumabilityConfig(is_resumable=True),
+        plugins=app_plugins(),
+    )
+
+
+def __getattr__(name):
+    # synth_agent / synth_app are built on first access instead of at import
+    if name == "synth_agent":
+        return get_synth_agent()
+    if name == "synth_app":
+        return get_synth_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # async def runit():
     
@@ -0,0 +1,18 @@
+import os
+
+
+def cache_dir() -> str:
+    """
+    Directory the persistent caches (descriptor cache, response cache, vector index) live in
+    by default, outside the working tree so runs from a checkout leave nothing behind.
+
+    env:
+        SOUNDSPARK_CACHE_DIR: the directory, defaults to $XDG_CACHE_HOME/soundspark (~/.cache/soundspark)
+    """
+    base = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.getenv("SOUNDSPARK_CACHE_DIR") or os.path.join(base, "soundspark")
+
+
+def cache_path(name: str) -> str:
+    """`name` inside cache_dir(), the directory is created by whoever opens the file"""
+    return os.path.join(cache_dir(), name)
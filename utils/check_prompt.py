@@ -10,3 +10,23 @@ def has_audio_path(prompt: str) -> bool:
     """
     return any(prompt.lower().endswith(ext) for ext in [".wav", ".mp3", ".flac", ".ogg", ".aiff"]) \
         or "/audio/" in prompt.lower() or "\\audio\\" in prompt.lower()
+
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".flac", ".ogg", ".aiff")
+
+
+def extract_audio_path(prompt: str):
+    """
+    Pulls the first audio file path out of the user prompt
+
+    args:
+        prompt : string = user message
+
+    return:
+        the path as written in the prompt, or None if there is none
+    """
+    for token in prompt.split():
+        token = token.strip("'\"`,;()[]<>")
+        if token.lower().endswith(AUDIO_EXTENSIONS):
+            return token
+    return None
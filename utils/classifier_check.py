@@ -0,0 +1,72 @@
+"""
+Local classifier sanity check.
+
+- every texture prototype, turned back into descriptors, classifies as its own texture
+- sounds far from every prototype (out of distribution) score below
+  DEFAULT_CONFIDENCE_THRESHOLD, so "auto" mode hands them to the LLM classifier
+- LocalClassifierAgent reads SOUNDSPARK_CLASSIFIER_MODE / _CONFIDENCE when it is built,
+  and explicit settings win over them
+
+usage:
+    python -m utils.classifier_check          # exit 1 when a check fails
+"""
+import os
+import sys
+from typing import Dict, List, Tuple
+
+from src.agents.classifier_agent import (
+    _PROTOTYPES,
+    DEFAULT_CONFIDENCE_THRESHOLD,
+    TEXTURES,
+    LocalClassifierAgent,
+    classify_batch,
+)
+
+# far outside every prototype: a hissy 11 kHz sound, a near silent 60 Hz rumble
+OUT_OF_DISTRIBUTION = {
+    "hiss": {"spectral_centroid": 11000.0, "spectral_bandwidth": 3000.0, "zero_crossing_rate": 0.6, "rms": 0.1,
+             "harmonic_energy": 0.05, "percussive_energy": 0.02},
+    "rumble": {"spectral_centroid": 60.0, "spectral_bandwidth": 80.0, "zero_crossing_rate": 0.002, "rms": 5e-4,
+               "harmonic_energy": 0.05, "percussive_energy": 0.01},
+}
+
+
+def prototype_descriptors(row) -> Dict[str, float]:
+    log2_sc, log2_bw, zcr, perc, rms_db = row
+    return {"spectral_centroid": 2 ** log2_sc, "spectral_bandwidth": 2 ** log2_bw, "zero_crossing_rate": zcr,
+            "rms": 10 ** (rms_db / 20.0), "harmonic_energy": 1.0 - perc, "percussive_energy": perc}
+
+
+def checks() -> List[Tuple[str, bool, str]]:
+    rows = []
+    for texture, result in zip(TEXTURES, classify_batch([prototype_descriptors(p) for p in _PROTOTYPES])):
+        rows.append((f"prototype {texture}", result["texture"] == texture,
+                     f"-> {result['texture']} ({result['confidence']})"))
+    for name, result in zip(OUT_OF_DISTRIBUTION, classify_batch(list(OUT_OF_DISTRIBUTION.values()))):
+        rows.append((f"out of distribution {name}", result["confidence"] < DEFAULT_CONFIDENCE_THRESHOLD,
+                     f"confidence {result['confidence']} (threshold {DEFAULT_CONFIDENCE_THRESHOLD})"))
+
+    os.environ["SOUNDSPARK_CLASSIFIER_MODE"], os.environ["SOUNDSPARK_CLASSIFIER_CONFIDENCE"] = "local", "0.3"
+    try:
+        from_env = LocalClassifierAgent(name="from_env")
+        explicit = LocalClassifierAgent(name="explicit", mode="llm", confidence_threshold=0.8)
+    finally:
+        del os.environ["SOUNDSPARK_CLASSIFIER_MODE"], os.environ["SOUNDSPARK_CLASSIFIER_CONFIDENCE"]
+    rows.append(("env read at construction", (from_env.mode, from_env.confidence_threshold) == ("local", 0.3),
+                 f"{from_env.mode} / {from_env.confidence_threshold}"))
+    rows.append(("explicit settings", (explicit.mode, explicit.confidence_threshold) == ("llm", 0.8),
+                 f"{explicit.mode} / {explicit.confidence_threshold}"))
+    return rows
+
+
+def main():
+    failed = False
+    for name, ok, detail in checks():
+        failed |= not ok
+        print(f"  {'ok ' if ok else 'BAD'} {name:<32} {detail}")
+    print(f"\n[classifier_check]: {'failed' if failed else 'all checks passed'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
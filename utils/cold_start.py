@@ -0,0 +1,134 @@
+"""
+Cold-start profile of the app, built on `python -X importtime`.
+
+Imports a module (default: app) in fresh interpreters, parses the importtime log and
+checks the result against the budget in utils/cold_start_budget.json:
+  - total_ms: median wall time of the import
+  - forbidden: modules that must not be loaded at startup (the heavy DSP / agent stack)
+  - modules_ms: optional per-module cumulative import time ceilings
+
+usage:
+    python -m utils.cold_start                  # report + budget check, exit 1 when over budget
+    python -m utils.cold_start --runs 7 --top 25
+    python -m utils.cold_start --module src.orchestrator --no-budget
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_PATH = os.path.join(ROOT, "utils", "cold_start_budget.json")
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """
+    args:
+        stderr: interpreter stderr with -X importtime lines
+    return:
+        list of (module, self_us, cumulative_us, depth)
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cum_us, name = line[len("import time:"):].split("|")
+        except ValueError:
+            continue
+        # nesting is encoded as two extra spaces per level after the single separator space
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cum_us), depth))
+    return rows
+
+
+def profile_once(module: str) -> Dict:
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="0")
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000.0
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = parse_importtime(proc.stderr)
+    return {"wall_ms": wall_ms, "rows": rows}
+
+
+def profile(module: str = "app", runs: int = 5) -> Dict:
+    """
+    Median over `runs` fresh interpreters (the first run also warms the .pyc cache and is dropped).
+
+    return:
+        {"module", "wall_ms", "import_ms", "loaded": [...], "modules_ms": {name: cumulative ms}}
+    """
+    profile_once(module)
+    results = [profile_once(module) for _ in range(runs)]
+    cumulative: Dict[str, List[float]] = {}
+    for r in results:
+        for name, _, cum_us, _ in r["rows"]:
+            cumulative.setdefault(name, []).append(cum_us / 1000.0)
+    modules_ms = {name: statistics.median(v) for name, v in cumulative.items()}
+    return {
+        "module": module,
+        "wall_ms": statistics.median(r["wall_ms"] for r in results),
+        "import_ms": modules_ms.get(module, 0.0),
+        "loaded": sorted(modules_ms),
+        "modules_ms": modules_ms,
+    }
+
+
+def check_budget(report: Dict, budget: Dict) -> List[str]:
+    """return a list of human readable budget violations, empty when within budget"""
+    problems = []
+    if "total_ms" in budget and report["import_ms"] > budget["total_ms"]:
+        problems.append(f"import {report['module']} took {report['import_ms']:.0f} ms > budget {budget['total_ms']} ms")
+    for name in budget.get("forbidden", []):
+        if name in report["modules_ms"]:
+            problems.append(f"{name} is imported at startup ({report['modules_ms'][name]:.0f} ms)")
+    for name, limit in budget.get("modules_ms", {}).items():
+        took = report["modules_ms"].get(name)
+        if took is not None and took > limit:
+            problems.append(f"{name} took {took:.0f} ms > budget {limit} ms")
+    return problems
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="cold-start import profile with a tracked budget")
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget", default=BUDGET_PATH)
+    parser.add_argument("--no-budget", action="store_true")
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    args = parser.parse_args(argv)
+
+    report = profile(args.module, runs=args.runs)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"[cold_start]: import {report['module']}: {report['import_ms']:.1f} ms "
+              f"(interpreter wall {report['wall_ms']:.1f} ms, median of {args.runs})")
+        top = sorted(report["modules_ms"].items(), key=lambda kv: kv[1], reverse=True)[: args.top]
+        for name, ms in top:
+            print(f"  {ms:9.1f} ms  {name}")
+
+    if args.no_budget:
+        return 0
+    with open(args.budget) as f:
+        budget = json.load(f).get(args.module, {})
+    problems = check_budget(report, budget)
+    for p in problems:
+        print(f"[cold_start]: OVER BUDGET - {p}")
+    if not problems:
+        print("[cold_start]: within budget")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+import importlib
+from types import ModuleType
+
+
+class _LazyModule(ModuleType):
+    """Module stand-in that only imports the real module on first attribute access"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Deferred `import name`.
+
+    librosa, scipy.signal and soundfile take seconds to import; modules that only need
+    them once audio actually gets processed bind them through this, so importing the
+    app (or a chat-only request) never pays for them.
+
+    args:
+        name: dotted module name, e.g. "scipy.signal"
+    return:
+        proxy module, attribute access triggers the real import once
+    """
+    return _LazyModule(name)
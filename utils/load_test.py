@@ -0,0 +1,349 @@
+"""
+Concurrent multi-session load harness for the agent pipelines.
+
+Replays prompts from a JSONL file as N concurrent sessions against the offline stub
+model (src/llm_backend.py, SOUNDSPARK_LLM_BACKEND=stub) and a local stub MCP server
+(utils/stub_mcp_server.py), so nothing reaches Gemini or freesound. Reports per stage
+p50/p95/p99 latency, throughput and error rate.
+
+Each JSONL line is an object with the prompt under "prompt", "text" or "body" (plus an
+optional "title"), so the backlog file requests.jsonl works as is.
+
+Stage latency is taken from the event stream: a stage runs from the event before its
+first event to its last event. Stages of one parallel DAG step overlap, so their
+numbers add up to more than the session time.
+
+usage:
+    python -m utils.load_test --prompts requests.jsonl --sessions 16 --total 200
+    python -m utils.load_test --app dag --llm-latency lognormal:300,0.4 --json report.json
+    python -m utils.load_test --app chat --sessions 64
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+import traceback
+import uuid
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+import numpy as np
+
+APPS = ("auto", "orchestrator", "dag", "chat", "synth")
+# sleep of the event loop lag probe, see run_load
+LAG_PROBE_S = 0.01
+
+
+def load_prompts(path: str) -> List[str]:
+    prompts = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            text = row.get("prompt") or row.get("text") or row.get("body") or ""
+            if row.get("title") and not row.get("prompt"):
+                text = f"{row['title']}. {text}"
+            if text:
+                prompts.append(text)
+    if not prompts:
+        raise ValueError(f"no prompts found in {path}")
+    return prompts
+
+
+def make_test_audio(path: str, seconds: float = 5.0, sr: int = 22050) -> str:
+    """short pluck-ish test signal (decaying tone + noise), so audio prompts have something to analyze"""
+    import soundfile as sf
+
+    t = np.arange(int(seconds * sr)) / sr
+    env = np.exp(-3.0 * (t % 0.5))
+    y = 0.5 * env * np.sin(2 * np.pi * 220.0 * t) + 0.02 * np.random.default_rng(0).standard_normal(len(t))
+    sf.write(path, y.astype(np.float32), sr)
+    return path
+
+
+class Harness:
+    """
+    Builds the apps once, then runs single sessions and records their timings.
+
+    args:
+        app_mode: one of APPS, "auto" routes like app.run_workflow (audio path -> pipeline, else chat)
+        audio_path: audio attached to prompts that need one and have none
+        render: also run the synthesis render after the synth agent, like app.run_workflow
+        out_dir: where rendered files go
+        preview: render in preview mode, "preview" is the time to first audio and "render"
+                 the time until the background full render is done
+    """
+
+    def __init__(self, app_mode: str, audio_path: str, render: bool, out_dir: str, preview: bool = False):
+        from google.adk.runners import Runner
+        from google.adk.sessions import InMemorySessionService
+
+        from src.orchestrator import get_chat_app, get_orchestrator_app, get_orchestrator_dag_app
+        from synthesize import get_synth_app
+
+        self.app_mode = app_mode
+        self.audio_path = audio_path
+        self.render = render
+        self.out_dir = out_dir
+        self.preview = preview
+
+        # in memory sessions, the harness measures the pipelines and not SQLite
+        sessions = InMemorySessionService()
+        self.runners = {
+            "chat": Runner(app=get_chat_app(), session_service=sessions),
+            "orchestrator": Runner(app=get_orchestrator_app(), session_service=sessions),
+            "dag": Runner(app=get_orchestrator_dag_app(), session_service=sessions),
+            "synth": Runner(app=get_synth_app(), session_service=sessions),
+        }
+
+    async def close(self):
+        # releases the MCP sessions on this loop instead of leaving them to interpreter shutdown
+        for runner in self.runners.values():
+            await runner.close()
+
+    def _route(self, prompt: str):
+        from utils.check_prompt import has_audio_path, extract_audio_path
+
+        mode = self.app_mode
+        if mode == "auto":
+            mode = "orchestrator" if has_audio_path(prompt) else "chat"
+        if mode != "chat" and not extract_audio_path(prompt):
+            prompt = f"{prompt} {self.audio_path}"
+        return mode, prompt
+
+    async def _run_app(self, name: str, prompt: str, session_id: str, stages: Dict[str, float]):
+        """runs one app for one prompt, adds per author spans to `stages`, returns (final session state, reply text)"""
+        from google.genai import types
+
+        runner = self.runners[name]
+        await runner.session_service.create_session(app_name=runner.app_name, user_id="load", session_id=session_id)
+        message = types.Content(role="user", parts=[types.Part(text=prompt)])
+
+        t0 = time.perf_counter()
+        prev = t0
+        first: Dict[str, float] = {}
+        last: Dict[str, float] = {}
+        text = ""
+        async for event in runner.run_async(user_id="load", session_id=session_id, new_message=message):
+            now = time.perf_counter()
+            if event.error_code:
+                raise RuntimeError(f"{event.author}: {event.error_code} {event.error_message}")
+            if event.author not in first:
+                first[event.author] = prev
+            last[event.author] = now
+            prev = now
+            if event.content and event.content.parts and event.content.parts[0].text:
+                text += event.content.parts[0].text
+
+        for author, start in first.items():
+            stages[author] = stages.get(author, 0.0) + (last[author] - start) * 1000.0
+        stages[f"app:{name}"] = (time.perf_counter() - t0) * 1000.0
+
+        session = await runner.session_service.get_session(app_name=runner.app_name, user_id="load", session_id=session_id)
+        return (session.state if session else {}), text
+
+    async def _render(self, synth_json, stages: Dict[str, float]):
+        from src.tools.render_jobs import get_render_job
+        from synthesize import handle_llm_tool_call_async, handle_llm_tool_call_preview
+        from utils.jsonfy import give_json
+
+        t0 = time.perf_counter()
+        out_path = os.path.join(self.out_dir, f"{uuid.uuid4().hex}.wav")
+        if self.preview:
+            result = await handle_llm_tool_call_preview(give_json(synth_json or ""), self.audio_path, out_path)
+            stages["preview"] = (time.perf_counter() - t0) * 1000.0
+            if not result.get("ok") or not result["preview"].get("ok"):
+                raise RuntimeError(f"preview: {result.get('error') or result['preview'].get('error')}")
+            result = await get_render_job(result["job"]).wait()
+            result["ok"] = result["status"] == "done"
+        else:
+            result = await handle_llm_tool_call_async(give_json(synth_json or ""), self.audio_path, out_path)
+        stages["render"] = (time.perf_counter() - t0) * 1000.0
+        if not result.get("ok"):
+            raise RuntimeError(f"render: {result.get('error')}")
+
+    async def run_one(self, prompt: str) -> dict:
+        mode, prompt = self._route(prompt)
+        session_id = uuid.uuid4().hex
+        stages: Dict[str, float] = {}
+        record = {"app": mode, "ok": True, "error": None, "stages": stages}
+
+        t0 = time.perf_counter()
+        try:
+            if mode == "dag":
+                state, _ = await self._run_app("dag", prompt, session_id, stages)
+                if self.render:
+                    await self._render(state.get("synth_call"), stages)
+            elif mode == "orchestrator":
+                await self._run_app("orchestrator", prompt, session_id, stages)
+                _, reply = await self._run_app("synth", prompt, session_id, stages)
+                if self.render:
+                    await self._render(reply, stages)
+            elif mode == "synth":
+                _, reply = await self._run_app("synth", prompt, session_id, stages)
+                if self.render:
+                    await self._render(reply, stages)
+            else:
+                await self._run_app("chat", prompt, session_id, stages)
+        except Exception as e:
+            record["ok"] = False
+            record["error"] = f"{type(e).__name__}: {e}".splitlines()[0][:200]
+            if os.getenv("SOUNDSPARK_LOAD_TRACEBACK"):
+                traceback.print_exc()
+        record["total_ms"] = (time.perf_counter() - t0) * 1000.0
+        return record
+
+
+async def run_load(harness: Harness, prompts: List[str], sessions: int, total: int, warmup: int = 1) -> dict:
+    """
+    runs `total` sessions, at most `sessions` at a time, cycling through `prompts`.
+    `warmup` sessions run first, one at a time and unrecorded, so lazy imports and
+    numba compilation don't land in the percentiles. The dsp pool workers are warmed
+    up too when there are warmup sessions.
+
+    Also samples event loop lag: how late a 10 ms sleep wakes up while the load runs,
+    which is what blocking work on the loop costs every other session.
+    """
+    if warmup > 0:
+        from src.tools.dsp_pool import get_dsp_pool
+        await asyncio.to_thread(get_dsp_pool().warm)
+    for i in range(warmup):
+        await harness.run_one(prompts[i % len(prompts)])
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(prompts[i % len(prompts)])
+    records = []
+
+    async def worker():
+        while True:
+            try:
+                prompt = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            records.append(await harness.run_one(prompt))
+
+    lags = []
+    done = asyncio.Event()
+
+    async def lag_probe():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(LAG_PROBE_S)
+            lags.append((time.perf_counter() - start - LAG_PROBE_S) * 1000.0)
+
+    probe = asyncio.create_task(lag_probe())
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(sessions)))
+    wall = time.perf_counter() - t0
+    done.set()
+    await probe
+    await harness.close()
+    report = summarize(records, wall, sessions)
+    if lags:
+        report["loop_lag"] = _percentiles(lags)
+    return report
+
+
+def _percentiles(values: List[float]) -> dict:
+    arr = np.asarray(values)
+    return {
+        "count": len(values),
+        "p50_ms": round(float(np.percentile(arr, 50)), 2),
+        "p95_ms": round(float(np.percentile(arr, 95)), 2),
+        "p99_ms": round(float(np.percentile(arr, 99)), 2),
+        "max_ms": round(float(arr.max()), 2),
+        "mean_ms": round(statistics.fmean(values), 2),
+    }
+
+
+def summarize(records: List[dict], wall_s: float, sessions: int) -> dict:
+    stage_times = defaultdict(list)
+    for r in records:
+        if r["ok"]:
+            stage_times["session"].append(r["total_ms"])
+            for name, ms in r["stages"].items():
+                stage_times[name].append(ms)
+
+    errors = [r for r in records if not r["ok"]]
+    return {
+        "sessions": sessions,
+        "total": len(records),
+        "wall_s": round(wall_s, 3),
+        "throughput_per_s": round(len(records) / wall_s, 3) if wall_s > 0 else None,
+        "error_rate": round(len(errors) / len(records), 4) if records else 0.0,
+        "errors": dict(Counter(r["error"] for r in errors).most_common(10)),
+        "apps": dict(Counter(r["app"] for r in records)),
+        "stages": {name: _percentiles(v) for name, v in sorted(stage_times.items())},
+    }
+
+
+def print_report(report: dict):
+    print(f"\nsessions={report['sessions']}  total={report['total']}  wall={report['wall_s']}s  "
+          f"throughput={report['throughput_per_s']}/s  error_rate={report['error_rate']:.2%}")
+    print(f"apps: {report['apps']}")
+    print(f"\n{'stage':<28}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for name, s in report["stages"].items():
+        print(f"{name:<28}{s['count']:>7}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}")
+    if report.get("loop_lag"):
+        lag = report["loop_lag"]
+        print(f"{'event loop lag':<28}{lag['count']:>7}{lag['p50_ms']:>10.1f}{lag['p95_ms']:>10.1f}{lag['p99_ms']:>10.1f}{lag['max_ms']:>10.1f}")
+    if report["errors"]:
+        print("\nerrors:")
+        for msg, n in report["errors"].items():
+            print(f"  {n:>5}  {msg}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent load test of the SoundSpark pipelines on stub backends")
+    parser.add_argument("--prompts", default="requests.jsonl", help="JSONL prompt file")
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent sessions")
+    parser.add_argument("--total", type=int, default=None, help="sessions to run in total (default: one per prompt)")
+    parser.add_argument("--app", choices=APPS, default="auto")
+    parser.add_argument("--warmup", type=int, default=1, help="unrecorded sessions run before the measurement")
+    parser.add_argument("--audio", default=None, help="audio attached to pipeline prompts (default: generated test tone)")
+    parser.add_argument("--llm-latency", default="0", help="stub model latency spec, e.g. 300 or 'lognormal:300,0.4;classifier_agent=fixed:50'")
+    parser.add_argument("--seed", type=int, default=0, help="stub model seed")
+    parser.add_argument("--mcp-latency-ms", type=float, default=0.0, help="stub MCP delay per tool call")
+    parser.add_argument("--no-render", action="store_true", help="skip the synthesis render step")
+    parser.add_argument("--preview", action="store_true", help="preview render first, full render in the background")
+    parser.add_argument("--trace", default=None, help="write per span traces (src/tracing.py) to this JSON lines file")
+    parser.add_argument("--json", default=None, help="also write the report to this path")
+    args = parser.parse_args(argv)
+
+    # per request INFO logs of the MCP client / server would drown the report
+    for name in ("httpx", "mcp"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    # stub backends have to be in place before any agent module is imported
+    os.environ["SOUNDSPARK_LLM_BACKEND"] = "stub"
+    os.environ["SOUNDSPARK_STUB_LATENCY"] = args.llm_latency
+    os.environ["SOUNDSPARK_STUB_SEED"] = str(args.seed)
+    if args.trace:
+        os.environ["SOUNDSPARK_TRACE_FILE"] = args.trace
+    from utils.stub_mcp_server import start_stub_mcp_server
+    os.environ["MCP_SERVER_URI"] = start_stub_mcp_server(latency_ms=args.mcp_latency_ms)
+
+    prompts = load_prompts(args.prompts)
+    work_dir = tempfile.mkdtemp(prefix="soundspark_load_")
+    audio_path = args.audio or make_test_audio(os.path.join(work_dir, "load_test_tone.wav"))
+
+    harness = Harness(args.app, audio_path, render=not args.no_render, out_dir=work_dir, preview=args.preview)
+    report = asyncio.run(run_load(harness, prompts, args.sessions, args.total or len(prompts), args.warmup))
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n[load_test] : report written to {args.json}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
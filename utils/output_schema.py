@@ -57,7 +57,7 @@ class RecommenderOutput(BaseModel):
 
 # ========================================== Synthesis Schema ============================================
 # utils/synthesis_schema.py
-from pydantic import model_validator
+from pydantic import field_validator, model_validator
 from typing import Optional
 
 # Small helper types
@@ -105,31 +105,57 @@ class DelayParams(BaseModel):
     enabled: bool = Field(..., description="Enable delay")
     ms: Annotated[int, Field(ge=10, le=600, description="Delay time in ms")]
     feedback: Annotated[float, Field(ge=0.0, le=1.0, description="Delay feedback 0-1")]
+    mode: Literal["mono", "stereo", "ping_pong"] = Field("mono", description="Mono comb, stereo (offset right channel) or ping-pong")
+    tail_ms: Annotated[int, Field(ge=0, le=10000, description="Extra silence rendered after the source so echoes ring out")] = 0
 
     class Config:
         extra = "forbid"
 
 
+class StereoWidthParams(BaseModel):
+    enabled: bool = Field(..., description="Enable stereo widening")
+    width: Annotated[float, Field(ge=0.0, le=2.0, description="Side gain: 0 mono, 1 unchanged, 2 twice as wide")] = 1.0
+    haas_ms: Annotated[float, Field(ge=0.0, le=40.0, description="Right channel delay in ms for a Haas widening, 0 disables")] = 0.0
+
+    class Config:
+        extra = "forbid"
+
+
+FxStage = Literal["sub_sine", "noise", "distortion", "global_lowpass", "global_highpass", "delay", "stereo_width"]
+
+
 class Params(BaseModel):
     sub_sine: Optional[SubSineParams] = Field(None, description="Sub sine parameters")
     noise: Optional[NoiseParams] = Field(None, description="Noise parameters")
     distortion: Optional[DistortionParams] = Field(None, description="Distortion params")
     delay: Optional[DelayParams] = Field(None, description="Delay params")
+    stereo_width: Optional[StereoWidthParams] = Field(None, description="Stereo width params")
     global_lowpass: Optional[Annotated[float, Field(ge=20.0, le=20000.0)]] = Field(
         None, description="Global lowpass cutoff in Hz"
     )
     global_highpass: Optional[Annotated[float, Field(ge=20.0, le=20000.0)]] = Field(
         None, description="Global highpass cutoff in Hz"
     )
+    fx_order: Optional[List[FxStage]] = Field(
+        None, description="Processing order of the stages; enabled stages left out follow in the default order"
+    )
 
     class Config:
         extra = "forbid"
 
+    @field_validator("fx_order")
+    def unique_stages(cls, v):
+        if v is not None and len(set(v)) != len(v):
+            raise ValueError("fx_order lists a stage more than once")
+        return v
+
 
 class ArgsModel(BaseModel):
     input_audio_path: AudioPathStr
     out_path: OutPathStr
-    sr: Annotated[int, Field(ge=8000, le=192000, description="Sample rate; typically 22050")] = 22050
+    sr: Optional[Annotated[int, Field(ge=8000, le=192000)]] = Field(
+        None, description="Render sample rate; omit to render at the source's native rate"
+    )
     mix_ratio: MixRatio
     params: Optional[Params] = Field(default_factory=dict, description="Structured synthesis parameters")
 
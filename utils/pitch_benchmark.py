@@ -0,0 +1,132 @@
+"""
+Accuracy vs speed of the pitch backends (AnalysisEngine.pitch) against full-file pyin.
+
+Runs every backend over a set of synthetic notes with known pitch (sines, saws, decaying
+plucks, noisy tones across the C2..C7 range, plus a couple of unpitched noises) and any
+audio files given on the command line, then reports per backend:
+  - ms per second of audio
+  - share of pitched signals whose nanmean f0 is within half a semitone of the truth
+  - share of all signals within half a semitone of pyin's answer (what the descriptor used to say)
+  - worst semitone error against pyin where both found a pitch
+
+usage:
+    python -m utils.pitch_benchmark
+    python -m utils.pitch_benchmark tests/sample_audio/*.wav --backends pyin yin --json
+"""
+import argparse
+import json
+import time
+import warnings
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.tools.analysis_engine import PITCH_BACKENDS, AnalysisEngine
+from src.tools.feature_extractor import PITCH_FMAX_NOTE, PITCH_FMIN_NOTE
+from utils.lazy_import import lazy_import
+
+librosa = lazy_import("librosa")
+
+SR = 22050
+SEMITONE_TOLERANCE = 0.5
+
+
+def synthetic_signals(duration: float = 4.0, seed: int = 0) -> Dict[str, Tuple[np.ndarray, Optional[float]]]:
+    """name -> (signal, true f0 in Hz or None for unpitched)"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(SR * duration)) / SR
+    signals = {}
+    for f in (70.0, 110.0, 220.0, 440.0, 880.0, 1500.0):
+        saw = 2 * (t * f - np.floor(0.5 + t * f))
+        signals[f"sine_{f:g}"] = (0.5 * np.sin(2 * np.pi * f * t), f)
+        signals[f"saw_{f:g}"] = (0.3 * saw, f)
+        signals[f"pluck_{f:g}"] = (np.sin(2 * np.pi * f * t) * np.exp(-3 * (t % 1.0)), f)
+        signals[f"noisy_{f:g}"] = (0.4 * np.sin(2 * np.pi * f * t) + 0.1 * rng.normal(size=t.size), f)
+    signals["white_noise"] = (0.2 * rng.normal(size=t.size), None)
+    signals["pad_noise"] = (np.convolve(0.2 * rng.normal(size=t.size), np.ones(500) / 500, mode="same"), None)
+    return signals
+
+
+def estimate(y: np.ndarray, sr: int, backend: str) -> Tuple[float, float]:
+    """(estimated_pitch_hz as the descriptor reports it, seconds taken)"""
+    engine = AnalysisEngine(y.astype(np.float32), sr)
+    start = time.perf_counter()
+    f0 = engine.pitch(librosa.note_to_hz(PITCH_FMIN_NOTE), librosa.note_to_hz(PITCH_FMAX_NOTE), backend)
+    elapsed = time.perf_counter() - start
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        hz = float(np.nanmean(f0))
+    return (0.0 if np.isnan(hz) else hz), elapsed
+
+
+def semitones(a: float, b: float) -> float:
+    """distance in semitones, 0 Hz (unvoiced) only matches 0 Hz"""
+    if a <= 0 or b <= 0:
+        return 0.0 if a == b else float("inf")
+    return abs(12.0 * np.log2(a / b))
+
+
+def run(signals: Dict[str, Tuple[np.ndarray, Optional[float]]], backends: List[str]) -> Dict:
+    fmin = librosa.note_to_hz(PITCH_FMIN_NOTE)
+    results = {b: {} for b in backends}
+    for name, (y, truth) in signals.items():
+        for b in backends:
+            hz, elapsed = estimate(y, SR, b)
+            results[b][name] = {"hz": hz, "seconds": elapsed, "truth": truth}
+
+    reference = "pyin" if "pyin" in backends else backends[0]
+    audio_seconds = sum(len(y) / SR for y, _ in signals.values())
+    report = {"signals": len(signals), "audio_seconds": audio_seconds, "reference": reference, "backends": {}}
+    for b in backends:
+        rows = results[b]
+        vs_ref = [semitones(rows[n]["hz"], results[reference][n]["hz"]) for n in signals]
+        # pyin clamps to fmin, so that is the right answer for notes under the range
+        vs_truth = [semitones(rows[n]["hz"], max(t, fmin)) for n, (_, t) in signals.items() if t]
+        report["backends"][b] = {
+            "ms_per_audio_second": 1000.0 * sum(r["seconds"] for r in rows.values()) / audio_seconds,
+            "truth_within_tolerance": float(np.mean(np.array(vs_truth) <= SEMITONE_TOLERANCE)) if vs_truth else None,
+            "reference_within_tolerance": float(np.mean(np.array(vs_ref) <= SEMITONE_TOLERANCE)),
+            # over signals both call voiced, voicing disagreements are in reference_within_tolerance
+            "max_semitones_vs_reference": float(max([d for d in vs_ref if np.isfinite(d)], default=0.0)),
+            "estimates": {n: round(r["hz"], 2) for n, r in rows.items()},
+        }
+    return report
+
+
+def print_report(report: Dict):
+    print(f"\n{report['signals']} signals, {report['audio_seconds']:.0f}s of audio, reference = {report['reference']}\n")
+    print(f"{'backend':<16}{'ms/s audio':>12}{'vs truth':>10}{'vs ref':>10}{'max st':>10}")
+    for b, r in report["backends"].items():
+        truth = f"{r['truth_within_tolerance']:.0%}" if r["truth_within_tolerance"] is not None else "-"
+        print(f"{b:<16}{r['ms_per_audio_second']:>12.1f}{truth:>10}{r['reference_within_tolerance']:>10.0%}"
+              f"{r['max_semitones_vs_reference']:>10.2f}")
+
+    names = list(next(iter(report["backends"].values()))["estimates"])
+    width = max(16, max(len(n) for n in names) + 2)
+    print(f"\n{'signal':<{width}}" + "".join(f"{b:>16}" for b in report["backends"]))
+    for n in names:
+        print(f"{n:<{width}}" + "".join(f"{r['estimates'][n]:>16.1f}" for r in report["backends"].values()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SoundSpark pitch backend benchmark")
+    parser.add_argument("paths", nargs="*", help="extra audio files, compared against pyin only")
+    parser.add_argument("--backends", nargs="+", default=list(PITCH_BACKENDS), choices=PITCH_BACKENDS)
+    parser.add_argument("--duration", type=float, default=4.0, help="seconds per synthetic signal")
+    parser.add_argument("--json", action="store_true", help="print the raw report as JSON")
+    args = parser.parse_args()
+
+    signals = synthetic_signals(args.duration)
+    for p in args.paths:
+        y, _ = librosa.load(p, sr=SR, mono=True)
+        signals[p] = (y, None)
+
+    report = run(signals, args.backends)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
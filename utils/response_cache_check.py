@@ -0,0 +1,112 @@
+"""
+Response cache check, runs ResponseCacheAgent on an in-memory ADK runner with a stand-in
+inner agent that counts its calls.
+
+- a near-identical re-upload (same sound, re-quantized to 16 bit with a little noise, under
+  another name) is served the answer cached for the original
+- a different classification in the key misses
+- a turn where the inner agent writes nothing caches nothing, even with an older value
+  for the output key in the session state
+- SOUNDSPARK_RESPONSE_CACHE_QUANTUM is read when the agent is built
+
+usage:
+    python -m utils.response_cache_check          # exit 1 when a check fails
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from typing import AsyncGenerator, List, Tuple
+
+import numpy as np
+
+
+def make_pair(work: str, sr: int = 22050) -> Tuple[str, str]:
+    """a decaying saw bass, and a copy of it re-quantized to 16 bit with -70 dB of noise"""
+    import soundfile as sf
+
+    t = np.arange(2 * sr) / sr
+    saw = 2.0 * (t * 110.0 - np.floor(0.5 + t * 110.0))
+    y = (0.4 * saw * np.exp(-2.0 * (t % 0.5))).astype(np.float32)
+    noise = 10 ** (-70 / 20) * np.random.default_rng(0).standard_normal(len(y))
+    original, reupload = os.path.join(work, "bass.wav"), os.path.join(work, "bass_copy.wav")
+    sf.write(original, y, sr, subtype="FLOAT")
+    sf.write(reupload, y + noise, sr, subtype="PCM_16")
+    return original, reupload
+
+
+async def run_checks(work: str) -> List[Tuple[str, bool, str]]:
+    from google.adk.agents import BaseAgent
+    from google.adk.events import Event, EventActions
+    from google.adk.runners import InMemoryRunner
+    from google.genai import types
+
+    from src.agents.response_cache_agent import ResponseCacheAgent
+    from src.orchestrator import make_recommender_stage
+    from src.tools.feature_extractor import compute_basic_descriptors
+
+    class Recommender(BaseAgent):
+        calls: int = 0
+        write: bool = True
+
+        async def _run_async_impl(self, ctx) -> AsyncGenerator[Event, None]:
+            self.calls += 1
+            delta = {"recommendations": f"answer {self.calls}"} if self.write else {}
+            yield Event(invocation_id=ctx.invocation_id, author=self.name, actions=EventActions(state_delta=delta))
+
+    # the orchestrator's recommender stage, keyed the same way, around the stand-in
+    stage = make_recommender_stage()
+    inner = Recommender(name="recommender")
+    agent = ResponseCacheAgent(name=stage.name, sub_agents=[inner], output_key=stage.output_key,
+                               context_keys=stage.context_keys)
+    runner = InMemoryRunner(agent=agent, app_name="response_cache_check")
+
+    async def turn(path: str, texture: str, state=None) -> str:
+        state = dict(state or {}, descriptors=compute_basic_descriptors(path),
+                     classification={"texture": texture, "confidence": 0.7})
+        session = await runner.session_service.create_session(app_name=runner.app_name, user_id="check", state=state)
+        message = types.Content(role="user", parts=[types.Part(text=f"make {path} darker with a long delay")])
+        async for _ in runner.run_async(user_id="check", session_id=session.id, new_message=message):
+            pass
+        session = await runner.session_service.get_session(app_name=runner.app_name, user_id="check", session_id=session.id)
+        return session.state.get("recommendations")
+
+    original, reupload = make_pair(work)
+    rows = []
+    first = await turn(original, "dark")
+    again = await turn(reupload, "dark")
+    rows.append(("near-identical re-upload hits", (again, inner.calls) == (first, 1), f"{again!r} after {inner.calls} call(s)"))
+
+    other = await turn(reupload, "bright")
+    rows.append(("other classification misses", inner.calls == 2 and other != first, f"{other!r}"))
+
+    inner.write = False
+    await turn(original, "warm", state={"recommendations": "stale"})
+    inner.write = True
+    fresh = await turn(original, "warm")
+    rows.append(("nothing written, nothing cached", fresh != "stale" and inner.calls == 4, f"{fresh!r}"))
+
+    os.environ["SOUNDSPARK_RESPONSE_CACHE_QUANTUM"] = "2.0"
+    try:
+        quantum = ResponseCacheAgent(name="quantum_from_env", output_key="x").quantum
+    finally:
+        del os.environ["SOUNDSPARK_RESPONSE_CACHE_QUANTUM"]
+    rows.append(("quantum read at construction", quantum == 2.0, f"{quantum}"))
+    return rows
+
+
+def main():
+    failed = False
+    with tempfile.TemporaryDirectory(prefix="soundspark_cache_check_") as work:
+        # a private cache, no descriptor cache / index so both files are analyzed for real
+        os.environ["SOUNDSPARK_RESPONSE_CACHE"] = os.path.join(work, "response_cache.db")
+        os.environ["SOUNDSPARK_DESCRIPTOR_CACHE"] = os.environ["SOUNDSPARK_VECTOR_INDEX"] = ""
+        for name, ok, detail in asyncio.run(run_checks(work)):
+            failed |= not ok
+            print(f"  {'ok ' if ok else 'BAD'} {name:<34} {detail}")
+    print(f"\n[response_cache_check]: {'failed' if failed else 'all checks passed'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -64,6 +64,7 @@ async def run_session_return(
     user_queries: list[str] | str = None,
     session_name: str = "default",
     USER_ID: str = "",
+    on_text=None,
 ):
     print(f"\n ### Session: {session_name}")
     # Get app name from the Runner
@@ -101,6 +102,9 @@ async def run_session_return(
                     if (event.content.parts[0].text != "None" and event.content.parts[0].text):
                         resp += event.content.parts[0].text 
                         print(f"assistant > ", event.content.parts[0].text)
+                        # optional async hook, lets a server stream each part as it arrives
+                        if on_text is not None:
+                            await on_text(event.author, event.content.parts[0].text)
         return resp
      
     else:
@@ -0,0 +1,76 @@
+"""
+Local stand-in for the freesound MCP server, for offline runs and the load harness.
+
+Serves one `search_sounds` tool over streamable HTTP at http://127.0.0.1:<port>/mcp,
+answering with made-up sounds after an optional fixed delay. Point the app at it by
+setting MCP_SERVER_URI to the returned base url *before* src.tools.mcp_sound_tool is imported.
+
+usage:
+    python -m utils.stub_mcp_server --port 8765        # standalone
+    base_url = start_stub_mcp_server()                 # in-process, background thread
+"""
+import argparse
+import asyncio
+import socket
+import threading
+import time
+
+import uvicorn
+from mcp.server.fastmcp import FastMCP
+
+
+def make_stub_mcp(latency_ms: float = 0.0) -> FastMCP:
+    mcp = FastMCP("freesound-stub", stateless_http=True)
+
+    @mcp.tool()
+    async def search_sounds(query: str, max_results: int = 5) -> list:
+        """Search sounds by keyword, returns name and preview url for each hit"""
+        if latency_ms > 0:
+            await asyncio.sleep(latency_ms / 1000.0)
+        return [
+            {"name": f"{query} {i}", "preview_url": f"https://freesound.org/s/{1000 + i}/"}
+            for i in range(1, max_results + 1)
+        ]
+
+    return mcp
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_stub_mcp_server(port: int = 0, latency_ms: float = 0.0, timeout: float = 10.0) -> str:
+    """
+    Runs the stub server on a daemon thread and waits until it accepts connections.
+
+    args:
+        port: port to bind on 127.0.0.1, 0 picks a free one
+        latency_ms: delay added to every tool call
+        timeout: seconds to wait for startup
+
+    return:
+        base url without the /mcp suffix, the same shape MCP_SERVER_URI expects
+    """
+    port = port or _free_port()
+    config = uvicorn.Config(make_stub_mcp(latency_ms).streamable_http_app(), host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, name="stub-mcp", daemon=True).start()
+
+    deadline = time.time() + timeout
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError(f"stub MCP server did not start on port {port}")
+        time.sleep(0.01)
+    print(f"[stub_mcp] : serving on http://127.0.0.1:{port}/mcp")
+    return f"http://127.0.0.1:{port}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stub of the freesound MCP server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    uvicorn.run(make_stub_mcp(args.latency_ms).streamable_http_app(), host="127.0.0.1", port=args.port)